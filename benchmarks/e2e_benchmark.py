@@ -0,0 +1,231 @@
+import os
+import sys
+import time
+import logging
+import argparse
+import threading
+from collections import defaultdict
+
+# Permitir ejecutar el script desde benchmarks/ o desde la raíz del proyecto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from whatsapp_client import WhatsAppClient
+from llm_provider import StubProvider
+from managers.chat_manager import ChatManager
+from managers.prompt_manager import PromptManager
+from processors.message_processor import MessageProcessor
+from processors.response_processor import ResponseProcessor
+
+FIXTURE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "fixtures", "whatsapp_web.html"
+)
+
+
+class StageTimer:
+    """Acumula tiempos por etapa envolviendo métodos de los componentes"""
+
+    def __init__(self):
+        self.totals = defaultdict(float)
+        self.counts = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, stage, elapsed):
+        with self._lock:
+            self.totals[stage] += elapsed
+            self.counts[stage] += 1
+
+    def wrap(self, obj, method_name, stage):
+        """Sustituir obj.method_name por una versión cronometrada"""
+        method = getattr(obj, method_name)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+
+        setattr(obj, method_name, timed)
+
+    def wrap_generator(self, obj, method_name, stage):
+        """Igual que wrap, pero midiendo hasta agotar el generador devuelto"""
+        method = getattr(obj, method_name)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                yield from method(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+
+        setattr(obj, method_name, timed)
+
+    def reset(self):
+        with self._lock:
+            self.totals.clear()
+            self.counts.clear()
+
+
+def create_fake_driver(args):
+    from benchmarks.fake_driver import FakeWhatsAppDriver
+
+    driver = FakeWhatsAppDriver(
+        chat_count=args.chats,
+        messages_per_chat=args.messages,
+        command_latency=args.command_latency,
+    )
+
+    def receive(chat_name, text):
+        driver.receive(chat_name, text)
+
+    return driver, list(driver.chats), receive
+
+
+def create_chrome_driver(args):
+    """Abrir la réplica HTML en Chrome sin interfaz"""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
+    options = Options()
+    options.add_argument("--headless=new")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    driver = webdriver.Chrome(options=options)
+    driver.get(f"file://{FIXTURE_PATH}?chats={args.chats}&messages={args.messages}")
+
+    def receive(chat_name, text):
+        driver.execute_script(
+            "window.__fixtureIncoming(arguments[0], arguments[1])", chat_name, text
+        )
+
+    return driver, [f"Contacto {c}" for c in range(args.chats)], receive
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark de extremo a extremo de process_unread_chats sin red"
+    )
+    parser.add_argument(
+        "--config", help="Ruta al archivo de configuración", default="config.json"
+    )
+    parser.add_argument("--driver", choices=["fake", "chrome"], default="fake")
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=10, help="Mensajes por chat")
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument(
+        "--llm-latency", type=float, default=0.2, help="Latencia del LLM simulado (s)"
+    )
+    parser.add_argument(
+        "--command-latency",
+        type=float,
+        default=0.002,
+        help="Latencia de cada comando del driver simulado (s)",
+    )
+    parser.add_argument("--scrape-mode", choices=["js", "xpath"], default="js")
+    parser.add_argument("--pipeline", action="store_true")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--streaming", action="store_true")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    config = Config(args.config)
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    # Ajustes del benchmark sobre la configuración cargada
+    config.config.setdefault("whatsapp", {})["scrape_mode"] = args.scrape_mode
+    config.config["whatsapp"]["scrape_limit"] = args.messages
+    config.config["pipeline"] = {"enabled": args.pipeline, "workers": args.workers}
+    config.config.setdefault("llm", {})["streaming"] = args.streaming
+
+    if args.driver == "chrome":
+        driver, chat_names, receive = create_chrome_driver(args)
+    else:
+        driver, chat_names, receive = create_fake_driver(args)
+
+    timer = StageTimer()
+    whatsapp_client = WhatsAppClient(driver, config)
+    chat_manager = ChatManager(config)
+    prompt_manager = PromptManager(config)
+    llm_provider = StubProvider(latency=args.llm_latency)
+    response_processor = ResponseProcessor()
+    message_processor = MessageProcessor(
+        whatsapp_client,
+        chat_manager,
+        prompt_manager,
+        llm_provider,
+        response_processor,
+        config,
+    )
+
+    timer.wrap(message_processor, "_scrape_chat", "lectura")
+    timer.wrap(prompt_manager, "format_prompt", "prompt")
+    timer.wrap(llm_provider, "generate_response", "llm")
+    timer.wrap_generator(llm_provider, "generate_response_stream", "llm")
+    timer.wrap(response_processor, "process_response", "análisis")
+    timer.wrap(whatsapp_client, "send_message", "envío")
+    timer.wrap(whatsapp_client, "close_current_chat", "cierre")
+
+    sent = {"ok": 0}
+    send_message = whatsapp_client.send_message
+
+    def counted_send(message):
+        result = send_message(message)
+        sent["ok"] += bool(result)
+        return result
+
+    whatsapp_client.send_message = counted_send
+
+    print(
+        f"Driver: {args.driver}, chats: {args.chats}, mensajes: {args.messages}, "
+        f"LLM: {args.llm_latency}s, pipeline: {args.pipeline}, streaming: {args.streaming}"
+    )
+    failures = 0
+    try:
+        for cycle in range(args.cycles):
+            if cycle:
+                # Un mensaje nuevo por chat entre ciclos
+                for chat_name in chat_names:
+                    receive(chat_name, f"Mensaje nuevo {cycle} de {chat_name}")
+
+            timer.reset()
+            sent["ok"] = 0
+            start = time.perf_counter()
+            message_processor.process_unread_chats()
+            elapsed = time.perf_counter() - start
+
+            print(f"\nCiclo {cycle + 1}: {elapsed:.3f}s")
+            print(
+                f"  rendimiento: {len(chat_names) / elapsed:.1f} chats/s, "
+                f"{sent['ok'] / elapsed:.1f} respuestas/s"
+            )
+            for stage, total in timer.totals.items():
+                count = timer.counts[stage]
+                print(
+                    f"  {stage:10s} {total:8.3f}s total  {total / count * 1000:8.1f} ms "
+                    f"x {count}"
+                )
+
+            # Cada chat no leído debe recibir respuesta; si no, algo se rompió
+            if sent["ok"] < len(chat_names):
+                failures += 1
+                print(f"  ERROR: {sent['ok']} respuestas enviadas para {len(chat_names)} chats")
+
+        print("\nEsperas del cliente (total / máximo):")
+        for step, stats in sorted(whatsapp_client.get_wait_stats().items()):
+            print(
+                f"  {step:14s} {stats['total']:8.3f}s / {stats['max'] * 1000:6.1f} ms "
+                f"x {stats['count']}"
+            )
+        if args.driver == "fake":
+            print(f"Comandos del driver: {driver.commands}")
+    finally:
+        message_processor.close()
+        driver.quit()
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,273 @@
+import re
+import time
+from selenium.common.exceptions import NoSuchElementException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+from whatsapp_scripts import (
+    SCRAPE_MESSAGES_JS,
+    INSTALL_UNREAD_OBSERVER_JS,
+    WAIT_UNREAD_EVENTS_JS,
+    LOGIN_STATE_JS,
+)
+
+# Selectores que entiende el driver simulado. Se copian a propósito en lugar
+# de importarlos de whatsapp_client: si cambia un selector del cliente sin
+# actualizar la réplica (fixtures/whatsapp_web.html y este módulo), el
+# benchmark falla en vez de seguir midiendo.
+CHAT_LIST = "//div[@aria-label='Lista de chats']"
+UNREAD_CHATS = "//div[@role='listitem']//span[contains(@aria-label, 'mensaje') and contains(@aria-label, 'no leído')]/../../../.."
+MAIN_PANEL = "//div[@id='main']"
+MESSAGE_IN = "//div[contains(@class, 'message-in')]"
+CHAT_NAME = "//*[@id='main']/header/div[2]/div[1]/div/div/div/span[1]"
+INPUT_BOX = "//div[@role='textbox' and @contenteditable='true' and @aria-label='Escribe un mensaje']"
+SEND_BUTTON = "//button[@aria-label='Enviar']"
+CHAT_LOADED = f"//div[@id='main']//div[@data-id] | {INPUT_BOX}"
+MESSAGE_TEXT = ".//span[contains(@class, 'selectable-text')]"
+MESSAGE_META = ".//div[contains(@class, 'copyable-text')]"
+
+CHAT_BY_TITLE_PATTERN = re.compile(r"^//div\[@role='listitem'\]//span\[@title=(.+)\]$")
+
+
+def parse_xpath_literal(literal):
+    """Interpretar un literal XPath generado por WhatsAppClient._xpath_literal"""
+    if literal.startswith("concat("):
+        parts = re.findall(r"'([^']*)'|\"([^\"]*)\"", literal[len("concat(") : -1])
+        return "".join(single or double for single, double in parts)
+    return literal[1:-1]
+
+
+class FakeChat:
+    """Chat simulado: mensajes recibidos y enviados y contador de no leídos"""
+
+    def __init__(self, name):
+        self.name = name
+        self.messages = []
+        self.unread = 0
+
+    def receive(self, text, time_str="12:00", date="1/1/2024"):
+        message_id = f"false_{self.name}_{len(self.messages)}"
+        self.messages.append(
+            {
+                "id": message_id,
+                "incoming": True,
+                "text": text,
+                "pre_plain_text": f"[{time_str}, {date}] {self.name}: ",
+            }
+        )
+        self.unread += 1
+
+    def sent(self):
+        return [msg["text"] for msg in self.messages if not msg["incoming"]]
+
+
+class FakeElement:
+    """Elemento simulado con la parte de la API de WebElement que usa el cliente"""
+
+    def __init__(self, driver, kind, chat=None, message=None):
+        self.driver = driver
+        self.kind = kind
+        self.chat = chat
+        self.message = message
+
+    @property
+    def text(self):
+        self.driver._command()
+        if self.kind == "input":
+            return self.driver.input_text
+        if self.kind == "message_text":
+            return self.message["text"]
+        if self.kind == "chat_name":
+            return self.chat.name
+        return ""
+
+    def get_attribute(self, name):
+        self.driver._command()
+        if self.kind == "chat_name" and name == "title":
+            return self.chat.name
+        if self.kind == "message_meta" and name == "data-pre-plain-text":
+            return self.message["pre_plain_text"]
+        return None
+
+    def is_displayed(self):
+        self.driver._command()
+        return True
+
+    def is_enabled(self):
+        self.driver._command()
+        return True
+
+    def click(self):
+        self.driver._command()
+        if self.kind == "chat":
+            self.driver.open_chat = self.chat
+            self.chat.unread = 0
+            self.driver.input_text = ""
+        elif self.kind == "send_button":
+            self.driver._send()
+
+    def clear(self):
+        self.driver._command()
+        if self.kind == "input":
+            self.driver.input_text = ""
+
+    def send_keys(self, *values):
+        self.driver._command()
+        text = "".join(values)
+        if self.kind == "body" and Keys.ESCAPE in text:
+            self.driver.open_chat = None
+        elif self.kind == "input":
+            self.driver.input_text += text
+
+    def find_element(self, by, value):
+        elements = self.find_elements(by, value)
+        if not elements:
+            raise NoSuchElementException(value)
+        return elements[0]
+
+    def find_elements(self, by, value):
+        self.driver._command()
+        if self.kind == "message" and by == By.XPATH:
+            if value == MESSAGE_TEXT:
+                return [FakeElement(self.driver, "message_text", message=self.message)]
+            if value == MESSAGE_META:
+                return [FakeElement(self.driver, "message_meta", message=self.message)]
+        raise ValueError(f"Selector no soportado por el driver simulado: {value}")
+
+
+class FakeWhatsAppDriver:
+    """
+    WebDriver simulado con el comportamiento de fixtures/whatsapp_web.html.
+
+    Modela en memoria la lista de chats, el panel del chat abierto, el cuadro
+    de texto y el envío, y responde a los selectores y scripts que usa
+    WhatsAppClient. Cada comando cuesta command_latency segundos para imitar
+    la ida y vuelta a chromedriver.
+    """
+
+    def __init__(self, chat_count=10, messages_per_chat=5, command_latency=0.002):
+        self.command_latency = command_latency
+        self.chats = {}
+        for c in range(chat_count):
+            chat = FakeChat(f"Contacto {c}")
+            for m in range(messages_per_chat):
+                chat.receive(f"Mensaje {m} de {chat.name}")
+            self.chats[chat.name] = chat
+
+        self.open_chat = None
+        self.input_text = ""
+        self.current_url = "about:blank"
+        self.commands = 0
+
+    def _command(self):
+        """Contabilizar un comando y simular su latencia"""
+        self.commands += 1
+        if self.command_latency:
+            time.sleep(self.command_latency)
+
+    def _send(self):
+        if self.open_chat is None or not self.input_text.strip():
+            return
+        chat = self.open_chat
+        chat.messages.append(
+            {
+                "id": f"true_{chat.name}_{len(chat.messages)}",
+                "incoming": False,
+                "text": self.input_text,
+                "pre_plain_text": "[12:00, 1/1/2024] Yo: ",
+            }
+        )
+        self.input_text = ""
+
+    def receive(self, chat_name, text):
+        """Simular un mensaje entrante en un chat"""
+        self.chats[chat_name].receive(text)
+
+    def get(self, url):
+        self._command()
+        self.current_url = url
+
+    def refresh(self):
+        self._command()
+        self.open_chat = None
+
+    def set_script_timeout(self, timeout):
+        self._command()
+
+    def find_element(self, by, value):
+        elements = self.find_elements(by, value)
+        if not elements:
+            raise NoSuchElementException(value)
+        return elements[0]
+
+    def find_elements(self, by, value):
+        self._command()
+        chat = self.open_chat
+
+        if by == By.ID and value == "main":
+            return [FakeElement(self, "main")] if chat else []
+        if by == By.TAG_NAME and value == "body":
+            return [FakeElement(self, "body")]
+        if by != By.XPATH:
+            raise ValueError(f"Selector no soportado por el driver simulado: {by}={value}")
+
+        if value == CHAT_LIST:
+            return [FakeElement(self, "chat_list")]
+        if value == UNREAD_CHATS:
+            return [
+                FakeElement(self, "chat", chat=item)
+                for item in self.chats.values()
+                if item.unread
+            ]
+        if value in (MAIN_PANEL, CHAT_LOADED):
+            return [FakeElement(self, "main")] if chat else []
+        if value == CHAT_NAME:
+            return [FakeElement(self, "chat_name", chat=chat)] if chat else []
+        if value == INPUT_BOX:
+            return [FakeElement(self, "input")] if chat else []
+        if value == SEND_BUTTON:
+            return [FakeElement(self, "send_button")] if chat and self.input_text.strip() else []
+        if value == MESSAGE_IN:
+            if not chat:
+                return []
+            return [
+                FakeElement(self, "message", message=msg)
+                for msg in chat.messages
+                if msg["incoming"]
+            ]
+
+        match = CHAT_BY_TITLE_PATTERN.match(value)
+        if match:
+            item = self.chats.get(parse_xpath_literal(match.group(1)))
+            return [FakeElement(self, "chat", chat=item)] if item else []
+
+        raise ValueError(f"Selector no soportado por el driver simulado: {value}")
+
+    def execute_script(self, script, *args):
+        self._command()
+        if script == SCRAPE_MESSAGES_JS:
+            if self.open_chat is None:
+                return None
+            incoming = [msg for msg in self.open_chat.messages if msg["incoming"]]
+            limit = args[0] if args else 0
+            if limit:
+                incoming = incoming[-limit:]
+            return [
+                {"id": msg["id"], "pre_plain_text": msg["pre_plain_text"], "text": msg["text"]}
+                for msg in incoming
+            ]
+        if script == INSTALL_UNREAD_OBSERVER_JS:
+            return True
+        if script == LOGIN_STATE_JS:
+            return "logged_in"
+        if script == "return document.readyState":
+            return "complete"
+        raise ValueError("Script no soportado por el driver simulado")
+
+    def execute_async_script(self, script, *args):
+        self._command()
+        if script == WAIT_UNREAD_EVENTS_JS:
+            return [chat.name for chat in self.chats.values() if chat.unread]
+        raise ValueError("Script no soportado por el driver simulado")
+
+    def quit(self):
+        pass
@@ -0,0 +1,97 @@
+import os
+import sys
+import time
+import timeit
+import logging
+import argparse
+
+# Permitir ejecutar el script desde benchmarks/ o desde la raíz del proyecto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from managers.prompt_manager import PromptManager
+
+
+def build_history(size):
+    """Generar un historial sintético de mensajes"""
+    return [
+        {
+            "id": f"msg-{i}",
+            "sender": "Usuario" if i % 2 == 0 else "Assistant",
+            "date": "01/01/2024",
+            "time": f"12:{i % 60:02d}",
+            "message": f"Mensaje de prueba número {i} con algo de texto adicional",
+        }
+        for i in range(size)
+    ]
+
+
+def render_history(messages):
+    """Historial en el formato XML del prompt, igual para ambos casos"""
+    return "\n".join(
+        f"<Message sender={msg['sender']} date={msg['date']} time={msg['time']}>{msg['message']}</Message>"
+        for msg in messages
+    )
+
+
+def legacy_render(template_path, values):
+    """Formato previo: leer el archivo y aplicar str.format en cada llamada"""
+    with open(template_path, "r", encoding="utf-8") as file:
+        template = file.read()
+    return template.format(**values)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Micro-benchmark del coste por llamada de format_prompt"
+    )
+    parser.add_argument(
+        "--config", help="Ruta al archivo de configuración", default="config.json"
+    )
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--history", type=int, default=20, help="Mensajes en el historial")
+    args = parser.parse_args()
+
+    config = Config(args.config)
+    prompt_manager = PromptManager(config)
+    messages = build_history(args.history)
+
+    # Compilar la plantilla antes de medir; el log por prompt no se mide
+    compiled = prompt_manager.get_template()
+    logging.disable(logging.INFO)
+
+    # Mismos valores ya preparados en los dos casos comparados
+    values = {
+        "chat_name": "Bench",
+        "chat_history": render_history(messages),
+        "chat_summary": "",
+        "current_datetime": time.strftime("%Y-%m-%d:%H-%M-%S:%Z"),
+    }
+    cases = {
+        "legacy (lectura + str.format)": lambda: legacy_render(
+            prompt_manager.template_path, values
+        ),
+        "compilada (render)": lambda: compiled.render(values),
+    }
+    # Costes del resto de format_prompt, que no existían en la versión previa
+    extra_cases = {
+        "presupuesto de tokens (build)": lambda: prompt_manager.context_builder.build(
+            messages
+        ),
+        "format_prompt completo": lambda: prompt_manager.format_prompt("Bench", messages),
+    }
+
+    print(f"Iteraciones: {args.iterations}, historial: {args.history} mensajes")
+    results = {}
+    for name, case in {**cases, **extra_cases}.items():
+        best = min(timeit.repeat(case, number=args.iterations, repeat=3))
+        results[name] = best / args.iterations * 1e6
+        print(f"{name:32s} {results[name]:8.2f} µs/llamada")
+
+    legacy, rendered = (results[name] for name in cases)
+    print(f"{'aceleración del formato':32s} {legacy / rendered:8.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,113 @@
+import os
+import re
+import sys
+import timeit
+import argparse
+import logging
+import xml.etree.ElementTree as ET
+
+# Permitir ejecutar el script desde benchmarks/ o desde la raíz del proyecto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from processors.response_processor import ResponseProcessor
+from tests.response_corpus import CORPUS
+
+
+class LegacyResponseProcessor:
+    """Implementación previa: bloques de código, ET.fromstring y regex de respaldo"""
+
+    def __init__(self):
+        self.message_pattern = re.compile(r"<Message>(.*?)</Message>", re.DOTALL)
+        self.xml_block_pattern = re.compile(
+            r"```(?:xml)?\s*((?:<[\s\S]*?>)[\s\S]*?(?:<\/[\s\S]*?>))```"
+        )
+
+    def process_response(self, response):
+        xml_blocks = self.xml_block_pattern.findall(response)
+        messages = []
+        for xml_block in xml_blocks:
+            messages.extend(self._extract_messages_from_xml(xml_block))
+        if not messages:
+            messages = self._extract_messages_from_xml(response)
+        if not messages:
+            messages = self.message_pattern.findall(response)
+        return "\n".join([msg.strip() for msg in messages if msg.strip()])
+
+    def _extract_messages_from_xml(self, xml_text):
+        clean_xml = self._ensure_root_node(xml_text)
+        try:
+            root = ET.fromstring(clean_xml)
+            return [elem.text for elem in root.findall(".//Message") if elem.text]
+        except ET.ParseError:
+            return self.message_pattern.findall(xml_text)
+
+    def _ensure_root_node(self, xml_content):
+        xml_content = xml_content.strip()
+        if not xml_content or not xml_content.startswith("<"):
+            return f"<Response>{xml_content}</Response>"
+        if re.search(r"^\s*<[\w:]+[^>]*>.*</[\w:]+>\s*$", xml_content, re.DOTALL):
+            return xml_content
+        return f"<Response>{xml_content}</Response>"
+
+
+def check_corpus(processor, legacy):
+    """Comparar ambas implementaciones con las salidas esperadas del corpus"""
+    failures = 0
+    print(f"{'caso':24s} {'nueva':6s} {'legacy':6s}")
+    for name, response, expected in CORPUS:
+        result = processor.process_response(response)
+        legacy_result = legacy.process_response(response)
+        ok = result == expected
+        failures += not ok
+        print(
+            f"{name:24s} {'ok' if ok else 'FALLO':6s} "
+            f"{'ok' if legacy_result == expected else 'difiere':6s}"
+        )
+        if not ok:
+            print(f"    esperado: {expected!r}\n    obtenido: {result!r}")
+        elif legacy_result != expected:
+            print(f"    legacy:   {legacy_result!r}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Regresión y micro-benchmark del análisis de respuestas del LLM"
+    )
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    # Los avisos de ET.ParseError de la implementación previa ensucian la salida
+    logging.disable(logging.WARNING)
+
+    processor = ResponseProcessor()
+    legacy = LegacyResponseProcessor()
+    failures = check_corpus(processor, legacy)
+
+    responses = [response for _, response, _ in CORPUS]
+    cases = {
+        "legacy (regex + ET + regex)": lambda: [
+            legacy.process_response(r) for r in responses
+        ],
+        "tokenizador en una pasada": lambda: [
+            processor.process_response(r) for r in responses
+        ],
+    }
+
+    print(f"\nIteraciones: {args.iterations}, corpus: {len(responses)} respuestas")
+    results = {}
+    for name, case in cases.items():
+        best = min(timeit.repeat(case, number=args.iterations, repeat=3))
+        results[name] = best / (args.iterations * len(responses)) * 1e6
+        print(f"{name:32s} {results[name]:8.2f} µs/respuesta")
+
+    legacy_time, new_time = results.values()
+    print(f"{'aceleración':32s} {legacy_time / new_time:8.2f}x")
+
+    if failures:
+        print(f"\n{failures} casos no coinciden con la salida esperada")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    exit(main())
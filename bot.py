@@ -1,6 +1,7 @@
 import sys
 import time
 import logging
+from concurrent.futures import ThreadPoolExecutor, wait
 from config import Config
 from managers.browser_manager import BrowserManager
 from managers.session_manager import SessionManager
@@ -8,24 +9,49 @@ from whatsapp_client import WhatsAppClient
 from llm_provider import LLMProviderFactory
 from managers.chat_manager import ChatManager
 from managers.prompt_manager import PromptManager
+from managers.summary_manager import ConversationSummarizer
 from processors.response_processor import ResponseProcessor
 from processors.message_processor import MessageProcessor
-from managers.chat_persistence_manager import ChatPersistenceManager
+from managers.persistence_factory import PersistenceManagerFactory
+from metrics import registry as metrics, MetricsServer, MetricsReporter, StartupTimeline
 
 logger = logging.getLogger(__name__)
 
 
 class WhatsAppBot:
-    def __init__(self):
-        # Inicializar configuración
-        self.config = Config()
+    def __init__(self, config=None):
+        # Inicializar configuración (el supervisor pasa la de cada cuenta)
+        self.config = config or Config()
 
-        # Inicializar componentes
+        # Los pasos independientes del arranque se ejecutan en paralelo: el
+        # navegador es el más lento y mientras arranca se configuran el LLM y
+        # se precargan los historiales
+        self.timeline = StartupTimeline(metrics)
         self.browser_manager = BrowserManager(self.config)
+        self.llm_provider = None
+        self.summarizer = None
+        self.chat_persistence_manager = None
+        self.chat_manager = None
+        with ThreadPoolExecutor(max_workers=3, thread_name_prefix="startup") as executor:
+            browser_future = executor.submit(self._start_browser)
+            llm_future = executor.submit(self._create_llm_provider)
+            chats_future = executor.submit(self._create_chat_manager, llm_future)
+            try:
+                chats_ready = chats_future.result()
+                browser_ready = browser_future.result()
+            except BaseException:
+                # Esperar a que termine de arrancar Chrome para cerrarlo: si
+                # quedara abierto bloquearía el perfil en el siguiente intento
+                wait([browser_future, llm_future])
+                self._abort_startup()
+                raise
 
-        # Inicializar navegador
-        if not self.browser_manager.initialize_browser():
+        if not browser_ready:
             logger.error("No se pudo inicializar el navegador. Saliendo...")
+            self._abort_startup()
+            sys.exit(1)
+        if not chats_ready:
+            self._abort_startup()
             sys.exit(1)
 
         # Obtener driver
@@ -35,24 +61,9 @@ class WhatsAppBot:
         self.session_manager = SessionManager(self.config, self.driver)
         self.whatsapp_client = WhatsAppClient(self.driver, self.config)
 
-        # Inicializar administrador de chats y prompts
-        self.chat_persistence_manager = ChatPersistenceManager(self.config)
-        self.chat_manager = ChatManager(self.config, self.chat_persistence_manager)
-        self.prompt_manager = PromptManager(self.config)
-
         # Inicializar procesador de respuestas
         self.response_processor = ResponseProcessor()
 
-        # Inicializar proveedor LLM
-        llm_type = self.config.config.get("llm", {}).get("default", "gemini")
-        self.llm_provider = LLMProviderFactory.create_provider(llm_type, self.config)
-
-        if not self.llm_provider:
-            logger.error(
-                f"No se pudo inicializar el proveedor LLM: {llm_type}. Saliendo..."
-            )
-            sys.exit(1)
-
         # Inicializar procesador de mensajes
         self.message_processor = MessageProcessor(
             self.whatsapp_client,
@@ -60,36 +71,196 @@ class WhatsAppBot:
             self.prompt_manager,
             self.llm_provider,
             self.response_processor,
+            self.config,
         )
 
+        # Métricas: endpoint local de Prometheus y resumen periódico en el log
+        self.metrics_server = None
+        self.metrics_reporter = None
+        metrics_config = self.config.config.get("metrics", {})
+        if metrics_config.get("enabled", False):
+            metrics.gauge_callback(self._cache_metrics)
+            self.metrics_server = MetricsServer(
+                metrics,
+                host=metrics_config.get("host", "127.0.0.1"),
+                port=metrics_config.get("port", 9108),
+                extra_labels=(
+                    {"account": self.config.account} if self.config.account else None
+                ),
+            )
+            self.metrics_server.start()
+            self.metrics_reporter = MetricsReporter(
+                metrics, interval=metrics_config.get("log_interval", 300)
+            )
+            self.metrics_reporter.start()
+
+        self.timeline.log("Inicialización")
+
+    def _start_browser(self):
+        with self.timeline.step("navegador"):
+            return self.browser_manager.initialize_browser()
+
+    def _create_llm_provider(self):
+        """Crear el proveedor LLM; devuelve None si no se pudo inicializar"""
+        with self.timeline.step("llm"):
+            llm_type = self.config.config.get("llm", {}).get("default", "gemini")
+            self.llm_provider = LLMProviderFactory.create_provider(llm_type, self.config)
+            return self.llm_provider
+
+    def _create_chat_manager(self, llm_future):
+        """Crear prompts, resúmenes e historiales y precargar los más recientes"""
+        with self.timeline.step("prompts"):
+            self.prompt_manager = PromptManager(self.config)
+
+        # Los resúmenes necesitan el proveedor LLM
+        llm_provider = llm_future.result()
+        if not llm_provider:
+            llm_type = self.config.config.get("llm", {}).get("default", "gemini")
+            logger.error(
+                f"No se pudo inicializar el proveedor LLM: {llm_type}. Saliendo..."
+            )
+            return False
+
+        with self.timeline.step("historiales"):
+            chat_config = self.config.config.get("chat", {})
+            if chat_config.get("summary", {}).get("enabled", False):
+                self.summarizer = ConversationSummarizer(
+                    self.config, llm_provider, self.prompt_manager
+                )
+
+            self.chat_persistence_manager = (
+                PersistenceManagerFactory.create_persistence_manager(self.config)
+            )
+            self.chat_manager = ChatManager(
+                self.config, self.chat_persistence_manager, self.summarizer
+            )
+            preloaded = self.chat_manager.preload(
+                chat_config.get("cache", {}).get("preload", 0)
+            )
+            logger.info(f"Historiales precargados: {preloaded}")
+        return True
+
+    def _abort_startup(self):
+        """Cerrar lo que llegó a crearse cuando la inicialización falla"""
+        try:
+            if self.chat_manager:
+                self.chat_manager.close()
+            else:
+                if self.summarizer:
+                    self.summarizer.close()
+                if self.chat_persistence_manager:
+                    self.chat_persistence_manager.close()
+            if self.llm_provider:
+                self.llm_provider.close()
+        except Exception as e:
+            logger.error(f"Error al cerrar tras un arranque fallido: {e}", exc_info=True)
+        finally:
+            self.browser_manager.close()
+
+    def _cache_metrics(self):
+        """Tasas de acierto de la caché de historiales y de las capas del LLM"""
+        values = []
+        stats = self.chat_manager.get_cache_stats()
+        values.append(("cache_hit_rate", stats["hit_rate"], {"cache": "chat_history"}))
+        values.append(("cache_entries", stats["chats"], {"cache": "chat_history"}))
+
+        # Recorrer las capas del proveedor (caché, limitador, resiliencia...)
+        provider = self.llm_provider
+        while provider is not None:
+            if hasattr(provider, "get_stats"):
+                stats = provider.get_stats()
+                if "hit_rate" in stats:
+                    values.append(
+                        ("cache_hit_rate", stats["hit_rate"], {"cache": "llm_response"})
+                    )
+                    values.append(
+                        ("cache_entries", stats["entries"], {"cache": "llm_response"})
+                    )
+            provider = getattr(provider, "provider", None)
+        return values
+
     def run(self):
         """Ejecutar el bot"""
         try:
             # Iniciar sesión en WhatsApp
-            if not self.whatsapp_client.login(self.session_manager):
+            with self.timeline.step("login"):
+                logged_in = self.whatsapp_client.login(self.session_manager)
+            if not logged_in:
                 logger.error("Error al iniciar sesión en WhatsApp. Saliendo...")
                 return
 
-            logger.info("Bot iniciado correctamente")
-
-            # Intervalo de verificación de mensajes
-            check_interval = self.config.config.get("chat", {}).get(
-                "check_interval", 10
+            logger.info(
+                f"Bot iniciado correctamente en {self.timeline.elapsed():.2f}s"
             )
 
-            while True:
-                self.message_processor.process_unread_chats()
-                time.sleep(check_interval)
+            # Modo de detección e intervalo de verificación de mensajes
+            chat_config = self.config.config.get("chat", {})
+            check_interval = chat_config.get("check_interval", 10)
+
+            if chat_config.get("detection_mode", "poll") == "observer":
+                self._run_event_loop(chat_config)
+            else:
+                while True:
+                    self.message_processor.process_unread_chats()
+                    time.sleep(check_interval)
 
         except KeyboardInterrupt:
             logger.info("Bot detenido por el usuario")
         except Exception as e:
             logger.error(f"Error inesperado: {e}", exc_info=True)
         finally:
+            # Detener workers y volcar los historiales pendientes antes de salir
+            if self.metrics_reporter:
+                self.metrics_reporter.close()
+            if self.metrics_server:
+                self.metrics_server.close()
+            self.message_processor.close()
+            # Los resúmenes usan el LLM: detenerlos antes de cerrar el proveedor
+            try:
+                self.chat_manager.close()
+            except Exception as e:
+                logger.error(f"Error al volcar historiales: {e}", exc_info=True)
+            self.llm_provider.close()
+
             # Guardar sesión y cerrar navegador
             self.session_manager.save_session()
             self.browser_manager.close()
 
+    def _run_event_loop(self, chat_config):
+        """Procesar chats a medida que el observador de la página detecta no leídos"""
+        check_interval = chat_config.get("check_interval", 10)
+        observer_wait = chat_config.get("observer_wait", 30)
+        full_scan_interval = chat_config.get("full_scan_interval", 300)
+
+        # Escaneo inicial para atender lo que llegó mientras el bot estaba detenido
+        self.message_processor.process_unread_chats()
+        last_full_scan = time.monotonic()
+        observer_ready = False
+
+        while True:
+            if not observer_ready:
+                observer_ready = self.whatsapp_client.install_unread_observer()
+                if not observer_ready:
+                    # Sin observador, volver temporalmente al sondeo periódico
+                    logger.warning("Observador no disponible, usando sondeo periódico")
+                    time.sleep(check_interval)
+                    self.message_processor.process_unread_chats()
+                    last_full_scan = time.monotonic()
+                    continue
+
+            chat_names = self.whatsapp_client.wait_for_unread_events(observer_wait)
+            if chat_names is None:
+                observer_ready = False
+                continue
+
+            if chat_names:
+                self.message_processor.process_unread_chats(chat_names)
+
+            # Escaneo completo de seguridad por si se perdió algún evento
+            if time.monotonic() - last_full_scan >= full_scan_interval:
+                self.message_processor.process_unread_chats()
+                last_full_scan = time.monotonic()
+
 
 if __name__ == "__main__":
     bot = WhatsAppBot()
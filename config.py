@@ -4,16 +4,48 @@ import logging
 from dotenv import load_dotenv
 
 
+def merge_config(base, overrides):
+    """Combinar recursivamente dos configuraciones; overrides tiene prioridad"""
+    merged = dict(base)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_config(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def validate_account_name(account):
+    """
+    Comprobar que el nombre de una cuenta sirve como nombre de directorio.
+
+    Se rechazan los nombres vacíos, "." y "..", y los que contienen
+    separadores de ruta, para que una cuenta no pueda salirse de accounts/.
+    """
+    separators = {"/", "\\", os.sep, os.altsep} - {None}
+    if (
+        not isinstance(account, str)
+        or account.strip() in ("", ".", "..")
+        or any(separator in account for separator in separators)
+    ):
+        raise ValueError(f"Nombre de cuenta no válido: {account!r}")
+    return account
+
+
 class Config:
-    def __init__(self, config_file_path="config.json"):
+    def __init__(self, config_file_path="config.json", account=None):
         # Cargar variables de entorno
         load_dotenv()
 
-        # Rutas y directorios
+        # Rutas y directorios; cada cuenta tiene su perfil, sesión y logs propios
+        self.account = validate_account_name(account) if account else None
         self.abs_path = os.path.dirname(os.path.abspath(__file__))
-        self.browser_data_path = os.path.join(self.abs_path, "browser_data")
-        self.session_path = os.path.join(self.abs_path, "whatsapp_session.pkl")
-        self.logs_path = os.path.join(self.abs_path, "logs")
+        base_path = (
+            os.path.join(self.abs_path, "accounts", account) if account else self.abs_path
+        )
+        self.browser_data_path = os.path.join(base_path, "browser_data")
+        self.session_path = os.path.join(base_path, "whatsapp_session")
+        self.logs_path = os.path.join(base_path, "logs")
 
         # Crear directorios necesarios
         os.makedirs(self.browser_data_path, exist_ok=True)
@@ -24,6 +56,8 @@ class Config:
 
         # Cargar configuración desde archivo JSON
         self.config = self.load_config(config_file_path)
+        if account:
+            self.apply_account(account)
 
         # Obtener API keys desde variables de entorno
         self.llm_api_keys = {
@@ -39,6 +73,36 @@ class Config:
         )
         self.logger = logging.getLogger(__name__)
 
+    def apply_account(self, account):
+        """
+        Aplicar la configuración propia de una cuenta.
+
+        Se combinan los ajustes de accounts.<cuenta> con la configuración
+        general y los historiales, resúmenes y la caché de respuestas se
+        separan en un subdirectorio con el nombre de la cuenta.
+        """
+        overrides = self.config.get("accounts", {}).get(account, {})
+        self.config = merge_config(self.config, overrides)
+
+        chat_config = self.config.setdefault("chat", {})
+        chat_config["storage_path"] = os.path.join(
+            chat_config.get("storage_path", "chat_history"), account
+        )
+        sqlite_config = chat_config.get("sqlite", {})
+        if sqlite_config.get("path"):
+            sqlite_config["path"] = self._account_file(sqlite_config["path"], account)
+
+        cache_config = self.config.get("llm", {}).get("cache", {})
+        if cache_config.get("persist_path"):
+            cache_config["persist_path"] = self._account_file(
+                cache_config["persist_path"], account
+            )
+
+    @staticmethod
+    def _account_file(path, account):
+        """Ruta de un archivo dentro del subdirectorio de la cuenta"""
+        return os.path.join(os.path.dirname(path), account, os.path.basename(path))
+
     def load_config(self, config_file_path):
         try:
             if os.path.exists(config_file_path):
@@ -1,9 +1,14 @@
+import time
+import random
+import asyncio
 import logging
 from abc import ABC, abstractmethod
-import google.generativeai as genai
 
 logger = logging.getLogger(__name__)
 
+# Respuesta que se devuelve al usuario cuando el proveedor falla
+FALLBACK_RESPONSE = "Lo siento, no puedo responder en este momento."
+
 
 class LLMProvider(ABC):
     """Clase abstracta para proveedores de LLM"""
@@ -13,18 +18,45 @@ class LLMProvider(ABC):
         """Generar respuesta basada en el prompt"""
         pass
 
+    def generate_response_stream(self, prompt):
+        """
+        Generar la respuesta como una secuencia de fragmentos de texto.
+
+        Por defecto se devuelve la respuesta completa en un único fragmento.
+        """
+        yield self.generate_response(prompt)
+
+    async def agenerate_response(self, prompt):
+        """
+        Generar la respuesta sin bloquear el bucle de eventos.
+
+        Por defecto se ejecuta generate_response en el pool de hilos del bucle.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.generate_response, prompt)
+
+    def close(self):
+        """Liberar los recursos del proveedor"""
+        pass
+
 
 class GeminiProvider(LLMProvider):
     """Proveedor para Gemini AI"""
 
-    def __init__(self, api_key, model_name="gemini-2.0-flash"):
+    def __init__(self, api_key, model_name="gemini-2.0-flash", raise_errors=False):
         self.api_key = api_key
         self.model_name = model_name
+        # Con raise_errors los errores se propagan para que los gestione otra capa
+        self.raise_errors = raise_errors
         self._initialize()
 
     def _initialize(self):
         """Inicializar la API de Gemini"""
         try:
+            # Importación diferida: el SDK tarda en cargarse y solo lo
+            # necesitan los procesos que usan Gemini
+            import google.generativeai as genai
+
             genai.configure(api_key=self.api_key)
             self.model = genai.GenerativeModel(self.model_name)
             logger.info(f"Gemini inicializado con modelo {self.model_name}")
@@ -40,21 +72,277 @@ class GeminiProvider(LLMProvider):
             logger.info(f"LLM response: {response.text}")
             return response.text
         except Exception as e:
+            if self.raise_errors:
+                raise
+            logger.error(f"Error al generar respuesta con Gemini: {e}", exc_info=True)
+            return FALLBACK_RESPONSE
+
+    def generate_response_stream(self, prompt):
+        """Generar respuesta usando la API de Gemini en modo streaming"""
+        chunks = []
+        try:
+            for chunk in self.model.generate_content(prompt, stream=True):
+                if chunk.text:
+                    chunks.append(chunk.text)
+                    yield chunk.text
+            logger.info(f"LLM response: {''.join(chunks)}")
+        except Exception as e:
+            if self.raise_errors:
+                raise
+            logger.error(f"Error al generar respuesta con Gemini: {e}", exc_info=True)
+            if not chunks:
+                yield FALLBACK_RESPONSE
+
+    async def agenerate_response(self, prompt):
+        """Generar respuesta usando la API asíncrona de Gemini"""
+        try:
+            response = await self.model.generate_content_async(prompt)
+            logger.info(f"LLM response: {response.text}")
+            return response.text
+        except Exception as e:
+            if self.raise_errors:
+                raise
             logger.error(f"Error al generar respuesta con Gemini: {e}", exc_info=True)
-            return "Lo siento, no puedo responder en este momento."
+            return FALLBACK_RESPONSE
+
+
+class StubProvider(LLMProvider):
+    """
+    Proveedor local sin red, con respuesta y latencia configurables, para pruebas.
+
+    Puede inyectar fallos: con probabilidad failure_rate lanza un error y con
+    probabilidad hang_rate tarda hang_time segundos en responder.
+    """
+
+    DEFAULT_RESPONSE = (
+        "<Response><Messages><Message>Respuesta de prueba</Message></Messages></Response>"
+    )
+
+    def __init__(
+        self,
+        response=None,
+        latency=0.0,
+        chunk_size=20,
+        failure_rate=0.0,
+        hang_rate=0.0,
+        hang_time=60.0,
+        seed=None,
+    ):
+        self.response = response or self.DEFAULT_RESPONSE
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.failure_rate = failure_rate
+        self.hang_rate = hang_rate
+        self.hang_time = hang_time
+        self.random = random.Random(seed)
+        self.calls = 0
+
+    def _inject_fault(self):
+        """Devolver la latencia de la llamada o lanzar el fallo simulado"""
+        roll = self.random.random()
+        if roll < self.failure_rate:
+            raise ConnectionError("Fallo simulado del proveedor")
+        if roll < self.failure_rate + self.hang_rate:
+            return self.hang_time
+        return self.latency
+
+    def generate_response(self, prompt):
+        """Devolver la respuesta configurada tras la latencia simulada"""
+        self.calls += 1
+        latency = self._inject_fault()
+        if latency:
+            time.sleep(latency)
+        return self.response
+
+    def generate_response_stream(self, prompt):
+        """Devolver la respuesta en fragmentos repartiendo la latencia simulada"""
+        self.calls += 1
+        latency = self._inject_fault()
+        chunks = [
+            self.response[i : i + self.chunk_size]
+            for i in range(0, len(self.response), self.chunk_size)
+        ]
+        for chunk in chunks:
+            if latency:
+                time.sleep(latency / len(chunks))
+            yield chunk
+
+    async def agenerate_response(self, prompt):
+        """Devolver la respuesta configurada tras la latencia simulada, sin bloquear"""
+        self.calls += 1
+        latency = self._inject_fault()
+        if latency:
+            await asyncio.sleep(latency)
+        return self.response
 
 
 class LLMProviderFactory:
     @staticmethod
     def create_provider(provider_type, config):
-        """Crear una instancia de LLMProvider según el tipo"""
+        """Crear una instancia de LLMProvider según el tipo, con las capas configuradas"""
+        provider = LLMProviderFactory.create_base_provider(provider_type, config)
+        if not provider:
+            return None
+        return LLMProviderFactory.apply_layers(provider, config)
+
+    @staticmethod
+    def apply_layers(provider, config):
+        """Envolver el proveedor con las capas activadas en la configuración"""
+        llm_config = config.config.get("llm", {})
+
+        # El limitador va por dentro de la caché: los aciertos no gastan cuota
+        rate_config = llm_config.get("rate_limit", {})
+        if rate_config.get("enabled", False):
+            from providers.rate_limiter import RateLimiter
+            from providers.rate_limited_provider import RateLimitedProvider
+
+            limiter = RateLimiter(
+                max_in_flight=rate_config.get("max_in_flight", 4),
+                requests_per_minute=rate_config.get("requests_per_minute"),
+                tokens_per_minute=rate_config.get("tokens_per_minute"),
+                chars_per_token=rate_config.get("chars_per_token", 4),
+            )
+            provider = RateLimitedProvider(provider, limiter)
+
+        # Cada reintento o petición duplicada pasa por el limitador
+        resilience_config = llm_config.get("resilience", {})
+        if resilience_config.get("enabled", False):
+            from providers.resilient_provider import ResilientProvider
+
+            provider = ResilientProvider(
+                provider,
+                timeout=resilience_config.get("timeout", 30.0),
+                deadline=resilience_config.get("deadline", 60.0),
+                max_retries=resilience_config.get("max_retries", 3),
+                backoff_base=resilience_config.get("backoff_base", 0.5),
+                backoff_max=resilience_config.get("backoff_max", 8.0),
+                failure_threshold=resilience_config.get("failure_threshold", 5),
+                reset_timeout=resilience_config.get("reset_timeout", 30.0),
+                hedge=resilience_config.get("hedge", False),
+                hedge_quantile=resilience_config.get("hedge_quantile", 0.95),
+                hedge_min_samples=resilience_config.get("hedge_min_samples", 20),
+                max_concurrent_calls=resilience_config.get("max_concurrent_calls", 4),
+            )
+
+        cache_config = llm_config.get("cache", {})
+        if cache_config.get("enabled", False):
+            from providers.cache_provider import CachingProvider
+
+            provider = CachingProvider(
+                provider,
+                ttl=cache_config.get("ttl", 3600),
+                max_entries=cache_config.get("max_entries", 1000),
+                max_bytes=cache_config.get("max_bytes", 5 * 1024 * 1024),
+                persist_path=cache_config.get("persist_path"),
+                persist_every=cache_config.get("persist_every", 20),
+            )
+
+        return provider
+
+    @staticmethod
+    def create_base_provider(provider_type, config, options=None):
+        """
+        Crear una instancia de LLMProvider según el tipo.
+
+        options sobrescribe la configuración del proveedor (por ejemplo, el
+        modelo de Gemini o la latencia del stub) para los backends del router.
+        """
+        llm_config = config.config.get("llm", {})
+        options = options or {}
+        # La capa de resiliencia y el router necesitan ver los errores del proveedor
+        raise_errors = options.get(
+            "raise_errors", llm_config.get("resilience", {}).get("enabled", False)
+        )
+
         if provider_type.lower() == "gemini":
             api_key = config.llm_api_keys.get("gemini")
             if not api_key:
                 logger.error("API key de Gemini no encontrada")
                 return None
-            return GeminiProvider(api_key)
+            return GeminiProvider(
+                api_key,
+                model_name=options.get("model", "gemini-2.0-flash"),
+                raise_errors=raise_errors,
+            )
+        elif provider_type.lower() == "stub":
+            stub_config = {**llm_config.get("stub", {}), **options}
+            return StubProvider(
+                response=stub_config.get("response"),
+                latency=stub_config.get("latency", 0.0),
+                chunk_size=stub_config.get("chunk_size", 20),
+                failure_rate=stub_config.get("failure_rate", 0.0),
+                hang_rate=stub_config.get("hang_rate", 0.0),
+                hang_time=stub_config.get("hang_time", 60.0),
+                seed=stub_config.get("seed"),
+            )
+        elif provider_type.lower() == "router":
+            return LLMProviderFactory.create_router(config)
+        elif provider_type.lower() == "record":
+            from providers.replay_provider import RecordingProvider
+
+            replay_config = llm_config.get("replay", {})
+            provider = LLMProviderFactory.create_base_provider(
+                replay_config.get("record_provider", "gemini"), config, options
+            )
+            if not provider:
+                return None
+            return RecordingProvider(
+                provider, replay_config.get("path", "recordings/llm_responses.jsonl")
+            )
+        elif provider_type.lower() == "replay":
+            from providers.replay_provider import ReplayProvider
+
+            replay_config = llm_config.get("replay", {})
+            return ReplayProvider(
+                replay_config.get("path", "recordings/llm_responses.jsonl"),
+                latency=replay_config.get("latency", "recorded"),
+                speed=replay_config.get("speed", 1.0),
+                strict=replay_config.get("strict", False),
+            )
         # Aquí se pueden agregar más proveedores en el futuro
         else:
             logger.error(f"Proveedor LLM no soportado: {provider_type}")
             return None
+
+    @staticmethod
+    def create_router(config):
+        """Crear un RouterProvider con los backends de llm.router.backends"""
+        from providers.router_provider import Backend, RouterProvider
+
+        router_config = config.config.get("llm", {}).get("router", {})
+        backends = []
+        for index, entry in enumerate(router_config.get("backends", [])):
+            options = {
+                key: value
+                for key, value in entry.items()
+                if key not in ("name", "type", "max_in_flight")
+            }
+            options.setdefault("raise_errors", True)
+            backend_type = entry.get("type", "gemini")
+            provider = LLMProviderFactory.create_base_provider(
+                backend_type, config, options
+            )
+            if not provider:
+                logger.warning(f"Backend del router omitido: {entry}")
+                continue
+            backends.append(
+                Backend(
+                    entry.get("name", f"{backend_type}-{index}"),
+                    provider,
+                    max_in_flight=entry.get("max_in_flight", 4),
+                )
+            )
+
+        if not backends:
+            logger.error("El router no tiene ningún backend disponible")
+            return None
+
+        logger.info(f"Router LLM con backends: {', '.join(b.name for b in backends)}")
+        return RouterProvider(
+            backends,
+            alpha=router_config.get("alpha", 0.2),
+            max_error_rate=router_config.get("max_error_rate", 0.5),
+            cooldown=router_config.get("cooldown", 30.0),
+            probe_interval=router_config.get("probe_interval", 60.0),
+            queue_timeout=router_config.get("queue_timeout", 30.0),
+        )
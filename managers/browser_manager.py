@@ -1,9 +1,11 @@
 import os
+import time
 import logging
 from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
+from managers.driver_resolver import DriverResolver
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +15,8 @@ class BrowserManager:
         self.config = config
         self.driver = None
         self.service = None
+        # Duración (s) de cada fase del arranque del navegador
+        self.timings = {}
 
     def initialize_browser(self):
         """Inicializa el navegador con las opciones configuradas"""
@@ -38,19 +42,41 @@ class BrowserManager:
             if window_size:
                 chrome_options.add_argument(f"--window-size={window_size}")
 
-            # Configurar servicio y logs
-            self.service = Service(ChromeDriverManager().install())
-            self.service.log_path = os.path.join(
-                self.config.logs_path, "chromedriver.log"
+            # Localizar chromedriver: ruta configurada, caché local o descarga
+            start = time.perf_counter()
+            resolver = DriverResolver(self.config)
+            driver_path = resolver.resolve()
+            self.timings["driver_resolve"] = time.perf_counter() - start
+            logger.info(
+                f"chromedriver ({resolver.source}): {driver_path} "
+                f"en {self.timings['driver_resolve']:.2f}s"
             )
 
             # Inicializar el navegador
-            self.driver = webdriver.Chrome(service=self.service, options=chrome_options)
+            start = time.perf_counter()
+            try:
+                self.driver = self._launch(driver_path, chrome_options)
+            except WebDriverException as e:
+                if resolver.source != "cache":
+                    raise
+                # Chrome se actualizó sin cambiar de versión mayor o la copia
+                # en caché está dañada: descartarla y descargar de nuevo
+                logger.warning(f"El chromedriver en caché no arrancó Chrome: {e.msg}")
+                resolver.invalidate(driver_path)
+                self.driver = self._launch(resolver.download(), chrome_options)
+            self.timings["chrome_launch"] = time.perf_counter() - start
+            logger.info(f"Chrome iniciado en {self.timings['chrome_launch']:.2f}s")
             return True
         except Exception as e:
             logger.error(f"Error al inicializar el navegador: {e}", exc_info=True)
             return False
 
+    def _launch(self, driver_path, chrome_options):
+        """Arrancar Chrome con el chromedriver indicado"""
+        self.service = Service(driver_path)
+        self.service.log_path = os.path.join(self.config.logs_path, "chromedriver.log")
+        return webdriver.Chrome(service=self.service, options=chrome_options)
+
     def close(self):
         """Cierra el navegador"""
         if self.driver:
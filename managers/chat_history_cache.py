@@ -0,0 +1,127 @@
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Sobrecoste aproximado en bytes de cada mensaje además de su texto
+MESSAGE_OVERHEAD_BYTES = 200
+
+
+class ChatState:
+    """Estado en memoria de un chat: historial, índice de huellas y marca de agua"""
+
+    def __init__(self, messages=None):
+        self.messages = messages or []
+        # dict ordenado por inserción para descartar primero las huellas más antiguas
+        self.index = dict.fromkeys(msg["id"] for msg in self.messages)
+        self.high_water_mark = self.messages[-1]["id"] if self.messages else None
+        self.dirty = False
+        self.size = 0
+        self.update_size()
+
+    def update_size(self):
+        """Recalcular el tamaño aproximado en bytes del historial"""
+        self.size = sum(
+            len(str(msg.get("message", ""))) + MESSAGE_OVERHEAD_BYTES
+            for msg in self.messages
+        )
+        return self.size
+
+
+class ChatHistoryCache:
+    """
+    Caché LRU de estados de chat acotada por número de chats y bytes aproximados.
+
+    Al expulsar una entrada marcada como sucia se invoca on_evict(nombre, estado)
+    para que el propietario la escriba antes de descartarla.
+    """
+
+    def __init__(self, max_chats=500, max_bytes=16 * 1024 * 1024, on_evict=None):
+        self.max_chats = max_chats
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        self._entries = OrderedDict()
+        self.total_bytes = 0
+
+        # Contadores para monitorización
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, chat_name):
+        return chat_name in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, chat_name):
+        """Obtener el estado de un chat marcándolo como usado recientemente"""
+        state = self._entries.get(chat_name)
+        if state is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end(chat_name)
+        return state
+
+    def put(self, chat_name, state):
+        """Añadir o reemplazar el estado de un chat y expulsar lo que sobre"""
+        previous = self._entries.pop(chat_name, None)
+        if previous is not None:
+            self.total_bytes -= previous.size
+
+        self._entries[chat_name] = state
+        self.total_bytes += state.size
+        self._evict()
+
+    def resize(self, chat_name):
+        """Actualizar el tamaño contabilizado de un chat tras modificar su historial"""
+        state = self._entries.get(chat_name)
+        if state is None:
+            return
+
+        self.total_bytes -= state.size
+        self.total_bytes += state.update_size()
+        self._evict()
+
+    def pop(self, chat_name):
+        """Quitar un chat de la caché sin escribirlo"""
+        state = self._entries.pop(chat_name, None)
+        if state is not None:
+            self.total_bytes -= state.size
+        return state
+
+    def clear(self):
+        """Vaciar la caché sin escribir las entradas"""
+        self._entries.clear()
+        self.total_bytes = 0
+
+    def dirty_items(self):
+        """Listar los chats con cambios sin escribir"""
+        return [(name, state) for name, state in self._entries.items() if state.dirty]
+
+    def _evict(self):
+        """Expulsar los chats menos usados mientras se superen los límites"""
+        # Nunca se expulsa la entrada más reciente, que es la que se está usando
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_chats or self.total_bytes > self.max_bytes
+        ):
+            chat_name, state = self._entries.popitem(last=False)
+            self.total_bytes -= state.size
+            self.evictions += 1
+            if state.dirty and self.on_evict:
+                self.on_evict(chat_name, state)
+            logger.debug(f"Historial expulsado de la caché: {chat_name}")
+
+    def get_stats(self):
+        """Obtener los contadores y la ocupación de la caché"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "chats": len(self._entries),
+            "bytes": self.total_bytes,
+        }
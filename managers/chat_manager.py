@@ -1,75 +1,217 @@
+import hashlib
 import logging
+from managers.chat_history_cache import ChatHistoryCache, ChatState
 
 logger = logging.getLogger(__name__)
 
 
+def compute_message_id(message, occurrence=0):
+    """
+    Obtener el identificador estable de un mensaje.
+
+    Usa el data-id de WhatsApp si el mensaje lo trae; si no, una huella del
+    remitente, fecha, hora y texto. occurrence distingue mensajes idénticos
+    repetidos dentro de un mismo lote.
+    """
+    if message.get("id"):
+        return message["id"]
+
+    raw = "\x1f".join(
+        str(message.get(key, "")) for key in ("sender", "date", "time", "message")
+    )
+    if occurrence:
+        raw = f"{raw}\x1f{occurrence}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def assign_message_ids(messages):
+    """Devolver copias de los mensajes con el campo 'id' asignado"""
+    occurrences = {}
+    identified = []
+    for message in messages:
+        if message.get("id"):
+            identified.append(message)
+            continue
+        fingerprint = compute_message_id(message)
+        occurrence = occurrences.get(fingerprint, 0)
+        occurrences[fingerprint] = occurrence + 1
+        identified.append({**message, "id": compute_message_id(message, occurrence)})
+    return identified
+
+
 class ChatManager:
-    def __init__(self, config, persistence_manager=None):
+    def __init__(self, config, persistence_manager=None, summarizer=None):
         self.config = config
-        self.max_history = config.config.get("chat", {}).get("max_history", 20)
-        self.chat_history = {}
+        self.summarizer = summarizer
+        chat_config = config.config.get("chat", {})
+        self.max_history = chat_config.get("max_history", 20)
         self.persistence_manager = persistence_manager
 
-        # Cargar historiales existentes si hay un gestor de persistencia
-        if self.persistence_manager:
-            self._load_existing_chats()
+        # Tamaño máximo del índice de huellas por chat
+        self.index_size = chat_config.get(
+            "fingerprint_index_size", max(200, self.max_history * 5)
+        )
+
+        # Historiales cargados bajo demanda en una caché LRU acotada; sin
+        # persistencia no se puede expulsar nada sin perder el historial
+        cache_config = chat_config.get("cache", {})
+        unbounded = float("inf")
+        self.cache = ChatHistoryCache(
+            max_chats=cache_config.get("max_chats", 500)
+            if persistence_manager
+            else unbounded,
+            max_bytes=cache_config.get("max_bytes", 16 * 1024 * 1024)
+            if persistence_manager
+            else unbounded,
+            on_evict=self._write_back,
+        )
 
-    def _load_existing_chats(self):
-        """Cargar historiales existentes desde archivos"""
-        available_chats = self.persistence_manager.list_available_chats()
-        for chat_name in available_chats:
+    def _get_state(self, chat_name):
+        """Obtener el estado de un chat, cargándolo desde persistencia si no está en caché"""
+        state = self.cache.get(chat_name)
+        if state is not None:
+            return state
+        return self._load_state(chat_name)
+
+    def _load_state(self, chat_name):
+        """Cargar el historial de un chat desde persistencia y guardarlo en caché"""
+        messages = []
+        if self.persistence_manager:
             messages = self.persistence_manager.load_chat_history(chat_name)
             # Asegurarse de respetar el máximo de mensajes configurado
             if len(messages) > self.max_history:
                 messages = messages[-self.max_history :]
-            self.chat_history[chat_name] = messages
             logger.debug(
                 f"Historial cargado para chat: {chat_name}, {len(messages)} mensajes"
             )
 
+        state = ChatState(assign_message_ids(messages))
+        self.cache.put(chat_name, state)
+        return state
+
+    def preload(self, limit):
+        """
+        Cargar en caché hasta limit historiales persistidos.
+
+        Se usa durante el arranque, en paralelo con el navegador, para que las
+        primeras respuestas no esperen a leer el historial del disco.
+        """
+        if not self.persistence_manager or limit <= 0:
+            return 0
+        limit = min(limit, self.cache.max_chats)
+
+        loaded = 0
+        for chat_name in self.persistence_manager.list_available_chats():
+            if loaded >= limit:
+                break
+            if chat_name not in self.cache:
+                self._load_state(chat_name)
+                loaded += 1
+        return loaded
+
+    def _write_back(self, chat_name, state):
+        """Escribir en persistencia el historial de un chat con cambios pendientes"""
+        if not self.persistence_manager:
+            state.dirty = False
+            return True
+
+        if self.persistence_manager.save_chat_history(chat_name, state.messages):
+            state.dirty = False
+            return True
+        return False
+
     def add_messages(self, chat_name, messages):
-        """Añadir mensajes al historial de un chat"""
+        """
+        Añadir mensajes al historial de un chat.
+
+        Solo se almacenan los mensajes que no estaban ya en el historial;
+        devuelve la lista de mensajes nuevos (vacía si no había ninguno).
+        """
         if not isinstance(messages, list):
             messages = [messages]
 
-        if chat_name not in self.chat_history:
-            self.chat_history[chat_name] = []
+        state = self._get_state(chat_name)
+        messages = assign_message_ids(messages)
+
+        # Descartar todo lo anterior a la marca de agua si aparece en el lote
+        message_ids = [msg["id"] for msg in messages]
+        if state.high_water_mark in message_ids:
+            last_seen = (
+                len(message_ids) - 1 - message_ids[::-1].index(state.high_water_mark)
+            )
+            messages = messages[last_seen + 1 :]
+
+        new_messages = []
+        for msg in messages:
+            if msg["id"] not in state.index:
+                state.index[msg["id"]] = None
+                new_messages.append(msg)
+
+        if not new_messages:
+            return []
+
+        # Limitar el tamaño del índice de huellas
+        while len(state.index) > self.index_size:
+            del state.index[next(iter(state.index))]
+        state.high_water_mark = new_messages[-1]["id"]
 
         # Agregar nuevos mensajes al historial
-        self.chat_history[chat_name].extend(messages)
+        state.messages.extend(new_messages)
 
-        # Limitar el historial al número máximo configurado
-        if len(self.chat_history[chat_name]) > self.max_history:
-            self.chat_history[chat_name] = self.chat_history[chat_name][
-                -self.max_history :
-            ]
+        # Limitar el historial al número máximo configurado; los mensajes
+        # descartados se incorporan al resumen en segundo plano
+        if len(state.messages) > self.max_history:
+            if self.summarizer:
+                self.summarizer.enqueue(chat_name, state.messages[: -self.max_history])
+            state.messages = state.messages[-self.max_history :]
 
-        # Persistir los cambios si hay un gestor de persistencia
-        if self.persistence_manager:
-            self.persistence_manager.save_chat_history(
-                chat_name, self.chat_history[chat_name]
-            )
+        # Persistir los cambios; si falla, la entrada queda sucia para reintentarlo
+        state.dirty = True
+        self._write_back(chat_name, state)
+        self.cache.resize(chat_name)
+
+        return new_messages
 
     def get_chat_history(self, chat_name):
         """Obtener el historial de un chat"""
-        # Si no está en memoria y hay un gestor de persistencia, intentar cargarlo
-        if chat_name not in self.chat_history and self.persistence_manager:
-            messages = self.persistence_manager.load_chat_history(chat_name)
-            if messages:
-                self.chat_history[chat_name] = messages
+        return self._get_state(chat_name).messages
 
-        return self.chat_history.get(chat_name, [])
+    def get_chat_summary(self, chat_name):
+        """Obtener el resumen de la parte de la conversación fuera del historial"""
+        if not self.summarizer:
+            return ""
+        return self.summarizer.get_summary(chat_name)
 
     def clear_chat_history(self, chat_name=None):
         """Limpiar el historial de un chat o de todos los chats"""
+        if self.summarizer:
+            self.summarizer.delete_summary(chat_name)
         if chat_name:
-            if chat_name in self.chat_history:
-                self.chat_history[chat_name] = []
-                # Eliminar también de persistencia
-                if self.persistence_manager:
-                    self.persistence_manager.delete_chat_history(chat_name)
+            self.cache.pop(chat_name)
+            # Eliminar también de persistencia
+            if self.persistence_manager:
+                self.persistence_manager.delete_chat_history(chat_name)
         else:
-            self.chat_history = {}
+            self.cache.clear()
             # Eliminar todos los historiales persistentes
             if self.persistence_manager:
                 self.persistence_manager.delete_chat_history()
+
+    def get_cache_stats(self):
+        """Obtener aciertos, fallos, expulsiones y ocupación de la caché de historiales"""
+        return self.cache.get_stats()
+
+    def flush(self):
+        """Escribir los historiales con cambios pendientes y confirmar el almacenamiento"""
+        for chat_name, state in self.cache.dirty_items():
+            self._write_back(chat_name, state)
+        if self.persistence_manager:
+            self.persistence_manager.flush()
+
+    def close(self):
+        """Detener los resúmenes, confirmar las escrituras y cerrar el almacenamiento"""
+        if self.summarizer:
+            self.summarizer.close()
+        self.flush()
+        if self.persistence_manager:
+            self.persistence_manager.close()
@@ -13,6 +13,8 @@ class ChatPersistenceManager:
         self.storage_path = config.config.get("chat", {}).get(
             "storage_path", "chat_history"
         )
+        # Política de durabilidad: forzar a disco (fsync) cada escritura
+        self.fsync = config.config.get("chat", {}).get("fsync", False)
 
         # Crear el directorio si no existe
         if not os.path.exists(self.storage_path):
@@ -36,8 +38,12 @@ class ChatPersistenceManager:
             file_path = os.path.join(self.storage_path, f"{chat_name}.json")
             data = {"last_updated": datetime.now().isoformat(), "messages": messages}
 
-            with open(file_path, "w", encoding="utf-8") as f:
+            # Escribir en un archivo temporal y reemplazar para no dejarlo a medias
+            temp_path = f"{file_path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
                 json.dump(data, f, ensure_ascii=False, indent=2)
+                self._sync(f)
+            os.replace(temp_path, file_path)
 
             logger.debug(f"Historial guardado para chat '{chat_name}'")
             return True
@@ -47,6 +53,12 @@ class ChatPersistenceManager:
             )
             return False
 
+    def _sync(self, file):
+        """Forzar a disco un archivo abierto si la política de durabilidad lo pide"""
+        if self.fsync:
+            file.flush()
+            os.fsync(file.fileno())
+
     def load_chat_history(self, chat_name):
         """Cargar el historial de chat desde un archivo JSON"""
         file_path = os.path.join(self.storage_path, f"{chat_name}.json")
@@ -97,3 +109,11 @@ class ChatPersistenceManager:
         except Exception as e:
             logger.error(f"Error al listar chats disponibles: {str(e)}")
             return []
+
+    def flush(self):
+        """Confirmar las escrituras pendientes (el backend JSON escribe al guardar)"""
+        return True
+
+    def close(self):
+        """Liberar los recursos del backend"""
+        self.flush()
@@ -0,0 +1,104 @@
+import math
+import logging
+import threading
+from collections import OrderedDict
+from managers.chat_manager import compute_message_id
+
+logger = logging.getLogger(__name__)
+
+# Caracteres aproximados que ocupa el envoltorio <Message sender=... date=... time=...>
+MESSAGE_MARKUP_CHARS = 45
+TRUNCATION_MARK = " [...]"
+
+
+class ContextBuilder:
+    """
+    Selecciona el historial que cabe en el presupuesto de tokens de un prompt.
+
+    Los tokens se estiman por caracteres (chars_per_token) y la estimación de
+    cada mensaje se guarda en caché por id. El historial se rellena del mensaje
+    más reciente al más antiguo hasta agotar max_tokens, recortando los
+    mensajes que superan max_message_tokens.
+    """
+
+    def __init__(self, config):
+        context_config = config.config.get("llm", {}).get("context", {})
+        self.enabled = context_config.get("enabled", True)
+        self.max_tokens = context_config.get("max_tokens", 2000)
+        self.max_message_tokens = context_config.get("max_message_tokens", 300)
+        self.chars_per_token = context_config.get("chars_per_token", 4)
+        self.cache_size = context_config.get("estimate_cache_size", 5000)
+
+        self._estimates = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _count_tokens(self, text):
+        return math.ceil(len(text) / self.chars_per_token)
+
+    def _markup_tokens(self, message):
+        """Tokens del envoltorio XML y los metadatos de un mensaje"""
+        metadata = sum(
+            len(str(message.get(key, ""))) for key in ("sender", "date", "time")
+        )
+        return self._count_tokens(" " * (metadata + MESSAGE_MARKUP_CHARS))
+
+    def estimate_tokens(self, message):
+        """Estimar los tokens de un mensaje formateado, usando la caché por id"""
+        message_id = message.get("id") or compute_message_id(message)
+        with self._lock:
+            tokens = self._estimates.get(message_id)
+            if tokens is not None:
+                self._estimates.move_to_end(message_id)
+                return tokens
+
+        tokens = self._count_tokens(str(message.get("message", "")))
+        tokens += self._markup_tokens(message)
+
+        with self._lock:
+            self._estimates[message_id] = tokens
+            while len(self._estimates) > self.cache_size:
+                self._estimates.popitem(last=False)
+        return tokens
+
+    def _truncate(self, message, token_limit):
+        """Recortar el texto de un mensaje para que no supere token_limit"""
+        text_tokens = max(1, token_limit - self._markup_tokens(message))
+        max_chars = max(1, text_tokens * self.chars_per_token - len(TRUNCATION_MARK))
+        truncated = {
+            **message,
+            "message": str(message["message"])[:max_chars] + TRUNCATION_MARK,
+        }
+        return truncated, token_limit
+
+    def build(self, messages):
+        """
+        Seleccionar los mensajes más recientes que caben en el presupuesto.
+
+        Returns:
+            tuple: (mensajes seleccionados en orden cronológico, tokens usados)
+        """
+        if not self.enabled:
+            return list(messages), sum(self.estimate_tokens(msg) for msg in messages)
+
+        message_limit = min(self.max_message_tokens, self.max_tokens)
+        selected = []
+        tokens_used = 0
+
+        for message in reversed(messages):
+            tokens = self.estimate_tokens(message)
+            if tokens > message_limit:
+                message, tokens = self._truncate(message, message_limit)
+
+            if tokens_used + tokens > self.max_tokens:
+                break
+
+            selected.append(message)
+            tokens_used += tokens
+
+        selected.reverse()
+        if len(selected) < len(messages):
+            logger.debug(
+                f"Contexto recortado a {len(selected)}/{len(messages)} mensajes "
+                f"({tokens_used} tokens)"
+            )
+        return selected, tokens_used
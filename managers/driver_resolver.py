@@ -0,0 +1,218 @@
+import os
+import re
+import sys
+import json
+import stat
+import shutil
+import logging
+import tempfile
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+DRIVER_NAME = "chromedriver.exe" if sys.platform == "win32" else "chromedriver"
+VERSION_PATTERN = re.compile(r"(\d+)\.(\d+)\.(\d+)\.(\d+)")
+
+# Ejecutables de Chrome que se prueban si no se configura browser.binary
+CHROME_CANDIDATES = {
+    "linux": [
+        "google-chrome",
+        "google-chrome-stable",
+        "chromium",
+        "chromium-browser",
+    ],
+    "darwin": [
+        "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome",
+        "/Applications/Chromium.app/Contents/MacOS/Chromium",
+    ],
+}
+
+
+def run_version_command(executable, timeout=10):
+    """Ejecutar 'executable --version' y devolver la versión completa, o None"""
+    try:
+        output = subprocess.run(
+            [executable, "--version"],
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+        ).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    match = VERSION_PATTERN.search(output or "")
+    return match.group(0) if match else None
+
+
+def detect_chrome_version(binary=None):
+    """Versión de Chrome instalada, o None si no se encuentra"""
+    if sys.platform == "win32" and not binary:
+        # En Windows chrome.exe --version no escribe nada; se consulta el registro
+        try:
+            import winreg
+
+            with winreg.OpenKey(
+                winreg.HKEY_CURRENT_USER, r"Software\Google\Chrome\BLBeacon"
+            ) as key:
+                return winreg.QueryValueEx(key, "version")[0]
+        except OSError:
+            return None
+
+    candidates = [binary] if binary else CHROME_CANDIDATES.get(sys.platform, CHROME_CANDIDATES["linux"])
+    for candidate in candidates:
+        executable = shutil.which(candidate) or (candidate if os.path.isfile(candidate) else None)
+        if executable:
+            version = run_version_command(executable)
+            if version:
+                return version
+    return None
+
+
+def major_version(version):
+    return version.split(".")[0] if version else None
+
+
+def is_executable(path):
+    return bool(path) and os.path.isfile(path) and os.access(path, os.X_OK)
+
+
+def atomic_write(path, write, mode=None):
+    """
+    Escribir un archivo de forma atómica.
+
+    write(file) escribe el contenido en un temporal del mismo directorio que
+    después sustituye al destino con os.replace, así que otros procesos ven el
+    archivo anterior o el completo, nunca uno a medio escribir.
+    """
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            write(file)
+        if mode is not None:
+            os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class DriverResolver:
+    """
+    Localiza el chromedriver a usar, de la opción más barata a la más cara.
+
+    1. Ruta explícita: browser.driver_path o la variable CHROME_DRIVER_PATH.
+    2. Caché local en browser.driver_cache_path, una carpeta por versión
+       mayor de Chrome; solo se usa la que coincide con el Chrome instalado.
+    3. Descarga con webdriver_manager (requiere red), que se copia a la caché
+       para los siguientes arranques.
+
+    La caché es común a todas las cuentas: el driver depende de la máquina,
+    no del perfil.
+    """
+
+    def __init__(self, config):
+        browser_config = config.config.get("browser", {})
+        self.explicit_path = browser_config.get("driver_path") or os.getenv(
+            "CHROME_DRIVER_PATH"
+        )
+        self.chrome_binary = browser_config.get("binary")
+        self.cache_path = os.path.join(
+            config.abs_path, browser_config.get("driver_cache_path", "drivers")
+        )
+        self.source = None
+        self.chrome_version = None
+
+    def resolve(self):
+        """Devolver la ruta del chromedriver y anotar su origen en self.source"""
+        if self.explicit_path:
+            if is_executable(self.explicit_path):
+                self.source = "config"
+                return self.explicit_path
+            logger.warning(
+                f"El chromedriver configurado no existe o no es ejecutable: {self.explicit_path}"
+            )
+
+        self.chrome_version = detect_chrome_version(self.chrome_binary)
+        cached = self.cached_driver()
+        if cached:
+            self.source = "cache"
+            return cached
+
+        self.source = "download"
+        return self.download()
+
+    def _cache_dir(self, chrome_major):
+        return os.path.join(self.cache_path, chrome_major)
+
+    def cached_driver(self):
+        """Driver en caché para la versión de Chrome instalada, o None"""
+        chrome_major = major_version(self.chrome_version)
+        if not chrome_major:
+            logger.info("No se pudo detectar la versión de Chrome; se omite la caché")
+            return None
+
+        cache_dir = self._cache_dir(chrome_major)
+        path = os.path.join(cache_dir, DRIVER_NAME)
+        if not is_executable(path):
+            return None
+
+        # El manifiesto evita ejecutar el driver para conocer su versión
+        try:
+            with open(os.path.join(cache_dir, "manifest.json"), "r", encoding="utf-8") as file:
+                manifest = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if major_version(manifest.get("driver_version")) != chrome_major:
+            return None
+        return path
+
+    def download(self):
+        """Descargar el driver con webdriver_manager y guardarlo en la caché"""
+        from webdriver_manager.chrome import ChromeDriverManager
+
+        path = ChromeDriverManager().install()
+        driver_version = run_version_command(path)
+        chrome_major = major_version(self.chrome_version) or major_version(driver_version)
+        if not chrome_major or major_version(driver_version) != chrome_major:
+            logger.warning(
+                f"chromedriver {driver_version} no coincide con Chrome {self.chrome_version}; "
+                "no se guarda en caché"
+            )
+            return path
+
+        try:
+            cache_dir = self._cache_dir(chrome_major)
+            os.makedirs(cache_dir, exist_ok=True)
+            cached = os.path.join(cache_dir, DRIVER_NAME)
+
+            # La caché es común a todas las cuentas y el supervisor arranca
+            # varios procesos a la vez: el binario se sustituye de forma
+            # atómica y el manifiesto, que lo valida, se escribe después
+            def copy_driver(file):
+                with open(path, "rb") as source:
+                    shutil.copyfileobj(source, file)
+
+            atomic_write(
+                cached,
+                copy_driver,
+                mode=stat.S_IMODE(os.stat(path).st_mode) | stat.S_IRUSR | stat.S_IXUSR,
+            )
+            manifest = {"driver_version": driver_version, "chrome_version": self.chrome_version}
+            atomic_write(
+                os.path.join(cache_dir, "manifest.json"),
+                lambda file: file.write(json.dumps(manifest).encode("utf-8")),
+            )
+            return cached
+        except OSError as e:
+            logger.warning(f"No se pudo guardar chromedriver en caché: {e}")
+            return path
+
+    def invalidate(self, path):
+        """Descartar una entrada de la caché que no ha podido arrancar Chrome"""
+        cache_dir = os.path.dirname(path)
+        if os.path.dirname(cache_dir) == self.cache_path:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            logger.info(f"Entrada de caché de chromedriver descartada: {cache_dir}")
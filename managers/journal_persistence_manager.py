@@ -0,0 +1,212 @@
+import os
+import json
+import logging
+import threading
+from datetime import datetime
+from managers.chat_manager import compute_message_id
+from managers.chat_persistence_manager import ChatPersistenceManager
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_SUFFIX = ".snapshot.json"
+JOURNAL_SUFFIX = ".journal"
+
+
+class JournalPersistenceManager(ChatPersistenceManager):
+    """
+    Almacenamiento de historiales en un diario de solo anexado.
+
+    Cada lote de mensajes nuevos se añade como una línea JSON al archivo
+    <chat>.journal. Cada cierto número de anexados el diario se compacta en
+    <chat>.snapshot.json, y al cargar se reproduce la instantánea más la cola
+    del diario.
+    """
+
+    def __init__(self, config):
+        super().__init__(config)
+        journal_config = config.config.get("chat", {}).get("journal", {})
+        self.compact_every = journal_config.get("compact_every", 50)
+        self.compact_bytes = journal_config.get("compact_bytes", 1024 * 1024)
+
+        # Ids ya persistidos y anexados desde la última compactación, por chat
+        self._persisted_ids = {}
+        self._append_counts = {}
+        self._lock = threading.Lock()
+
+    def _snapshot_path(self, chat_name):
+        return os.path.join(self.storage_path, f"{chat_name}{SNAPSHOT_SUFFIX}")
+
+    def _journal_path(self, chat_name):
+        return os.path.join(self.storage_path, f"{chat_name}{JOURNAL_SUFFIX}")
+
+    def save_chat_history(self, chat_name, messages):
+        """Anexar al diario los mensajes del historial que aún no se habían guardado"""
+        try:
+            with self._lock:
+                persisted = self._get_persisted_ids(chat_name)
+                new_messages = [
+                    msg for msg in messages if self._message_id(msg) not in persisted
+                ]
+                if not new_messages:
+                    return True
+
+                # Validar solo los mensajes nuevos
+                for msg in new_messages:
+                    if (
+                        not isinstance(msg, dict)
+                        or "sender" not in msg
+                        or "message" not in msg
+                    ):
+                        raise ValueError(
+                            "Formato de mensaje inválido. Se requiere {'sender': str, 'message': str}"
+                        )
+
+                entry = {"ts": datetime.now().isoformat(), "messages": new_messages}
+                journal_path = self._journal_path(chat_name)
+                with open(journal_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                    self._sync(f)
+
+                persisted.update(self._message_id(msg) for msg in new_messages)
+                self._append_counts[chat_name] = (
+                    self._append_counts.get(chat_name, 0) + 1
+                )
+
+                if (
+                    self._append_counts[chat_name] >= self.compact_every
+                    or os.path.getsize(journal_path) >= self.compact_bytes
+                ):
+                    self._compact(chat_name, messages)
+
+            logger.debug(
+                f"Diario actualizado para chat '{chat_name}': {len(new_messages)} mensajes"
+            )
+            return True
+        except Exception as e:
+            logger.error(
+                f"Error al guardar historial para chat '{chat_name}': {str(e)}"
+            )
+            return False
+
+    def _compact(self, chat_name, messages):
+        """Volcar el historial actual a la instantánea y vaciar el diario"""
+        snapshot_path = self._snapshot_path(chat_name)
+        temp_path = f"{snapshot_path}.tmp"
+        data = {"last_updated": datetime.now().isoformat(), "messages": messages}
+
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+            self._sync(f)
+        os.replace(temp_path, snapshot_path)
+
+        # La instantánea ya contiene todo lo anexado: el diario puede vaciarse
+        open(self._journal_path(chat_name), "w", encoding="utf-8").close()
+
+        self._persisted_ids[chat_name] = {self._message_id(msg) for msg in messages}
+        self._append_counts[chat_name] = 0
+        logger.debug(f"Diario compactado para chat '{chat_name}'")
+
+    def load_chat_history(self, chat_name):
+        """Cargar el historial reproduciendo la instantánea y la cola del diario"""
+        with self._lock:
+            messages = self._replay(chat_name)
+            self._persisted_ids[chat_name] = {
+                self._message_id(msg) for msg in messages
+            }
+            return messages
+
+    def _replay(self, chat_name):
+        """Reconstruir el historial de un chat desde disco"""
+        snapshot_path = self._snapshot_path(chat_name)
+        journal_path = self._journal_path(chat_name)
+
+        messages = []
+        try:
+            if os.path.exists(snapshot_path):
+                with open(snapshot_path, "r", encoding="utf-8") as f:
+                    messages = json.load(f).get("messages", [])
+            else:
+                # Sin instantánea, partir del historial JSON previo del gestor base
+                messages = super().load_chat_history(chat_name)
+        except Exception as e:
+            logger.error(
+                f"Error al cargar instantánea para chat '{chat_name}': {str(e)}"
+            )
+
+        seen = {self._message_id(msg) for msg in messages}
+        appends = 0
+        if os.path.exists(journal_path):
+            with open(journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Línea incompleta por una escritura interrumpida
+                        logger.warning(
+                            f"Entrada de diario inválida ignorada en chat '{chat_name}'"
+                        )
+                        continue
+                    appends += 1
+                    for msg in entry.get("messages", []):
+                        message_id = self._message_id(msg)
+                        if message_id not in seen:
+                            seen.add(message_id)
+                            messages.append(msg)
+
+        self._append_counts[chat_name] = appends
+        logger.debug(
+            f"Historial reproducido para chat '{chat_name}': {len(messages)} mensajes"
+        )
+        return messages
+
+    def _get_persisted_ids(self, chat_name):
+        """Obtener los ids persistidos de un chat, reproduciendo el diario si hace falta"""
+        if chat_name not in self._persisted_ids:
+            self._persisted_ids[chat_name] = {
+                self._message_id(msg) for msg in self._replay(chat_name)
+            }
+        return self._persisted_ids[chat_name]
+
+    @staticmethod
+    def _message_id(message):
+        return compute_message_id(message)
+
+    def delete_chat_history(self, chat_name=None):
+        """Eliminar el diario y la instantánea de un chat o de todos los chats"""
+        with self._lock:
+            chat_names = [chat_name] if chat_name else self.list_available_chats()
+            for name in chat_names:
+                for path in (self._snapshot_path(name), self._journal_path(name)):
+                    if os.path.exists(path):
+                        try:
+                            os.remove(path)
+                        except Exception as e:
+                            logger.error(
+                                f"Error al eliminar historial para chat '{name}': {str(e)}"
+                            )
+                self._persisted_ids.pop(name, None)
+                self._append_counts.pop(name, None)
+
+            if chat_name:
+                logger.info(f"Historial eliminado para chat '{chat_name}'")
+            else:
+                logger.info("Todos los historiales de chat han sido eliminados")
+
+        # Eliminar también el historial JSON previo, si existe
+        super().delete_chat_history(chat_name)
+
+    def list_available_chats(self):
+        """Listar todos los chats con instantánea, diario o historial JSON previo"""
+        try:
+            chat_names = set()
+            for filename in os.listdir(self.storage_path):
+                if filename.endswith(SNAPSHOT_SUFFIX):
+                    chat_names.add(filename[: -len(SNAPSHOT_SUFFIX)])
+                elif filename.endswith(JOURNAL_SUFFIX):
+                    chat_names.add(filename[: -len(JOURNAL_SUFFIX)])
+                elif filename.endswith(".json"):
+                    chat_names.add(filename[:-5])
+            return sorted(chat_names)
+        except Exception as e:
+            logger.error(f"Error al listar chats disponibles: {str(e)}")
+            return []
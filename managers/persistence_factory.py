@@ -0,0 +1,45 @@
+import logging
+from managers.chat_persistence_manager import ChatPersistenceManager
+from managers.journal_persistence_manager import JournalPersistenceManager
+from managers.sqlite_persistence_manager import SQLitePersistenceManager
+from managers.write_behind_persistence_manager import WriteBehindPersistenceManager
+
+logger = logging.getLogger(__name__)
+
+
+class PersistenceManagerFactory:
+    @staticmethod
+    def create_persistence_manager(config):
+        """
+        Crear el gestor de persistencia según chat.storage_backend, envuelto en
+        la capa de escritura diferida si chat.write_behind.enabled está activo
+        """
+        chat_config = config.config.get("chat", {})
+        manager = PersistenceManagerFactory.create_backend(
+            chat_config.get("storage_backend", "json"), config
+        )
+
+        write_behind = chat_config.get("write_behind", {})
+        if write_behind.get("enabled", False):
+            return WriteBehindPersistenceManager(
+                manager,
+                flush_interval=write_behind.get("flush_interval", 2.0),
+                max_dirty=write_behind.get("max_dirty", 50),
+            )
+        return manager
+
+    @staticmethod
+    def create_backend(backend, config):
+        """Crear el backend de almacenamiento indicado"""
+        if backend.lower() == "json":
+            return ChatPersistenceManager(config)
+        elif backend.lower() == "journal":
+            return JournalPersistenceManager(config)
+        elif backend.lower() == "sqlite":
+            return SQLitePersistenceManager(config)
+        # Aquí se pueden agregar más backends en el futuro
+        else:
+            logger.error(
+                f"Backend de almacenamiento no soportado: {backend}. Usando JSON"
+            )
+            return ChatPersistenceManager(config)
@@ -1,19 +1,110 @@
 import os
 import time
+import string
 import logging
+import threading
+from managers.context_builder import ContextBuilder
 
 logger = logging.getLogger(__name__)
 
+# Plantilla básica usada si no se puede leer ningún archivo de plantilla
+FALLBACK_TEMPLATE = "Eres un asistente de WhatsApp. Proporciona una respuesta breve y útil al mensaje: {chat_history}"
+
+
+class CompiledTemplate:
+    """
+    Plantilla precompilada en segmentos estáticos y campos dinámicos.
+
+    Se analiza una sola vez con string.Formatter; en cada llamada solo se
+    rellenan los campos y se concatenan los segmentos. Los campos sin valor
+    se sustituyen por una cadena vacía.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.segments = []
+        self.fields = set()
+        for literal, field_name, format_spec, conversion in string.Formatter().parse(
+            text
+        ):
+            self.segments.append((literal, field_name, format_spec, conversion))
+            if field_name is not None:
+                self.fields.add(field_name)
+
+    def render(self, values):
+        """Rellenar los campos de la plantilla con los valores indicados"""
+        parts = []
+        for literal, field_name, format_spec, conversion in self.segments:
+            parts.append(literal)
+            if field_name is None:
+                continue
+
+            value = values.get(field_name, "")
+            if conversion == "r":
+                value = repr(value)
+            elif conversion == "a":
+                value = ascii(value)
+            parts.append(format(value, format_spec) if format_spec else str(value))
+        return "".join(parts)
+
+
+class FormattedPrompt(str):
+    """
+    Prompt ya formateado que conserva con qué plantilla y valores se construyó.
+
+    Se comporta como un str para los proveedores; las capas de caché y
+    grabación usan sus atributos para obtener claves estables. context_tokens
+    es la estimación de tokens del historial incluido en este prompt.
+    """
+
+    def __new__(
+        cls,
+        text,
+        template_name,
+        values,
+        last_message="",
+        cache_last_message=False,
+        context_tokens=0,
+    ):
+        prompt = super().__new__(cls, text)
+        prompt.template_name = template_name
+        prompt.values = values
+        prompt.last_message = last_message
+        prompt.cache_last_message = cache_last_message
+        prompt.context_tokens = context_tokens
+        return prompt
+
 
 class PromptManager:
     def __init__(self, config):
         self.config = config
+        llm_config = config.config.get("llm", {})
         self.template_path = os.path.join(
             config.abs_path,
-            config.config.get("llm", {}).get(
-                "prompt_template_path", "prompts/default_template.txt"
-            ),
+            llm_config.get("prompt_template_path", "prompts/default_template.txt"),
         )
+        self.templates_dir = os.path.dirname(self.template_path)
+
+        # Registro de plantillas con nombre: {nombre: ruta relativa al proyecto}
+        # o {nombre: {"path": ruta, "cache_last_message": bool}}
+        self.template_paths = {}
+        self.template_options = {}
+        for name, entry in llm_config.get("prompt_templates", {}).items():
+            if isinstance(entry, dict):
+                self.template_options[name] = entry
+                entry = entry.get("path", "")
+            self.template_paths[name] = os.path.join(config.abs_path, entry)
+        self.template_paths.setdefault("default", self.template_path)
+
+        # Plantillas compiladas: {nombre: {"path", "mtime", "checked", "compiled"}}
+        self.check_interval = llm_config.get("template_check_interval", 1.0)
+        self._compiled = {}
+        # Los workers del modo pipeline formatean prompts a la vez
+        self._compile_lock = threading.Lock()
+
+        # Selección del historial según el presupuesto de tokens
+        self.context_builder = ContextBuilder(config)
+
         self._ensure_template_exists()
 
     def _ensure_template_exists(self):
@@ -41,23 +132,108 @@ class PromptManager:
         except Exception as e:
             logger.error(f"Error al crear plantilla de prompt: {e}", exc_info=True)
 
-    def load_template(self):
+    def _resolve_template_path(self, prompt_name):
+        """Obtener la ruta de una plantilla a partir de su nombre"""
+        name = prompt_name or "default"
+        if name in self.template_paths:
+            return self.template_paths[name]
+
+        # Buscar prompts/<nombre>_template.txt o prompts/<nombre>.txt
+        for filename in (f"{name}_template.txt", f"{name}.txt"):
+            path = os.path.join(self.templates_dir, filename)
+            if os.path.exists(path):
+                self.template_paths[name] = path
+                return path
+
+        logger.warning(f"Plantilla '{name}' no encontrada, usando la predeterminada")
+        return self.template_path
+
+    def load_template(self, prompt_name=None):
         """Cargar la plantilla del prompt desde el archivo"""
+        template_path = self._resolve_template_path(prompt_name)
         try:
-            with open(self.template_path, "r", encoding="utf-8") as file:
+            with open(template_path, "r", encoding="utf-8") as file:
                 return file.read()
         except Exception as e:
             logger.error(f"Error al cargar plantilla de prompt: {e}", exc_info=True)
             # Devolver una plantilla básica en caso de error
-            return "Eres un asistente de WhatsApp. Proporciona una respuesta breve y útil al mensaje: {chat_history}"
+            return FALLBACK_TEMPLATE
+
+    def get_template(self, prompt_name=None):
+        """
+        Obtener la plantilla compilada, recompilándola solo si cambió el archivo.
+
+        La fecha de modificación se comprueba como mucho cada check_interval
+        segundos. La comprobación y la recompilación se hacen con un cerrojo
+        para que varios hilos no compilen a la vez la misma plantilla.
+        """
+        name = prompt_name or "default"
+        entry = self._compiled.get(name)
+        if entry and time.monotonic() - entry["checked"] < self.check_interval:
+            return entry["compiled"]
+
+        with self._compile_lock:
+            return self._refresh_template(name)
+
+    def _refresh_template(self, name):
+        """Comprobar el archivo de una plantilla y recompilarla si cambió"""
+        entry = self._compiled.get(name)
+        now = time.monotonic()
+        # Otro hilo pudo comprobarla mientras se esperaba el cerrojo
+        if entry and now - entry["checked"] < self.check_interval:
+            return entry["compiled"]
+
+        path = self._resolve_template_path(name)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+
+        if entry and entry["path"] == path and entry["mtime"] == mtime:
+            entry["checked"] = now
+            return entry["compiled"]
+
+        compiled = CompiledTemplate(self.load_template(name))
+        self._compiled[name] = {
+            "path": path,
+            "mtime": mtime,
+            "checked": now,
+            "compiled": compiled,
+        }
+        if entry:
+            logger.info(f"Plantilla '{name}' recargada desde {path}")
+        return compiled
+
+    def format_prompt(self, chat_name, messages, prompt_name=None, summary=None):
+        """Formatear el prompt con los datos del chat y el resumen de lo anterior"""
+        template = self.get_template(prompt_name)
+
+        # Limitar el historial al presupuesto de tokens configurado
+        messages, context_tokens = self.context_builder.build(messages)
+        logger.info(
+            f"Prompt para {chat_name}: {len(messages)} mensajes, ~{context_tokens} tokens de historial"
+        )
 
-    def format_prompt(self, chat_name, messages):
-        """Formatear el prompt con los datos del chat"""
-        template = self.load_template()
         chat_history = "\n".join(
             f"<Message sender={msg['sender']} date={msg['date']} time={msg['time']}>{msg['message']}</Message>"
             for msg in messages
         )
 
         current_datetime = time.strftime("%Y-%m-%d:%H-%M-%S:%Z")
-        return template.format(chat_name=chat_name, chat_history=chat_history, current_datetime=current_datetime)
+        values = {
+            "chat_name": chat_name,
+            "chat_history": chat_history,
+            "chat_summary": summary or "",
+            "current_datetime": current_datetime,
+        }
+        name = prompt_name or "default"
+        return FormattedPrompt(
+            template.render(values),
+            name,
+            values,
+            last_message=messages[-1]["message"] if messages else "",
+            cache_last_message=self.template_options.get(name, {}).get(
+                "cache_last_message", False
+            ),
+            context_tokens=context_tokens,
+        )
@@ -1,38 +1,45 @@
 import os
-import pickle
+import time
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Archivo de versiones anteriores, que guardaba las cookies con pickle
+LEGACY_SESSION_SUFFIX = ".pkl"
+
 
 class SessionManager:
     def __init__(self, config, driver):
         self.config = config
         self.driver = driver
         self.session_path = config.session_path
+        self.legacy_session_path = config.session_path + LEGACY_SESSION_SUFFIX
+
+    def has_session(self):
+        """
+        Indicar si hay una sesión iniciada anteriormente.
 
-    def load_session(self):
-        """Cargar sesión de WhatsApp si existe"""
-        if os.path.exists(self.session_path):
-            try:
-                with open(self.session_path, "rb") as f:
-                    cookies = pickle.load(f)
-
-                self.driver.get("https://web.whatsapp.com/")
-                for cookie in cookies:
-                    self.driver.add_cookie(cookie)
-                logger.info("Sesión cargada correctamente")
-                return True
-            except Exception as e:
-                logger.error(f"Error al cargar sesión: {e}", exc_info=True)
-        return False
+        La sesión de WhatsApp Web se conserva en el perfil del navegador
+        (IndexedDB), que se carga al arrancar Chrome; no hace falta navegar
+        ni inyectar cookies para restaurarla.
+        """
+        return os.path.exists(self.session_path) or os.path.exists(
+            self.legacy_session_path
+        )
 
     def save_session(self):
-        """Guardar sesión actual de WhatsApp"""
+        """
+        Marcar que hay una sesión iniciada.
+
+        Solo se escribe la fecha del inicio de sesión: las credenciales ya
+        están en el perfil del navegador y no se copian a otro archivo.
+        """
         try:
-            cookies = self.driver.get_cookies()
-            with open(self.session_path, "wb") as f:
-                pickle.dump(cookies, f)
+            with open(self.session_path, "w", encoding="utf-8") as f:
+                f.write(time.strftime("%Y-%m-%dT%H:%M:%S%z") + "\n")
+            # Borrar las cookies que guardaban las versiones anteriores
+            if os.path.exists(self.legacy_session_path):
+                os.remove(self.legacy_session_path)
             logger.info("Sesión guardada correctamente")
             return True
         except Exception as e:
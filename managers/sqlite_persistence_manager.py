@@ -0,0 +1,261 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from managers.chat_manager import compute_message_id
+from managers.chat_persistence_manager import ChatPersistenceManager
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chats (
+    chat_name TEXT PRIMARY KEY,
+    last_updated TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    chat_name TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    inserted_at REAL NOT NULL,
+    sender TEXT NOT NULL,
+    date TEXT,
+    time TEXT,
+    message TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (chat_name, message_id)
+);
+CREATE INDEX IF NOT EXISTS idx_messages_chat_inserted ON messages (chat_name, inserted_at);
+"""
+
+
+class SQLitePersistenceManager(ChatPersistenceManager):
+    """
+    Almacenamiento de historiales en una base de datos SQLite.
+
+    Los mensajes se identifican por (chat, id de mensaje) y se indexan por
+    (chat, inserted_at), de modo que leer los últimos N mensajes de un chat
+    es una lectura indexada. inserted_at es el momento de la inserción y
+    conserva el orden del historial, no la fecha del mensaje (que se guarda en
+    date y time). Las inserciones se acumulan en una transacción que
+    se confirma en flush() (una vez por ciclo de procesamiento) o al alcanzar
+    batch_size escrituras.
+    """
+
+    def __init__(self, config):
+        super().__init__(config)
+        chat_config = config.config.get("chat", {})
+        sqlite_config = chat_config.get("sqlite", {})
+        self.max_history = chat_config.get("max_history", 20)
+        self.db_path = sqlite_config.get(
+            "path", os.path.join(self.storage_path, "chat_history.db")
+        )
+        self.batch_size = sqlite_config.get("batch_size", 500)
+
+        self._lock = threading.RLock()
+        self._pending_writes = 0
+        # Ids ya almacenados por chat, para no serializar de nuevo todo el historial
+        self._known_ids = {}
+
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self.connection = sqlite3.connect(
+            self.db_path, check_same_thread=False, isolation_level=None
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        # Con fsync activado cada confirmación se sincroniza también en modo WAL
+        self.connection.execute(
+            f"PRAGMA synchronous={'FULL' if self.fsync else 'NORMAL'}"
+        )
+        self.connection.executescript(SCHEMA)
+        logger.info(f"Base de datos de historiales abierta: {self.db_path}")
+
+    def _begin(self):
+        """Abrir la transacción del lote actual si no hay una en curso"""
+        if not self.connection.in_transaction:
+            self.connection.execute("BEGIN")
+
+    def save_chat_history(self, chat_name, messages):
+        """Insertar en el lote actual los mensajes del historial aún no almacenados"""
+        try:
+            with self._lock:
+                known_ids = self._get_known_ids(chat_name)
+                rows = self._build_rows(chat_name, messages, known_ids)
+                if not rows:
+                    return True
+
+                self._begin()
+                self.connection.executemany(
+                    "INSERT OR IGNORE INTO messages "
+                    "(chat_name, message_id, inserted_at, sender, date, time, message, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO chats (chat_name, last_updated) VALUES (?, ?)",
+                    (chat_name, datetime.now().isoformat()),
+                )
+                known_ids.update(row[1] for row in rows)
+
+                self._pending_writes += len(rows)
+                if self._pending_writes >= self.batch_size:
+                    self._commit()
+
+            logger.debug(
+                f"Historial guardado para chat '{chat_name}': {len(rows)} mensajes nuevos"
+            )
+            return True
+        except Exception as e:
+            logger.error(
+                f"Error al guardar historial para chat '{chat_name}': {str(e)}"
+            )
+            return False
+
+    def _build_rows(self, chat_name, messages, known_ids):
+        """Validar y convertir en filas los mensajes que no estén almacenados"""
+        rows = []
+        inserted_at = time.time()
+        for position, msg in enumerate(messages):
+            if not isinstance(msg, dict) or "sender" not in msg or "message" not in msg:
+                raise ValueError(
+                    "Formato de mensaje inválido. Se requiere {'sender': str, 'message': str}"
+                )
+            message_id = compute_message_id(msg)
+            if message_id in known_ids:
+                continue
+            rows.append(
+                (
+                    chat_name,
+                    message_id,
+                    # Conservar el orden del lote dentro de la misma marca de tiempo
+                    inserted_at + position * 1e-6,
+                    msg["sender"],
+                    msg.get("date"),
+                    msg.get("time"),
+                    msg["message"],
+                    json.dumps(msg, ensure_ascii=False),
+                )
+            )
+        return rows
+
+    def _get_known_ids(self, chat_name):
+        """Obtener los ids almacenados de un chat, consultándolos si hace falta"""
+        if chat_name not in self._known_ids:
+            cursor = self.connection.execute(
+                "SELECT message_id FROM messages WHERE chat_name = ?", (chat_name,)
+            )
+            self._known_ids[chat_name] = {row[0] for row in cursor}
+        return self._known_ids[chat_name]
+
+    def load_chat_history(self, chat_name):
+        """Cargar los últimos max_history mensajes de un chat"""
+        try:
+            with self._lock:
+                cursor = self.connection.execute(
+                    "SELECT data FROM messages WHERE chat_name = ? "
+                    "ORDER BY inserted_at DESC, rowid DESC LIMIT ?",
+                    (chat_name, self.max_history),
+                )
+                messages = [json.loads(row[0]) for row in cursor]
+
+            messages.reverse()
+            logger.debug(f"Historial cargado para chat '{chat_name}'")
+            return messages
+        except Exception as e:
+            logger.error(f"Error al cargar historial para chat '{chat_name}': {str(e)}")
+            return []
+
+    def delete_chat_history(self, chat_name=None):
+        """Eliminar el historial de un chat o de todos los chats"""
+        try:
+            with self._lock:
+                self._begin()
+                if chat_name:
+                    self.connection.execute(
+                        "DELETE FROM messages WHERE chat_name = ?", (chat_name,)
+                    )
+                    self.connection.execute(
+                        "DELETE FROM chats WHERE chat_name = ?", (chat_name,)
+                    )
+                    self._known_ids.pop(chat_name, None)
+                else:
+                    self.connection.execute("DELETE FROM messages")
+                    self.connection.execute("DELETE FROM chats")
+                    self._known_ids = {}
+                self._commit()
+
+            if chat_name:
+                logger.info(f"Historial eliminado para chat '{chat_name}'")
+            else:
+                logger.info("Todos los historiales de chat han sido eliminados")
+        except Exception as e:
+            logger.error(f"Error al eliminar historiales: {str(e)}")
+
+    def list_available_chats(self):
+        """Listar todos los chats disponibles"""
+        try:
+            with self._lock:
+                cursor = self.connection.execute(
+                    "SELECT chat_name FROM chats ORDER BY chat_name"
+                )
+                return [row[0] for row in cursor]
+        except Exception as e:
+            logger.error(f"Error al listar chats disponibles: {str(e)}")
+            return []
+
+    def import_chats(self, chat_histories):
+        """
+        Importar historiales completos en una sola transacción.
+
+        chat_histories es un dict {nombre_chat: [mensajes]}; devuelve el número
+        de mensajes insertados.
+        """
+        inserted = 0
+        with self._lock:
+            self._begin()
+            try:
+                for chat_name, messages in chat_histories.items():
+                    known_ids = self._get_known_ids(chat_name)
+                    rows = self._build_rows(chat_name, messages, known_ids)
+                    cursor = self.connection.executemany(
+                        "INSERT OR IGNORE INTO messages "
+                        "(chat_name, message_id, inserted_at, sender, date, time, message, data) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        rows,
+                    )
+                    self.connection.execute(
+                        "INSERT OR REPLACE INTO chats (chat_name, last_updated) VALUES (?, ?)",
+                        (chat_name, datetime.now().isoformat()),
+                    )
+                    known_ids.update(row[1] for row in rows)
+                    inserted += cursor.rowcount
+                self._commit()
+            except Exception:
+                self.connection.rollback()
+                self._known_ids = {}
+                raise
+        return inserted
+
+    def _commit(self):
+        """Confirmar la transacción en curso"""
+        if self.connection.in_transaction:
+            self.connection.commit()
+        self._pending_writes = 0
+
+    def flush(self):
+        """Confirmar el lote de inserciones pendiente"""
+        try:
+            with self._lock:
+                self._commit()
+            return True
+        except Exception as e:
+            logger.error(f"Error al confirmar historiales: {str(e)}")
+            return False
+
+    def close(self):
+        """Confirmar lo pendiente y cerrar la conexión"""
+        self.flush()
+        with self._lock:
+            self.connection.close()
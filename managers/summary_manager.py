@@ -0,0 +1,213 @@
+import os
+import json
+import logging
+import threading
+from datetime import datetime
+from llm_provider import FALLBACK_RESPONSE
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationSummarizer:
+    """
+    Resumen incremental de las conversaciones que superan max_history.
+
+    Los mensajes que ChatManager descarta del historial se encolan por chat y
+    un hilo en segundo plano los incorpora, con el LLM, al resumen acumulado de
+    ese chat, que se guarda en <storage_path>/summaries/<chat>.json.
+    """
+
+    def __init__(self, config, llm_provider, prompt_manager, background=True):
+        self.llm_provider = llm_provider
+        self.prompt_manager = prompt_manager
+
+        chat_config = config.config.get("chat", {})
+        summary_config = chat_config.get("summary", {})
+        self.min_batch = summary_config.get("min_batch", 10)
+        self.max_words = summary_config.get("max_words", 150)
+        self.prompt_name = summary_config.get("prompt_name", "summary")
+        self.summaries_path = os.path.join(
+            chat_config.get("storage_path", "chat_history"), "summaries"
+        )
+        os.makedirs(self.summaries_path, exist_ok=True)
+
+        # Mensajes pendientes de resumir y resúmenes ya cargados, por chat
+        self._pending = {}
+        self._summaries = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+
+        self._thread = None
+        if background:
+            self._thread = threading.Thread(
+                target=self._run, name="summarizer", daemon=True
+            )
+            self._thread.start()
+
+    def _summary_path(self, chat_name):
+        return os.path.join(self.summaries_path, f"{chat_name}.json")
+
+    def _ensure_loaded(self, chat_name):
+        """Cargar desde disco el resumen y los mensajes pendientes de un chat"""
+        with self._lock:
+            if chat_name in self._summaries:
+                return
+
+        data = {}
+        path = self._summary_path(chat_name)
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except Exception as e:
+                logger.error(f"Error al cargar resumen para chat '{chat_name}': {e}")
+
+        with self._lock:
+            if chat_name in self._summaries:
+                return
+            self._summaries[chat_name] = data.get("summary", "")
+            # Mensajes que quedaron sin resumir en la ejecución anterior
+            if data.get("pending"):
+                self._pending[chat_name] = data["pending"] + self._pending.get(
+                    chat_name, []
+                )
+
+    def _save(self, chat_name):
+        """Guardar el resumen y los mensajes pendientes de un chat"""
+        with self._lock:
+            data = {
+                "last_updated": datetime.now().isoformat(),
+                "summary": self._summaries.get(chat_name, ""),
+                "pending": list(self._pending.get(chat_name, [])),
+            }
+
+        try:
+            with open(self._summary_path(chat_name), "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            logger.error(f"Error al guardar resumen para chat '{chat_name}': {e}")
+
+    def enqueue(self, chat_name, messages):
+        """Encolar los mensajes descartados de un chat para incorporarlos al resumen"""
+        if not messages:
+            return
+
+        self._ensure_loaded(chat_name)
+        with self._lock:
+            pending = self._pending.setdefault(chat_name, [])
+            pending.extend(messages)
+            ready = len(pending) >= self.min_batch
+
+        if ready:
+            self._wakeup.set()
+
+    def get_summary(self, chat_name):
+        """Obtener el resumen acumulado de un chat (cadena vacía si no hay)"""
+        self._ensure_loaded(chat_name)
+        with self._lock:
+            return self._summaries.get(chat_name, "")
+
+    def process_pending(self, force=False):
+        """
+        Incorporar al resumen los lotes pendientes.
+
+        Sin force solo se procesan los chats con al menos min_batch mensajes.
+        Devuelve el número de chats cuyo resumen se actualizó.
+        """
+        with self._lock:
+            ready = [
+                chat_name
+                for chat_name, messages in self._pending.items()
+                if force or len(messages) >= self.min_batch
+            ]
+            batches = {chat_name: self._pending.pop(chat_name) for chat_name in ready}
+
+        updated = 0
+        for chat_name, messages in batches.items():
+            if self._summarize(chat_name, messages):
+                updated += 1
+            else:
+                # Devolver los mensajes a la cola para el próximo intento
+                with self._lock:
+                    self._pending[chat_name] = messages + self._pending.get(
+                        chat_name, []
+                    )
+        return updated
+
+    def _summarize(self, chat_name, messages):
+        """Generar y guardar el nuevo resumen de un chat"""
+        previous_summary = self.get_summary(chat_name)
+        prompt = self.prompt_manager.get_template(self.prompt_name).render(
+            {
+                "chat_name": chat_name,
+                "previous_summary": previous_summary,
+                "messages": "\n".join(
+                    f"{msg['sender']} ({msg.get('date', '')} {msg.get('time', '')}): {msg['message']}"
+                    for msg in messages
+                ),
+                "max_words": self.max_words,
+            }
+        )
+
+        try:
+            summary = self.llm_provider.generate_response(prompt).strip()
+        except Exception as e:
+            logger.error(f"Error al resumir chat '{chat_name}': {e}", exc_info=True)
+            return False
+
+        if not summary or summary == FALLBACK_RESPONSE:
+            logger.warning(f"No se pudo actualizar el resumen del chat '{chat_name}'")
+            return False
+
+        with self._lock:
+            self._summaries[chat_name] = summary
+        self._save(chat_name)
+
+        logger.info(
+            f"Resumen actualizado para chat '{chat_name}' con {len(messages)} mensajes"
+        )
+        return True
+
+    def delete_summary(self, chat_name=None):
+        """Eliminar el resumen de un chat o de todos los chats"""
+        with self._lock:
+            if chat_name:
+                self._pending.pop(chat_name, None)
+                self._summaries.pop(chat_name, None)
+                chat_names = [chat_name]
+            else:
+                self._pending.clear()
+                self._summaries.clear()
+                chat_names = [
+                    f[:-5] for f in os.listdir(self.summaries_path) if f.endswith(".json")
+                ]
+
+        for name in chat_names:
+            path = self._summary_path(name)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _run(self):
+        """Bucle del hilo de resúmenes"""
+        while not self._stop.is_set():
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.process_pending()
+            except Exception as e:
+                logger.error(f"Error en el hilo de resúmenes: {e}", exc_info=True)
+
+    def close(self):
+        """Detener el hilo de resúmenes y guardar los mensajes aún sin resumir"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join()
+
+        with self._lock:
+            pending_chats = [name for name, messages in self._pending.items() if messages]
+        for chat_name in pending_chats:
+            self._save(chat_name)
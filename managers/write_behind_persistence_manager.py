@@ -0,0 +1,134 @@
+import atexit
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindPersistenceManager:
+    """
+    Capa de escritura diferida delante de un gestor de persistencia.
+
+    save_chat_history solo anota el chat como pendiente (las actualizaciones
+    repetidas de un mismo chat se agrupan en una sola escritura) y un hilo en
+    segundo plano vuelca los pendientes al backend cada flush_interval segundos
+    o en cuanto hay max_dirty chats pendientes. close() garantiza el volcado
+    final; si el proceso termina sin llamarlo, se ejecuta al salir (atexit)
+    para no perder los cambios que el hilo, que es daemon, no llegó a escribir.
+    """
+
+    def __init__(self, backend, flush_interval=2.0, max_dirty=50):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.max_dirty = max_dirty
+
+        self._pending = {}
+        # Historiales que el hilo está escribiendo, para servir lecturas coherentes
+        self._writing = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._closed = False
+
+        self._thread = threading.Thread(
+            target=self._run, name="history-writer", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+        logger.info(
+            f"Escritura diferida de historiales activada: cada {flush_interval}s "
+            f"o {max_dirty} chats pendientes"
+        )
+
+    def save_chat_history(self, chat_name, messages):
+        """Marcar el historial de un chat como pendiente de escritura"""
+        with self._lock:
+            self._pending[chat_name] = list(messages)
+            dirty_count = len(self._pending)
+
+        if dirty_count >= self.max_dirty:
+            self._wakeup.set()
+        return True
+
+    def load_chat_history(self, chat_name):
+        """Cargar el historial, priorizando los cambios aún no escritos"""
+        with self._lock:
+            if chat_name in self._pending:
+                return list(self._pending[chat_name])
+            if chat_name in self._writing:
+                return list(self._writing[chat_name])
+
+        return self.backend.load_chat_history(chat_name)
+
+    def delete_chat_history(self, chat_name=None):
+        """Descartar los cambios pendientes y eliminar el historial del backend"""
+        # Esperar a que termine un volcado en curso para que no reescriba lo borrado
+        with self._flush_lock:
+            with self._lock:
+                if chat_name:
+                    self._pending.pop(chat_name, None)
+                else:
+                    self._pending.clear()
+            self.backend.delete_chat_history(chat_name)
+
+    def list_available_chats(self):
+        """Listar los chats del backend y los pendientes de escritura"""
+        with self._lock:
+            pending = set(self._pending)
+        return sorted(set(self.backend.list_available_chats()) | pending)
+
+    def flush(self):
+        """Solicitar al hilo de escritura que vuelque ya los pendientes"""
+        self._wakeup.set()
+        return True
+
+    def _flush_pending(self):
+        """Escribir en el backend todos los historiales pendientes"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._writing = batch
+
+            failed = 0
+            for chat_name, messages in batch.items():
+                if not self.backend.save_chat_history(chat_name, messages):
+                    failed += 1
+                    # Reintentar en el próximo volcado salvo que ya haya una versión más nueva
+                    with self._lock:
+                        self._pending.setdefault(chat_name, messages)
+
+            self.backend.flush()
+            with self._lock:
+                self._writing = {}
+
+        if batch:
+            logger.debug(
+                f"Historiales escritos: {len(batch) - failed}, fallidos: {failed}"
+            )
+        return failed == 0
+
+    def _run(self):
+        """Bucle del hilo de escritura"""
+        while not self._stop.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self._flush_pending()
+            except Exception as e:
+                logger.error(f"Error en la escritura diferida: {e}", exc_info=True)
+
+    def close(self):
+        """Detener el hilo, volcar los pendientes y cerrar el backend"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        atexit.unregister(self.close)
+
+        self._stop.set()
+        self._wakeup.set()
+        self._thread.join()
+        self._flush_pending()
+        self.backend.close()
+        logger.info("Escritura diferida finalizada, historiales volcados")
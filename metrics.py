@@ -0,0 +1,344 @@
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Límites (segundos) de los histogramas de tiempos: de 1 ms a 2 min
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    """Escapar un valor de etiqueta según el formato de texto de Prometheus"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + list(extra or [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in items) + "}"
+
+
+class Histogram:
+    """Histograma acumulativo de una serie (una combinación de etiquetas)"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimar un cuantil interpolando dentro del intervalo que lo contiene"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            if cumulative + count >= rank and count:
+                lower = self.buckets[index - 1] if index else 0.0
+                if index == len(self.buckets):
+                    return lower
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+
+class MetricsRegistry:
+    """
+    Registro de métricas del bot: contadores, indicadores e histogramas.
+
+    Las métricas se declaran con su ayuda y se actualizan por nombre y
+    etiquetas. Los indicadores pueden calcularse al exportar mediante
+    funciones registradas con gauge_callback. render() genera el formato de
+    texto de Prometheus.
+    """
+
+    def __init__(self, prefix="whatsapp_bot"):
+        self.prefix = prefix
+        self._families = {}
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def _family(self, name, kind, help_text="", buckets=None):
+        full_name = f"{self.prefix}_{name}"
+        family = self._families.get(full_name)
+        if family is None:
+            family = {
+                "kind": kind,
+                "help": help_text,
+                "buckets": buckets or DEFAULT_BUCKETS,
+                "series": {},
+            }
+            self._families[full_name] = family
+        return family
+
+    def counter(self, name, help_text):
+        """Declarar un contador"""
+        with self._lock:
+            self._family(name, "counter", help_text)
+
+    def gauge(self, name, help_text):
+        """Declarar un indicador"""
+        with self._lock:
+            self._family(name, "gauge", help_text)
+
+    def histogram(self, name, help_text, buckets=None):
+        """Declarar un histograma"""
+        with self._lock:
+            self._family(name, "histogram", help_text, buckets)
+
+    def inc(self, name, amount=1, **labels):
+        """Incrementar un contador"""
+        with self._lock:
+            series = self._family(name, "counter")["series"]
+            key = _label_key(labels)
+            series[key] = series.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        """Fijar el valor de un indicador"""
+        with self._lock:
+            self._family(name, "gauge")["series"][_label_key(labels)] = value
+
+    def observe(self, name, value, **labels):
+        """Registrar una observación en un histograma"""
+        with self._lock:
+            family = self._family(name, "histogram")
+            key = _label_key(labels)
+            histogram = family["series"].get(key)
+            if histogram is None:
+                histogram = family["series"][key] = Histogram(family["buckets"])
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Medir la duración de un bloque en un histograma"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def gauge_callback(self, callback):
+        """
+        Registrar una función que devuelve indicadores calculados al exportar.
+
+        La función devuelve una lista de (nombre, valor, etiquetas).
+        """
+        with self._lock:
+            self._callbacks.append(callback)
+
+    def _collect_callbacks(self):
+        for callback in list(self._callbacks):
+            try:
+                for name, value, labels in callback():
+                    self.set(name, value, **labels)
+            except Exception as e:
+                logger.debug(f"Error al calcular métricas: {e}")
+
+    def render(self, extra_labels=None):
+        """Exportar todas las métricas en formato de texto de Prometheus"""
+        self._collect_callbacks()
+        extra = list((extra_labels or {}).items())
+        lines = []
+        with self._lock:
+            for name, family in sorted(self._families.items()):
+                if family["help"]:
+                    lines.append(f"# HELP {name} {family['help']}")
+                lines.append(f"# TYPE {name} {family['kind']}")
+                for key, value in sorted(family["series"].items()):
+                    if family["kind"] != "histogram":
+                        lines.append(f"{name}{_format_labels(key, extra)} {value}")
+                        continue
+
+                    cumulative = 0
+                    for bound, count in zip(value.buckets, value.counts):
+                        cumulative += count
+                        labels = _format_labels(key, extra + [("le", bound)])
+                        lines.append(f"{name}_bucket{labels} {cumulative}")
+                    labels = _format_labels(key, extra + [("le", "+Inf")])
+                    lines.append(f"{name}_bucket{labels} {value.count}")
+                    lines.append(f"{name}_sum{_format_labels(key, extra)} {value.sum}")
+                    lines.append(f"{name}_count{_format_labels(key, extra)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Resumen legible: percentiles de los histogramas y valor del resto"""
+        self._collect_callbacks()
+        lines = []
+        with self._lock:
+            for name, family in sorted(self._families.items()):
+                short_name = name[len(self.prefix) + 1 :]
+                for key, value in sorted(family["series"].items()):
+                    labels = ",".join(f"{k}={v}" for k, v in key)
+                    series = f"{short_name}[{labels}]" if labels else short_name
+                    if family["kind"] == "histogram":
+                        if value.count:
+                            lines.append(
+                                f"{series}: n={value.count} "
+                                f"p50={value.quantile(0.5) * 1000:.0f}ms "
+                                f"p95={value.quantile(0.95) * 1000:.0f}ms"
+                            )
+                    else:
+                        lines.append(f"{series}: {value:g}")
+        return lines
+
+
+# Registro compartido por todo el proceso
+registry = MetricsRegistry()
+
+registry.histogram(
+    "stage_seconds", "Duración de cada etapa del procesamiento de mensajes"
+)
+registry.histogram("cycle_seconds", "Duración de cada ciclo de process_unread_chats")
+registry.counter("chats_processed_total", "Chats con mensajes nuevos procesados")
+registry.counter("messages_received_total", "Mensajes nuevos añadidos al historial")
+registry.counter("replies_sent_total", "Mensajes enviados por el bot")
+registry.counter("errors_total", "Errores por etapa")
+registry.gauge("send_queue_depth", "Respuestas generadas pendientes de enviar")
+registry.gauge("pending_generations", "Generaciones de respuesta en curso")
+registry.gauge("cache_hit_rate", "Tasa de aciertos de cada caché")
+registry.gauge("cache_entries", "Entradas en cada caché")
+registry.gauge("startup_seconds", "Duración de cada paso del último arranque")
+
+
+class StartupTimeline:
+    """
+    Registro de los pasos del arranque, que pueden ejecutarse en paralelo.
+
+    Cada paso guarda su inicio y su fin relativos al comienzo del arranque;
+    log() escribe la línea temporal y publica la duración de cada paso en el
+    indicador startup_seconds.
+    """
+
+    def __init__(self, metrics_registry=None):
+        self.registry = metrics_registry
+        self.start = time.perf_counter()
+        self.steps = []
+        self._lock = threading.Lock()
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def add(self, name, begin, end):
+        """Registrar un paso a partir de sus marcas de perf_counter"""
+        with self._lock:
+            self.steps.append((name, begin - self.start, end - self.start))
+        if self.registry:
+            self.registry.set("startup_seconds", end - begin, step=name)
+
+    @contextmanager
+    def step(self, name):
+        """Medir un paso del arranque"""
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, begin, time.perf_counter())
+
+    def log(self, title="Arranque"):
+        with self._lock:
+            steps = sorted(self.steps, key=lambda item: item[1])
+        lines = [
+            f"{name:20s} {begin:7.2f}s → {end:7.2f}s ({end - begin:.2f}s)"
+            for name, begin, end in steps
+        ]
+        logger.info(
+            f"{title} ({self.elapsed():.2f}s):\n  " + "\n  ".join(lines)
+        )
+
+
+class MetricsServer:
+    """Servidor HTTP local que expone el registro en /metrics"""
+
+    def __init__(self, metrics_registry, host="127.0.0.1", port=9108, extra_labels=None):
+        self.registry = metrics_registry
+        self.host = host
+        self.port = port
+        self.extra_labels = extra_labels or {}
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        metrics_registry = self.registry
+        extra_labels = self.extra_labels
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics_registry.render(extra_labels).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(f"Petición de métricas: {format % args}")
+
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        except OSError as e:
+            logger.error(f"No se pudo abrir el puerto de métricas {self.port}: {e}")
+            return False
+
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="metrics-server", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Métricas disponibles en http://{self.host}:{self.port}/metrics")
+        return True
+
+    def close(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class MetricsReporter:
+    """Hilo que escribe periódicamente en el log un resumen de las métricas"""
+
+    def __init__(self, metrics_registry, interval=300):
+        self.registry = metrics_registry
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="metrics-reporter", daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+
+    def log_summary(self):
+        lines = self.registry.summary()
+        if lines:
+            logger.info("Resumen de métricas:\n  " + "\n  ".join(lines))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.log_summary()
+
+    def close(self):
+        self._stop.set()
+        self.log_summary()
@@ -0,0 +1,69 @@
+import argparse
+import logging
+from config import Config
+from managers.chat_manager import assign_message_ids
+from managers.chat_persistence_manager import ChatPersistenceManager
+from managers.sqlite_persistence_manager import SQLitePersistenceManager
+
+logger = logging.getLogger("history_migration")
+
+
+def migrate_json_to_sqlite(config, batch_chats=200):
+    """
+    Importar en SQLite todos los historiales JSON de chat.storage_path
+
+    Returns:
+        tuple: (chats importados, mensajes insertados)
+    """
+    source = ChatPersistenceManager(config)
+    target = SQLitePersistenceManager(config)
+
+    chat_names = source.list_available_chats()
+    logger.info(f"Historiales JSON encontrados: {len(chat_names)}")
+
+    inserted = 0
+    try:
+        # Importar por bloques de chats, cada bloque en una sola transacción
+        for start in range(0, len(chat_names), batch_chats):
+            batch = {
+                chat_name: assign_message_ids(source.load_chat_history(chat_name))
+                for chat_name in chat_names[start : start + batch_chats]
+            }
+            inserted += target.import_chats(batch)
+            logger.info(
+                f"Importados {min(start + batch_chats, len(chat_names))}/{len(chat_names)} chats"
+            )
+    finally:
+        target.close()
+
+    return len(chat_names), inserted
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Migrar historiales de chat JSON a la base de datos SQLite"
+    )
+    parser.add_argument(
+        "--config", help="Ruta al archivo de configuración", default="config.json"
+    )
+    parser.add_argument(
+        "--batch-chats",
+        type=int,
+        default=200,
+        help="Número de chats importados por transacción",
+    )
+    args = parser.parse_args()
+
+    try:
+        config = Config(args.config)
+        chats, messages = migrate_json_to_sqlite(config, args.batch_chats)
+        print(f"Migración completada: {chats} chats, {messages} mensajes insertados")
+    except Exception as e:
+        logger.error(f"Error en la migración: {e}", exc_info=True)
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
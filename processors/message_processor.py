@@ -1,4 +1,10 @@
+import time
+import queue
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from processors.response_processor import StreamingMessageParser
+from metrics import registry as metrics
 
 logger = logging.getLogger(__name__)
 
@@ -11,6 +17,7 @@ class MessageProcessor:
         prompt_manager,
         llm_provider,
         response_processor,
+        config=None,
     ):
         self.whatsapp_client = whatsapp_client
         self.chat_manager = chat_manager
@@ -18,77 +25,333 @@ class MessageProcessor:
         self.llm_provider = llm_provider
         self.response_processor = response_processor
 
-    def process_unread_chats(self):
-        """Procesar todos los chats no leídos"""
+        # Enviar cada <Message> en cuanto el LLM termina de generarlo
+        llm_config = config.config.get("llm", {}) if config else {}
+        self.streaming = llm_config.get("streaming", False)
+
+        # Configuración del modo pipeline (generación en paralelo al navegador)
+        pipeline_config = config.config.get("pipeline", {}) if config else {}
+        self.pipeline_enabled = pipeline_config.get("enabled", False)
+        self.pipeline_workers = max(1, pipeline_config.get("workers", 4))
+        self.max_pending = max(
+            1, pipeline_config.get("max_pending", self.pipeline_workers * 2)
+        )
+
+        self._executor = None
+        self._pending_slots = None
+        self._send_queue = None
+        if self.pipeline_enabled:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.pipeline_workers, thread_name_prefix="llm-worker"
+            )
+            self._pending_slots = threading.BoundedSemaphore(self.max_pending)
+            self._send_queue = queue.Queue()
+            self._pending_count = 0
+            self._pending_lock = threading.Lock()
+            metrics.gauge_callback(self._queue_metrics)
+            logger.info(
+                f"Modo pipeline activado: {self.pipeline_workers} workers, "
+                f"máximo {self.max_pending} respuestas pendientes"
+            )
+
+    def process_unread_chats(self, chat_names=None):
+        """
+        Procesar todos los chats no leídos.
+
+        Si se indican chat_names (p. ej. desde el observador de no leídos) se
+        procesan esos chats por nombre en lugar de escanear la lista completa.
+        """
+        with metrics.timer("cycle_seconds"):
+            if self.pipeline_enabled:
+                return self._process_unread_chats_pipelined(chat_names)
+            return self._process_unread_chats_serial(chat_names)
+
+    def _queue_metrics(self):
+        """Profundidad de la cola de envío y generaciones en curso del modo pipeline"""
+        return [
+            ("send_queue_depth", self._send_queue.qsize(), {}),
+            ("pending_generations", self._pending_count, {}),
+        ]
+
+    def _process_unread_chats_serial(self, chat_names=None):
+        """Procesar los chats no leídos uno a uno en el hilo del navegador"""
         try:
-            unread_chats = self.whatsapp_client.get_unread_chats()
-            logger.info(f"Chats no leídos encontrados: {len(unread_chats)}")
+            unread_chats = self._get_chats_to_process(chat_names)
 
             for chat in unread_chats:
                 try:
-                    if self.whatsapp_client.open_chat(chat):
-                        # Verificar si el chat se cargó correctamente
-                        if not self.whatsapp_client.is_chat_loaded():
-                            logger.warning(
-                                "El chat no se cargó correctamente, refrescando página..."
-                            )
-                            self.whatsapp_client.refresh_page()
-                            continue
-
-                        chat_name = self.whatsapp_client.get_chat_name()
-                        logger.info(f"Procesando chat: {chat_name}")
-
-                        messages = self.whatsapp_client.get_messages()
-                        if messages:
-                            logger.info(
-                                f"Mensajes recibidos: {len(messages)} - Último: {messages[-1]['message'][:50]}..."
-                            )
-
-                            # Actualizar historial de chat
-                            self.chat_manager.add_messages(chat_name, messages)
-
-                            # Obtener historial completo para contexto
-                            chat_history = self.chat_manager.get_chat_history(chat_name)
-
-                            # Crear prompt para el LLM
-                            prompt = self.prompt_manager.format_prompt(
-                                chat_name, chat_history
-                            )
-
-                            # Obtener respuesta del LLM
-                            raw_response = self.llm_provider.generate_response(prompt)
-
-                            # Procesar la respuesta del asistente virtual
-                            user_message = self.response_processor.process_response(
-                                raw_response
-                            )
-
-                            # Si no se logró extraer un mensaje para el usuario, usar la respuesta completa
-                            if not user_message.strip():
-                                user_message = raw_response
-
-                            # Enviar respuesta procesada al usuario
-                            success = self.whatsapp_client.send_message(user_message)
-
-                            if success:
-                                logger.info(f"Respuesta enviada a {chat_name}")
-                            else:
-                                logger.error(
-                                    f"Falló el envío de respuesta a {chat_name}"
-                                )
-                        else:
-                            logger.warning(
-                                f"No se encontraron mensajes en el chat {chat_name}"
-                            )
+                    scraped = self._scrape_chat(chat)
+                    if not scraped:
+                        continue
+
+                    chat_name, chat_history = scraped
+
+                    # Generar y enviar la respuesta con el chat aún abierto
+                    for user_message in self._iter_replies(chat_name, chat_history):
+                        self._send_reply(chat_name, user_message)
 
                 except Exception as e:
                     logger.error(f"Error procesando chat: {e}", exc_info=True)
+                    metrics.inc("errors_total", stage="chat")
                     continue
                 finally:
                     # Cerrar el chat actual
                     self.whatsapp_client.close_current_chat()
 
+            # Confirmar en bloque las escrituras de historial del ciclo
+            self.chat_manager.flush()
+            return True
+        except Exception as e:
+            logger.error(f"Error general en process_unread_chats: {e}", exc_info=True)
+            return False
+
+    def _process_unread_chats_pipelined(self, chat_names=None):
+        """
+        Procesar los chats no leídos en modo pipeline.
+
+        El hilo del navegador solo abre, lee y envía; la construcción del prompt
+        y la llamada al LLM se ejecutan en el pool de workers, que deja las
+        respuestas terminadas en la cola de envío.
+        """
+        try:
+            unread_chats = self._get_chats_to_process(chat_names)
+
+            futures = []
+            for chat in unread_chats:
+                try:
+                    scraped = self._scrape_chat(chat)
+                except Exception as e:
+                    logger.error(f"Error procesando chat: {e}", exc_info=True)
+                    metrics.inc("errors_total", stage="chat")
+                    scraped = None
+                finally:
+                    self.whatsapp_client.close_current_chat()
+
+                if scraped:
+                    # Respetar el límite de respuestas pendientes sin bloquear los envíos
+                    while not self._pending_slots.acquire(timeout=0.1):
+                        self._drain_send_queue()
+
+                    chat_name, chat_history = scraped
+                    with self._pending_lock:
+                        self._pending_count += 1
+                    futures.append(
+                        self._executor.submit(
+                            self._generate_reply_job, chat_name, chat_history
+                        )
+                    )
+
+                # Enviar las respuestas que ya estén listas entre lectura y lectura
+                self._drain_send_queue()
+
+            # Esperar a que terminen las generaciones pendientes de este ciclo
+            while any(not future.done() for future in futures):
+                self._drain_send_queue(timeout=0.1)
+            self._drain_send_queue()
+
+            # Confirmar en bloque las escrituras de historial del ciclo
+            self.chat_manager.flush()
             return True
         except Exception as e:
             logger.error(f"Error general en process_unread_chats: {e}", exc_info=True)
             return False
+
+    def _get_chats_to_process(self, chat_names=None):
+        """Obtener los chats a procesar: los indicados o los no leídos de la lista"""
+        if chat_names is not None:
+            logger.info(f"Chats con eventos de no leídos: {len(chat_names)}")
+            return list(chat_names)
+
+        with metrics.timer("stage_seconds", stage="unread_scan"):
+            unread_chats = self.whatsapp_client.get_unread_chats()
+        logger.info(f"Chats no leídos encontrados: {len(unread_chats)}")
+        return unread_chats
+
+    def _scrape_chat(self, chat):
+        """Abrir un chat, leer sus mensajes y actualizar el historial"""
+        with metrics.timer("stage_seconds", stage="open_chat"):
+            if isinstance(chat, str):
+                opened = self.whatsapp_client.open_chat_by_name(chat)
+            else:
+                opened = self.whatsapp_client.open_chat(chat)
+            loaded = opened and self.whatsapp_client.is_chat_loaded()
+        if not opened:
+            metrics.inc("errors_total", stage="open_chat")
+            return None
+
+        # Verificar si el chat se cargó correctamente
+        if not loaded:
+            metrics.inc("errors_total", stage="chat_loaded")
+            logger.warning("El chat no se cargó correctamente, refrescando página...")
+            self.whatsapp_client.refresh_page()
+            return None
+
+        chat_name = self.whatsapp_client.get_chat_name()
+        logger.info(f"Procesando chat: {chat_name}")
+
+        with metrics.timer("stage_seconds", stage="scrape"):
+            messages = self.whatsapp_client.get_messages()
+        if not messages:
+            logger.warning(f"No se encontraron mensajes en el chat {chat_name}")
+            return None
+
+        logger.info(
+            f"Mensajes recibidos: {len(messages)} - Último: {messages[-1]['message'][:50]}..."
+        )
+
+        # Actualizar historial de chat solo con los mensajes nuevos
+        with metrics.timer("stage_seconds", stage="history_update"):
+            new_messages = self.chat_manager.add_messages(chat_name, messages)
+        if not new_messages:
+            logger.info(f"Sin mensajes nuevos en el chat {chat_name}, se omite")
+            return None
+        logger.info(f"Mensajes nuevos en {chat_name}: {len(new_messages)}")
+        metrics.inc("chats_processed_total")
+        metrics.inc("messages_received_total", len(new_messages))
+
+        # Copia del historial completo para que los workers no compartan la lista
+        chat_history = list(self.chat_manager.get_chat_history(chat_name))
+        return chat_name, chat_history
+
+    def _generate_reply(self, chat_name, chat_history):
+        """Construir el prompt, consultar al LLM y extraer el mensaje para el usuario"""
+        # Crear prompt para el LLM con el resumen de la conversación anterior
+        summary = self.chat_manager.get_chat_summary(chat_name)
+        with metrics.timer("stage_seconds", stage="prompt_format"):
+            prompt = self.prompt_manager.format_prompt(
+                chat_name, chat_history, summary=summary
+            )
+
+        # Obtener respuesta del LLM
+        with metrics.timer("stage_seconds", stage="llm"):
+            raw_response = self.llm_provider.generate_response(prompt)
+
+        # Procesar la respuesta del asistente virtual
+        with metrics.timer("stage_seconds", stage="parse"):
+            user_message = self.response_processor.process_response(raw_response)
+
+        # Si no se logró extraer un mensaje para el usuario, usar la respuesta completa
+        if not user_message.strip():
+            user_message = raw_response
+
+        return user_message
+
+    def _stream_replies(self, chat_name, chat_history):
+        """Generar la respuesta en streaming y devolver cada mensaje al completarse"""
+        summary = self.chat_manager.get_chat_summary(chat_name)
+        with metrics.timer("stage_seconds", stage="prompt_format"):
+            prompt = self.prompt_manager.format_prompt(
+                chat_name, chat_history, summary=summary
+            )
+
+        parser = StreamingMessageParser()
+        chunks = []
+        sent_any = False
+        # Tiempo dentro del proveedor, sin contar los envíos intercalados
+        llm_time = 0.0
+        stream = iter(self.llm_provider.generate_response_stream(prompt))
+        while True:
+            start = time.perf_counter()
+            chunk = next(stream, None)
+            llm_time += time.perf_counter() - start
+            if chunk is None:
+                break
+
+            chunks.append(chunk)
+            for user_message in parser.feed(chunk):
+                sent_any = True
+                yield user_message
+        metrics.observe("stage_seconds", llm_time, stage="llm")
+
+        for user_message in parser.close():
+            sent_any = True
+            yield user_message
+
+        # Sin etiquetas <Message>, procesar la respuesta completa como siempre
+        if not sent_any:
+            raw_response = "".join(chunks)
+            user_message = self.response_processor.process_response(raw_response)
+            yield user_message if user_message.strip() else raw_response
+
+    def _iter_replies(self, chat_name, chat_history):
+        """Obtener los mensajes a enviar, uno a uno si el streaming está activo"""
+        if self.streaming:
+            yield from self._stream_replies(chat_name, chat_history)
+        else:
+            yield self._generate_reply(chat_name, chat_history)
+
+    def _generate_reply_job(self, chat_name, chat_history):
+        """Tarea del pool: generar la respuesta y dejar cada mensaje en la cola de envío"""
+        try:
+            for user_message in self._iter_replies(chat_name, chat_history):
+                self._send_queue.put((chat_name, user_message))
+        except Exception as e:
+            logger.error(
+                f"Error generando respuesta para {chat_name}: {e}", exc_info=True
+            )
+            metrics.inc("errors_total", stage="generate")
+        finally:
+            with self._pending_lock:
+                self._pending_count -= 1
+            self._pending_slots.release()
+
+    def _drain_send_queue(self, timeout=None):
+        """Enviar desde el hilo del navegador las respuestas terminadas"""
+        while True:
+            try:
+                if timeout is not None:
+                    items = [self._send_queue.get(timeout=timeout)]
+                    timeout = None
+                else:
+                    items = [self._send_queue.get_nowait()]
+            except queue.Empty:
+                return
+
+            # Agrupar los mensajes ya disponibles del mismo chat para abrirlo una vez
+            while True:
+                try:
+                    items.append(self._send_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            batches = {}
+            for chat_name, user_message in items:
+                batches.setdefault(chat_name, []).append(user_message)
+
+            for chat_name, user_messages in batches.items():
+                self._deliver(chat_name, user_messages)
+
+    def _deliver(self, chat_name, user_messages):
+        """Abrir un chat por nombre y enviarle los mensajes indicados"""
+        try:
+            if not self.whatsapp_client.open_chat_by_name(chat_name):
+                logger.error(f"No se pudo abrir el chat {chat_name} para responder")
+                return
+            if not self.whatsapp_client.is_chat_loaded():
+                logger.error(f"El chat {chat_name} no se cargó para responder")
+                return
+            for user_message in user_messages:
+                self._send_reply(chat_name, user_message)
+        except Exception as e:
+            logger.error(f"Error enviando respuesta a {chat_name}: {e}", exc_info=True)
+        finally:
+            self.whatsapp_client.close_current_chat()
+
+    def _send_reply(self, chat_name, user_message):
+        """Enviar respuesta procesada al chat abierto"""
+        with metrics.timer("stage_seconds", stage="send"):
+            success = self.whatsapp_client.send_message(user_message)
+
+        if success:
+            logger.info(f"Respuesta enviada a {chat_name}")
+            metrics.inc("replies_sent_total")
+        else:
+            logger.error(f"Falló el envío de respuesta a {chat_name}")
+            metrics.inc("errors_total", stage="send")
+        return success
+
+    def close(self):
+        """Detener el pool de workers del modo pipeline"""
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
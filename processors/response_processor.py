@@ -1,84 +1,223 @@
 import re
+import html
 import logging
-import xml.etree.ElementTree as ET
-from typing import Dict, List, Tuple
+from typing import Dict, List
 
 logger = logging.getLogger(__name__)
 
 
+# Un único patrón para todo el análisis: delimitadores de bloque de código o etiquetas
+TOKEN_PATTERN = re.compile(r"```|<(/?)([A-Za-z_][\w:.-]*)([^<>]*?)(/?)>")
+ATTRIBUTE_PATTERN = re.compile(
+    r"""([A-Za-z_][\w:.-]*)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>/]+))"""
+)
+INNER_TAG_PATTERN = re.compile(r"</?[A-Za-z_][\w:.-]*[^<>]*>")
+
+MESSAGE_TAG = "Message"
+# Etiquetas que solo agrupan mensajes; cerrarlas termina un <Message> sin cerrar
+CONTAINER_TAGS = {"Response", "Messages"}
+
+
+def clean_message(body: str) -> str:
+    """Quitar etiquetas internas y entidades XML del contenido de un mensaje"""
+    return html.unescape(INNER_TAG_PATTERN.sub("", body)).strip()
+
+
+def parse_attributes(text: str) -> Dict[str, str]:
+    """Obtener los atributos de una etiqueta de apertura"""
+    return {
+        name: html.unescape(next(value for value in values if value is not None))
+        for name, *values in ATTRIBUTE_PATTERN.findall(text)
+        if any(value is not None for value in values)
+    }
+
+
+class ParsedResponse:
+    """Resultado del análisis de una respuesta: mensajes y etiquetas de acción"""
+
+    def __init__(self, messages: List[str], actions: List[Dict]):
+        self.messages = messages
+        self.actions = actions
+
+
+class ResponseScanner:
+    """
+    Máquina de estados del tokenizador en una pasada.
+
+    Admite el texto completo o por fragmentos: feed() analiza los tokens
+    completos recibidos y devuelve los mensajes terminados como pares
+    (texto, dentro_de_bloque_de_código); finish() cierra lo que quede abierto.
+    Un <Message> sin cerrar termina en el siguiente <Message>, al cerrarse su
+    contenedor, al final del bloque de código o al final del texto. Las
+    etiquetas de primer nivel distintas de Response, Messages y Message se
+    acumulan en actions como {"tag", "attributes", "content"}.
+    """
+
+    def __init__(self):
+        self.text = ""
+        # Posición desde la que buscar el siguiente token
+        self._pos = 0
+        self.in_fence = False
+        # Inicio del contenido del <Message> abierto y si está en un bloque de código
+        self._message_start = None
+        self._message_fenced = False
+        # Acción abierta: [etiqueta, atributos, inicio del contenido, profundidad]
+        self._action = None
+        self.actions: List[Dict] = []
+
+    def _end_message(self, end, completed):
+        body = clean_message(self.text[self._message_start : end])
+        if body:
+            completed.append((body, self._message_fenced))
+        self._message_start = None
+
+    def feed(self, chunk: str) -> List:
+        """Añadir texto y devolver los mensajes que ha terminado"""
+        self.text += chunk
+        text = self.text
+        completed = []
+
+        for match in TOKEN_PATTERN.finditer(text, self._pos):
+            self._pos = match.end()
+            if match.group(0) == "```":
+                if self._message_start is not None:
+                    self._end_message(match.start(), completed)
+                self.in_fence = not self.in_fence
+                continue
+
+            closing, name, rest, self_closing = match.groups()
+            if name == MESSAGE_TAG:
+                if self._message_start is not None:
+                    self._end_message(match.start(), completed)
+                if not closing and not self_closing:
+                    self._message_start = match.end()
+                    self._message_fenced = self.in_fence
+                continue
+
+            if self._message_start is not None:
+                # Las etiquetas dentro de un mensaje forman parte de su contenido
+                if closing and name in CONTAINER_TAGS:
+                    self._end_message(match.start(), completed)
+                continue
+
+            if name in CONTAINER_TAGS:
+                continue
+
+            action = self._action
+            if action is None:
+                if closing:
+                    continue
+                attributes = parse_attributes(rest)
+                if self_closing:
+                    self.actions.append({"tag": name, "attributes": attributes, "content": ""})
+                else:
+                    self._action = [name, attributes, match.end(), 1]
+            elif name == action[0] and not self_closing:
+                action[3] += -1 if closing else 1
+                if action[3] == 0:
+                    self.actions.append(
+                        {
+                            "tag": name,
+                            "attributes": action[1],
+                            "content": clean_message(text[action[2] : match.start()]),
+                        }
+                    )
+                    self._action = None
+
+        # Un token puede estar partido entre fragmentos: se vuelve a buscar
+        # desde la última '<' pendiente o desde los dos últimos caracteres
+        # (comillas de un posible ```)
+        tag_start = text.rfind("<", self._pos)
+        self._pos = tag_start if tag_start >= 0 else max(self._pos, len(text) - 2)
+        return completed
+
+    def finish(self) -> List:
+        """Terminar el análisis y devolver el mensaje que quedó abierto, si lo hay"""
+        completed = []
+        if self._message_start is not None:
+            self._end_message(len(self.text), completed)
+        if self._action is not None:
+            self.actions.append(
+                {
+                    "tag": self._action[0],
+                    "attributes": self._action[1],
+                    "content": clean_message(self.text[self._action[2] :]),
+                }
+            )
+            self._action = None
+        return completed
+
+
 class ResponseProcessor:
     """
     Procesa respuestas del LLM que contienen formato estructurado,
     separando acciones a ejecutar y mensajes para el usuario.
-    """
 
-    def __init__(self):
-        self.message_pattern = re.compile(r"<Message>(.*?)</Message>", re.DOTALL)
-        self.xml_block_pattern = re.compile(r"```(?:xml)?\s*((?:<[\s\S]*?>)[\s\S]*?(?:<\/[\s\S]*?>))```")
+    La respuesta se recorre una sola vez con un tokenizador tolerante: no
+    requiere XML bien formado, admite etiquetas sin cerrar y prioriza los
+    mensajes que aparecen dentro de bloques de código.
+    """
 
-    def process_response(self, response: str) -> List[str]:
+    def process_response(self, response: str) -> str:
         """
         Procesa una respuesta que puede contener XML, extrayendo los mensajes del usuario.
         Busca tanto en bloques de código XML como directamente en el texto.
         """
-        # Comprobar si hay bloques de código XML
-        xml_blocks = self.xml_block_pattern.findall(response)
+        return "\n".join(self.parse_response(response).messages)
 
-        # Si encontramos bloques XML, procesarlos primero
-        messages = []
-        if xml_blocks:
-            for xml_block in xml_blocks:
-                block_messages = self._extract_messages_from_xml(xml_block)
-                if block_messages:
-                    messages.extend(block_messages)
+    def parse_response(self, response: str) -> ParsedResponse:
+        """
+        Extraer en una pasada los <Message> y las demás etiquetas de la respuesta.
 
-        # Si no encontramos mensajes en bloques de código, buscar directamente en el texto
-        if not messages:
-            messages = self._extract_messages_from_xml(response)
+        Si hay mensajes dentro de bloques de código solo se devuelven esos
+        (ver ResponseScanner para el resto de reglas).
+        """
+        scanner = ResponseScanner()
+        completed = scanner.feed(response) + scanner.finish()
 
-        # Si aún no hay mensajes, usar regex como último recurso
+        fenced_messages = [body for body, fenced in completed if fenced]
+        messages = fenced_messages or [body for body, _ in completed]
         if not messages:
-            messages = self.message_pattern.findall(response)
+            logger.debug("La respuesta no contiene etiquetas <Message>")
+        return ParsedResponse(messages, scanner.actions)
 
-        return "\n".join([msg.strip() for msg in messages if msg.strip()])
 
-    def _extract_messages_from_xml(self, xml_text: str) -> List[str]:
-        """
-        Extrae mensajes de un texto XML utilizando ET.
-        """
-        # Limpiar y preparar el XML
-        clean_xml = self._ensure_root_node(xml_text)
-        
-        try:
-            root = ET.fromstring(clean_xml)
-            # Buscar etiquetas Message en cualquier nivel de profundidad
-            messages = []
-            
-            # Primer intento: buscar en la estructura esperada según la plantilla
-            message_elements = root.findall('.//Message')
-            if message_elements:
-                for msg_elem in message_elements:
-                    if msg_elem.text:
-                        messages.append(msg_elem.text)
-            
-            return messages
-            
-        except ET.ParseError as e:
-            logger.warning(f"Error al analizar XML: {e}")
-            # Intentar con regex como fallback
-            return self.message_pattern.findall(xml_text)
-
-    def _ensure_root_node(self, xml_content: str) -> str:
-        """Asegura que el XML tenga un nodo raíz"""
-        xml_content = xml_content.strip()
-        
-        # Si está vacío o no comienza con <, envolverlo en un nodo raíz
-        if not xml_content or not xml_content.startswith("<"):
-            return f"<Response>{xml_content}</Response>"
-
-        # Verificar si ya tiene un nodo raíz único
-        if re.search(r"^\s*<[\w:]+[^>]*>.*</[\w:]+>\s*$", xml_content, re.DOTALL):
-            return xml_content
-        
-        # Si parece contener múltiples elementos raíz, envolverlos
-        return f"<Response>{xml_content}</Response>"
+class StreamingMessageParser:
+    """
+    Extrae elementos <Message> de una respuesta que llega por fragmentos.
+
+    Usa el mismo ResponseScanner que ResponseProcessor.parse_response, así que
+    un mensaje termina en los mismos puntos: feed() lo devuelve en cuanto
+    llega su cierre (</Message>, el siguiente <Message>, el cierre de su
+    contenedor o del bloque de código) y close() devuelve el que quedó
+    abierto. Los mensajes fuera de bloques de código que siguen a uno dentro
+    de un bloque se descartan, como en el análisis completo. La única
+    diferencia posible es que un mensaje ya enviado no puede retirarse: si tras
+    mensajes fuera de bloque aparece uno dentro de un bloque, el análisis
+    completo devolvería solo este último.
+    """
+
+    def __init__(self):
+        self._scanner = ResponseScanner()
+        self._fenced_seen = False
+
+    def _select(self, completed):
+        messages = []
+        for body, fenced in completed:
+            if fenced:
+                self._fenced_seen = True
+                messages.append(body)
+            elif not self._fenced_seen:
+                messages.append(body)
+        return messages
+
+    def feed(self, chunk):
+        """Añadir un fragmento y devolver los mensajes completados"""
+        return self._select(self._scanner.feed(chunk))
+
+    def close(self):
+        """Terminar el análisis y devolver el mensaje sin cerrar, si lo hay"""
+        messages = self._select(self._scanner.finish())
+        self._scanner = ResponseScanner()
+        self._fenced_seen = False
+        return messages
@@ -0,0 +1,250 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from llm_provider import LLMProvider, FALLBACK_RESPONSE
+
+logger = logging.getLogger(__name__)
+
+# Campos de la plantilla que cambian en cada llamada y no afectan a la respuesta
+VOLATILE_FIELDS = ("current_datetime",)
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """Normalizar un texto: sin acentos, minúsculas, sin puntuación ni espacios repetidos"""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = _PUNCTUATION.sub(" ", text.lower())
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def prompt_fingerprint(prompt, allow_last_message=True, normalize=True):
+    """
+    Obtener una clave estable para un prompt.
+
+    Para prompts de PromptManager se usa solo la parte dinámica (sin la fecha
+    actual) o, si la plantilla lo marca como seguro y allow_last_message está
+    activo, solo el último mensaje. Para cualquier otro texto se usa el prompt
+    completo.
+    """
+    clean = normalize_text if normalize else str
+    template_name = getattr(prompt, "template_name", None)
+
+    if template_name is None:
+        parts = ["raw", clean(prompt)]
+    elif allow_last_message and getattr(prompt, "cache_last_message", False):
+        parts = [template_name, "last", clean(prompt.last_message)]
+    else:
+        parts = [template_name, "dynamic"] + [
+            f"{field}={clean(value)}"
+            for field, value in sorted(prompt.values.items())
+            if field not in VOLATILE_FIELDS
+        ]
+
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class CachingProvider(LLMProvider):
+    """
+    Caché de respuestas delante de otro LLMProvider.
+
+    Las entradas caducan a los ttl segundos y se expulsan por LRU al superar
+    max_entries o max_bytes. Opcionalmente se guardan en disco para
+    conservarse entre reinicios. Las respuestas de error no se guardan.
+    """
+
+    def __init__(
+        self,
+        provider,
+        ttl=3600,
+        max_entries=1000,
+        max_bytes=5 * 1024 * 1024,
+        persist_path=None,
+        persist_every=20,
+    ):
+        self.provider = provider
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.persist_path = persist_path
+        self.persist_every = persist_every
+
+        # {clave: (respuesta, caducidad en tiempo de reloj, tamaño)}
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._unsaved = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        if self.persist_path:
+            self._load()
+
+    def generate_response(self, prompt):
+        """Devolver la respuesta en caché o pedirla al proveedor y guardarla"""
+        key = prompt_fingerprint(prompt)
+        cached = self._get(key)
+        if cached is not None:
+            logger.debug("Respuesta servida desde la caché")
+            return cached
+
+        response = self.provider.generate_response(prompt)
+        if response and response != FALLBACK_RESPONSE:
+            self._put(key, response)
+        return response
+
+    async def agenerate_response(self, prompt):
+        """Versión asíncrona de generate_response"""
+        key = prompt_fingerprint(prompt)
+        cached = self._get(key)
+        if cached is not None:
+            logger.debug("Respuesta servida desde la caché")
+            return cached
+
+        response = await self.provider.agenerate_response(prompt)
+        if response and response != FALLBACK_RESPONSE:
+            self._put(key, response)
+        return response
+
+    def generate_response_stream(self, prompt):
+        """Servir la respuesta en caché o retransmitir la del proveedor y guardarla"""
+        key = prompt_fingerprint(prompt)
+        cached = self._get(key)
+        if cached is not None:
+            yield cached
+            return
+
+        chunks = []
+        for chunk in self.provider.generate_response_stream(prompt):
+            chunks.append(chunk)
+            yield chunk
+
+        response = "".join(chunks)
+        if response and response != FALLBACK_RESPONSE:
+            self._put(key, response)
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            response, expires_at, size = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                self._total_bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return response
+
+    def _put(self, key, response):
+        size = len(response.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._insert(key, response, time.time() + self.ttl, size)
+            self._unsaved += 1
+            should_save = self.persist_path and self._unsaved >= self.persist_every
+
+        if should_save:
+            self.save()
+
+    def _insert(self, key, response, expires_at, size):
+        """Insertar una entrada y expulsar las menos usadas (con el lock tomado)"""
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._total_bytes -= previous[2]
+
+        self._entries[key] = (response, expires_at, size)
+        self._total_bytes += size
+
+        while self._entries and (
+            len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes
+        ):
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self._total_bytes -= evicted_size
+            self.evictions += 1
+
+    def _load(self):
+        """Cargar las entradas guardadas en disco que no hayan caducado"""
+        if not os.path.exists(self.persist_path):
+            return
+
+        try:
+            with open(self.persist_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+            now = time.time()
+            with self._lock:
+                for key, (response, expires_at) in entries.items():
+                    if expires_at > now:
+                        size = len(response.encode("utf-8"))
+                        self._insert(key, response, expires_at, size)
+            logger.info(f"Caché de respuestas cargada: {len(self._entries)} entradas")
+        except Exception as e:
+            logger.error(f"Error al cargar caché de respuestas: {e}", exc_info=True)
+
+    def save(self):
+        """Guardar en disco las entradas de la caché"""
+        if not self.persist_path:
+            return False
+
+        with self._lock:
+            entries = {
+                key: [response, expires_at]
+                for key, (response, expires_at, _) in self._entries.items()
+            }
+            self._unsaved = 0
+
+        try:
+            directory = os.path.dirname(self.persist_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temp_path = f"{self.persist_path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(temp_path, self.persist_path)
+            return True
+        except Exception as e:
+            logger.error(f"Error al guardar caché de respuestas: {e}", exc_info=True)
+            return False
+
+    def get_stats(self):
+        """Obtener aciertos, fallos, tasa de aciertos y ocupación de la caché"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+            }
+
+    def close(self):
+        """Guardar la caché y cerrar el proveedor envuelto"""
+        stats = self.get_stats()
+        logger.info(
+            f"Caché de respuestas: {stats['hits']} aciertos, {stats['misses']} fallos "
+            f"(tasa {stats['hit_rate']:.1%})"
+        )
+        self.save()
+        self.provider.close()
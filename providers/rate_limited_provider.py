@@ -0,0 +1,58 @@
+import logging
+from llm_provider import LLMProvider
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitedProvider(LLMProvider):
+    """
+    Capa que hace pasar cada petición por un RateLimiter compartido.
+
+    El turno se pide con los tokens estimados del prompt y, al terminar, se
+    cargan en el cubo de tokens los de la respuesta generada.
+    """
+
+    def __init__(self, provider, limiter):
+        self.provider = provider
+        self.limiter = limiter
+
+    def generate_response(self, prompt):
+        """Esperar turno en el limitador y generar la respuesta"""
+        self.limiter.acquire(self.limiter.estimate_tokens(prompt))
+        response = ""
+        try:
+            response = self.provider.generate_response(prompt)
+            return response
+        finally:
+            self.limiter.release(self.limiter.estimate_tokens(response or ""))
+
+    def generate_response_stream(self, prompt):
+        """Esperar turno y retransmitir la respuesta, liberándolo al terminar"""
+        self.limiter.acquire(self.limiter.estimate_tokens(prompt))
+        generated = 0
+        try:
+            for chunk in self.provider.generate_response_stream(prompt):
+                generated += len(chunk)
+                yield chunk
+        finally:
+            self.limiter.release(self.limiter.estimate_tokens_for_length(generated))
+
+    async def agenerate_response(self, prompt):
+        """Esperar turno sin bloquear el bucle de eventos y generar la respuesta"""
+        await self.limiter.acquire_async(self.limiter.estimate_tokens(prompt))
+        response = ""
+        try:
+            response = await self.provider.agenerate_response(prompt)
+            return response
+        finally:
+            self.limiter.release(self.limiter.estimate_tokens(response or ""))
+
+    def close(self):
+        """Mostrar las estadísticas del limitador y cerrar el proveedor envuelto"""
+        stats = self.limiter.get_stats()
+        logger.info(
+            f"Limitador del LLM: {stats['granted']} peticiones, {stats['waited']} en espera "
+            f"(media {stats['avg_wait']:.2f}s)"
+        )
+        self.limiter.close()
+        self.provider.close()
@@ -0,0 +1,228 @@
+import math
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Cubo de fichas que se rellena de forma continua hasta su capacidad.
+
+    Con rate_per_minute None el cubo no limita nada. El saldo puede quedar
+    negativo al cargar un consumo a posteriori; las siguientes peticiones
+    esperan entonces a que se recupere.
+    """
+
+    def __init__(self, rate_per_minute):
+        self.capacity = rate_per_minute
+        self.rate = rate_per_minute / 60.0 if rate_per_minute else None
+        self.level = float(rate_per_minute or 0)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        if self.rate is None:
+            return
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def clamp(self, amount):
+        """Limitar un consumo a la capacidad para que siempre llegue a caber"""
+        return amount if self.rate is None else min(amount, self.capacity)
+
+    def delay(self, amount, now):
+        """Segundos que faltan para poder consumir amount (0 si ya se puede)"""
+        if self.rate is None:
+            return 0.0
+        self._refill(now)
+        missing = amount - self.level
+        return missing / self.rate if missing > 0 else 0.0
+
+    def consume(self, amount, now):
+        if self.rate is None:
+            return
+        self._refill(now)
+        self.level -= amount
+
+
+class _Waiter:
+    """Petición en cola, despertada con un Event (hilos) o un Future (asyncio)"""
+
+    def __init__(self, tokens, loop=None):
+        self.tokens = tokens
+        self.loop = loop
+        self.granted = False
+        if loop is None:
+            self.event = threading.Event()
+        else:
+            self.future = loop.create_future()
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(True)
+
+
+class RateLimiter:
+    """
+    Limitador compartido de peticiones al LLM.
+
+    Impone un máximo de peticiones simultáneas y cubos de fichas de peticiones
+    y tokens por minuto. Las peticiones que no pueden salir esperan en una
+    cola FIFO y se atienden estrictamente en orden de llegada, tanto desde
+    hilos (acquire) como desde corrutinas (acquire_async).
+    """
+
+    def __init__(
+        self,
+        max_in_flight=4,
+        requests_per_minute=None,
+        tokens_per_minute=None,
+        chars_per_token=4,
+    ):
+        self.max_in_flight = max_in_flight
+        self.chars_per_token = chars_per_token
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+
+        self._lock = threading.Lock()
+        self._queue = deque()
+        self._timer = None
+        self._timer_at = None
+        self.in_flight = 0
+
+        # Contadores para monitorización
+        self.granted = 0
+        self.waited = 0
+        self.total_wait = 0.0
+
+    def estimate_tokens(self, text):
+        """Estimar los tokens de un texto a partir de su longitud"""
+        return self.estimate_tokens_for_length(len(str(text)))
+
+    def estimate_tokens_for_length(self, length):
+        """Estimar los tokens de un texto de length caracteres"""
+        return math.ceil(length / self.chars_per_token)
+
+    def _dispatch(self):
+        """Conceder turno a las peticiones en cabeza de cola que puedan salir"""
+        woken = []
+        with self._lock:
+            while self._queue and self.in_flight < self.max_in_flight:
+                waiter = self._queue[0]
+                now = time.monotonic()
+                wait = max(
+                    self.requests.delay(1, now), self.tokens.delay(waiter.tokens, now)
+                )
+                if wait > 0:
+                    # Volver a intentarlo cuando los cubos se hayan rellenado
+                    self._schedule(now + wait)
+                    break
+
+                self._queue.popleft()
+                self.requests.consume(1, now)
+                self.tokens.consume(waiter.tokens, now)
+                self.in_flight += 1
+                self.granted += 1
+                waiter.granted = True
+                woken.append(waiter)
+
+        for waiter in woken:
+            waiter.wake()
+
+    def _schedule(self, when):
+        """Programar un reparto de turnos para el instante indicado (con el lock tomado)"""
+        if self._timer is not None and self._timer_at <= when:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+
+        self._timer_at = when
+        self._timer = threading.Timer(when - time.monotonic(), self._on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _on_timer(self):
+        with self._lock:
+            self._timer = None
+            self._timer_at = None
+        self._dispatch()
+
+    def _enqueue(self, waiter):
+        with self._lock:
+            # Solo cuenta como espera si había alguien delante o no hay hueco
+            if self._queue or self.in_flight >= self.max_in_flight:
+                self.waited += 1
+            self._queue.append(waiter)
+
+    def _record_wait(self, started):
+        with self._lock:
+            self.total_wait += time.monotonic() - started
+
+    def acquire(self, prompt_tokens=0):
+        """Esperar turno desde un hilo para una petición de prompt_tokens tokens"""
+        waiter = _Waiter(self.tokens.clamp(prompt_tokens))
+        started = time.monotonic()
+        self._enqueue(waiter)
+        self._dispatch()
+        waiter.event.wait()
+        self._record_wait(started)
+
+    async def acquire_async(self, prompt_tokens=0):
+        """Esperar turno desde una corrutina para una petición de prompt_tokens tokens"""
+        waiter = _Waiter(self.tokens.clamp(prompt_tokens), asyncio.get_running_loop())
+        started = time.monotonic()
+        self._enqueue(waiter)
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            self._cancel(waiter)
+            raise
+        self._record_wait(started)
+
+    def _cancel(self, waiter):
+        """Retirar de la cola una petición cancelada o liberar su turno"""
+        with self._lock:
+            granted = waiter.granted
+            if not granted:
+                self._queue.remove(waiter)
+        if granted:
+            self.release()
+        else:
+            self._dispatch()
+
+    def release(self, completion_tokens=0):
+        """Terminar una petición, cargando los tokens generados en la respuesta"""
+        with self._lock:
+            self.in_flight -= 1
+            if completion_tokens:
+                self.tokens.consume(completion_tokens, time.monotonic())
+        self._dispatch()
+
+    def close(self):
+        """Cancelar el reparto programado"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = None
+            self._timer_at = None
+
+    def get_stats(self):
+        """Obtener peticiones concedidas, en curso, en cola y espera media"""
+        with self._lock:
+            return {
+                "granted": self.granted,
+                "in_flight": self.in_flight,
+                "queued": len(self._queue),
+                "waited": self.waited,
+                "avg_wait": self.total_wait / self.granted if self.granted else 0.0,
+            }
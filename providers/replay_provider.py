@@ -0,0 +1,172 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from llm_provider import LLMProvider, FALLBACK_RESPONSE
+from providers.cache_provider import prompt_fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+def recording_key(prompt):
+    """Clave exacta de un prompt, sin los campos que cambian en cada llamada"""
+    return prompt_fingerprint(prompt, allow_last_message=False, normalize=False)
+
+
+def load_recordings(path):
+    """Leer un archivo de grabaciones: {clave: (respuesta, latencia)}, la última gana"""
+    recordings = {}
+    if not os.path.exists(path):
+        return recordings
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                recordings[entry["key"]] = (entry["response"], entry["latency"])
+            except (ValueError, KeyError):
+                # Una línea a medio escribir por un cierre brusco no invalida el resto
+                logger.warning(f"Línea {line_number} inválida en {path}, se ignora")
+    return recordings
+
+
+class RecordingProvider(LLMProvider):
+    """
+    Graba las respuestas de otro LLMProvider para reproducirlas sin red.
+
+    Cada respuesta se añade como una línea JSON {key, response, latency} al
+    archivo de grabaciones, con la clave de recording_key y la latencia real
+    de la llamada. Las respuestas de error no se graban.
+    """
+
+    def __init__(self, provider, path):
+        self.provider = provider
+        self.path = path
+        self.recorded = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        logger.info(f"Grabando respuestas del LLM en {path}")
+
+    def _record(self, prompt, response, latency):
+        if not response or response == FALLBACK_RESPONSE:
+            return
+
+        line = json.dumps(
+            {"key": recording_key(prompt), "response": response, "latency": round(latency, 4)},
+            ensure_ascii=False,
+        )
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self.recorded += 1
+
+    def generate_response(self, prompt):
+        """Generar con el proveedor envuelto y grabar la respuesta"""
+        started = time.perf_counter()
+        response = self.provider.generate_response(prompt)
+        self._record(prompt, response, time.perf_counter() - started)
+        return response
+
+    def generate_response_stream(self, prompt):
+        """Retransmitir la respuesta y grabarla completa al terminar"""
+        started = time.perf_counter()
+        chunks = []
+        for chunk in self.provider.generate_response_stream(prompt):
+            chunks.append(chunk)
+            yield chunk
+        self._record(prompt, "".join(chunks), time.perf_counter() - started)
+
+    async def agenerate_response(self, prompt):
+        """Versión asíncrona de generate_response"""
+        started = time.perf_counter()
+        response = await self.provider.agenerate_response(prompt)
+        self._record(prompt, response, time.perf_counter() - started)
+        return response
+
+    def close(self):
+        """Cerrar el archivo de grabaciones y el proveedor envuelto"""
+        with self._lock:
+            self._file.close()
+        logger.info(f"Respuestas grabadas: {self.recorded} en {self.path}")
+        self.provider.close()
+
+
+class ReplayProvider(LLMProvider):
+    """
+    Sirve respuestas grabadas por RecordingProvider, sin red.
+
+    Con latency "recorded" cada respuesta tarda lo mismo que la original
+    (multiplicado por speed); con "instant" se devuelve al momento. Un prompt
+    sin grabación devuelve FALLBACK_RESPONSE, o lanza KeyError con strict.
+    """
+
+    def __init__(self, path, latency="recorded", speed=1.0, strict=False, chunk_size=20):
+        self.path = path
+        self.replay_latency = latency == "recorded"
+        self.speed = speed
+        self.strict = strict
+        self.chunk_size = chunk_size
+        self.recordings = load_recordings(path)
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        logger.info(f"Reproduciendo {len(self.recordings)} respuestas grabadas de {path}")
+
+    def _lookup(self, prompt):
+        """Obtener (respuesta, segundos de espera) para un prompt"""
+        entry = self.recordings.get(recording_key(prompt))
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if entry is None:
+            if self.strict:
+                raise KeyError("Prompt sin respuesta grabada")
+            logger.warning("Prompt sin respuesta grabada, usando la respuesta de error")
+            return FALLBACK_RESPONSE, 0.0
+
+        response, latency = entry
+        return response, latency * self.speed if self.replay_latency else 0.0
+
+    def generate_response(self, prompt):
+        """Devolver la respuesta grabada tras la latencia original, si procede"""
+        response, delay = self._lookup(prompt)
+        if delay:
+            time.sleep(delay)
+        return response
+
+    def generate_response_stream(self, prompt):
+        """Devolver la respuesta grabada en fragmentos repartiendo la latencia"""
+        response, delay = self._lookup(prompt)
+        chunks = [
+            response[i : i + self.chunk_size]
+            for i in range(0, len(response), self.chunk_size)
+        ]
+        for chunk in chunks:
+            if delay:
+                time.sleep(delay / len(chunks))
+            yield chunk
+
+    async def agenerate_response(self, prompt):
+        """Versión asíncrona de generate_response"""
+        response, delay = self._lookup(prompt)
+        if delay:
+            await asyncio.sleep(delay)
+        return response
+
+    def close(self):
+        logger.info(
+            f"Reproducción: {self.hits} respuestas grabadas servidas, "
+            f"{self.misses} prompts sin grabación"
+        )
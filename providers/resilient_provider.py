@@ -0,0 +1,336 @@
+import time
+import random
+import logging
+import threading
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ThreadPoolExecutor,
+    TimeoutError as FutureTimeoutError,
+    wait,
+)
+from llm_provider import LLMProvider, FALLBACK_RESPONSE
+
+logger = logging.getLogger(__name__)
+
+# Errores que no se arreglan reintentando (por nombre, para no depender del SDK)
+NON_RETRYABLE_ERRORS = {
+    "InvalidArgument",
+    "PermissionDenied",
+    "Unauthenticated",
+    "NotFound",
+    "BlockedPromptException",
+    "StopCandidateException",
+    "ValueError",
+    "TypeError",
+}
+
+
+class CircuitOpenError(Exception):
+    """El circuito está abierto y la llamada se rechaza sin intentarla"""
+
+
+class CircuitBreaker:
+    """
+    Cortocircuito por fallos consecutivos.
+
+    Tras failure_threshold fallos seguidos se abre y rechaza las llamadas
+    durante reset_timeout segundos; después deja pasar una llamada de prueba
+    (semiabierto) y vuelve a cerrarse si tiene éxito.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Indicar si se puede intentar una llamada ahora"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self._trial_running = False
+            # Semiabierto: solo una llamada de prueba a la vez
+            if self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("Circuito del LLM cerrado de nuevo")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opens += 1
+                    logger.warning(
+                        f"Circuito del LLM abierto tras {self.failures} fallos, "
+                        f"se reintentará en {self.reset_timeout}s"
+                    )
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class ResilientProvider(LLMProvider):
+    """
+    Capa de resiliencia delante de otro LLMProvider.
+
+    Cada intento tiene un plazo máximo (timeout) y la llamada completa otro
+    (deadline). Los errores transitorios se reintentan con espera exponencial
+    con jitter, y un CircuitBreaker corta las llamadas tras fallos repetidos.
+    Con hedge activado, si un intento supera el percentil hedge_quantile de
+    las latencias recientes se lanza un segundo intento en paralelo y se usa
+    el primero que responda. Si todo falla se devuelve FALLBACK_RESPONSE.
+
+    El proveedor envuelto debe lanzar sus errores en lugar de devolver la
+    respuesta de error. Los intentos que agotan su plazo o pierden frente al
+    duplicado se cancelan si aún no han empezado; uno que ya se está
+    ejecutando no se puede interrumpir y sigue ocupando su hilo hasta que el
+    SDK responda. Por eso el pool admite, para max_concurrent_calls llamadas
+    simultáneas, todos los intentos y duplicados de cada una sin quedarse sin
+    hilos.
+    """
+
+    def __init__(
+        self,
+        provider,
+        timeout=30.0,
+        deadline=60.0,
+        max_retries=3,
+        backoff_base=0.5,
+        backoff_max=8.0,
+        failure_threshold=5,
+        reset_timeout=30.0,
+        hedge=False,
+        hedge_quantile=0.95,
+        hedge_min_samples=20,
+        hedge_min_delay=0.5,
+        max_concurrent_calls=4,
+    ):
+        self.provider = provider
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+
+        attempts_per_call = (max_retries + 1) * (2 if hedge else 1)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrent_calls * attempts_per_call,
+            thread_name_prefix="llm-call",
+        )
+        self._latencies = deque(maxlen=200)
+        self._lock = threading.Lock()
+
+        # Contadores para monitorización
+        self.calls = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.fallbacks = 0
+        self.rejected = 0
+
+    def _is_retryable(self, error):
+        if isinstance(error, CircuitOpenError):
+            return False
+        return not any(
+            cls.__name__ in NON_RETRYABLE_ERRORS for cls in type(error).__mro__
+        )
+
+    def _backoff(self, attempt):
+        """Espera antes del reintento: exponencial con jitter completo"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    def _hedge_delay(self):
+        """Latencia a partir de la cual lanzar un segundo intento, o None"""
+        with self._lock:
+            if not self.hedge or len(self._latencies) < self.hedge_min_samples:
+                return None
+            latencies = sorted(self._latencies)
+        index = min(len(latencies) - 1, int(len(latencies) * self.hedge_quantile))
+        return max(self.hedge_min_delay, latencies[index])
+
+    def _timed_call(self, prompt):
+        started = time.monotonic()
+        response = self.provider.generate_response(prompt)
+        with self._lock:
+            self._latencies.append(time.monotonic() - started)
+        return response
+
+    def _attempt(self, prompt, timeout):
+        """Ejecutar un intento con plazo, lanzando un segundo si se retrasa"""
+        futures = [self._executor.submit(self._timed_call, prompt)]
+        try:
+            return self._await_attempt(prompt, futures, timeout)
+        finally:
+            # No dejar en cola intentos que ya nadie espera
+            for future in futures:
+                future.cancel()
+
+    def _await_attempt(self, prompt, futures, timeout):
+        primary = futures[0]
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is None or hedge_delay >= timeout:
+            return primary.result(timeout=timeout)
+
+        done, _ = wait([primary], timeout=hedge_delay)
+        if done:
+            return primary.result()
+
+        with self._lock:
+            self.hedges += 1
+        logger.debug(f"Intento retrasado más de {hedge_delay:.2f}s, lanzando otro")
+        secondary = self._executor.submit(self._timed_call, prompt)
+        futures.append(secondary)
+        pending = {primary, secondary}
+        end = time.monotonic() + timeout - hedge_delay
+        error = None
+
+        # Usar la primera respuesta correcta; fallar solo si fallan ambos
+        while pending:
+            done, pending = wait(
+                pending, timeout=max(0, end - time.monotonic()), return_when=FIRST_COMPLETED
+            )
+            if not done:
+                raise FutureTimeoutError()
+            for future in done:
+                if future.exception() is None:
+                    if future is secondary:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def generate_response(self, prompt):
+        """Generar la respuesta con plazos, reintentos y cortocircuito"""
+        with self._lock:
+            self.calls += 1
+        end = time.monotonic() + self.deadline
+
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                with self._lock:
+                    self.rejected += 1
+                logger.warning("Circuito del LLM abierto, usando la respuesta de error")
+                break
+
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                break
+
+            try:
+                response = self._attempt(prompt, min(self.timeout, remaining))
+                self.breaker.record_success()
+                return response
+            except FutureTimeoutError:
+                with self._lock:
+                    self.timeouts += 1
+                error = TimeoutError("Tiempo de espera del LLM agotado")
+            except Exception as e:
+                error = e
+            self.breaker.record_failure()
+
+            if not self._is_retryable(error) or attempt == self.max_retries:
+                logger.error(f"Error al generar respuesta: {error}")
+                break
+
+            delay = min(self._backoff(attempt), max(0, end - time.monotonic()))
+            logger.warning(
+                f"Error transitorio del LLM ({error}), reintento {attempt + 1} "
+                f"en {delay:.2f}s"
+            )
+            with self._lock:
+                self.retries += 1
+            time.sleep(delay)
+
+        with self._lock:
+            self.fallbacks += 1
+        return FALLBACK_RESPONSE
+
+    def generate_response_stream(self, prompt):
+        """
+        Retransmitir la respuesta, reintentando solo los fallos previos al primer fragmento.
+
+        En streaming no se aplican plazos por intento ni peticiones duplicadas.
+        """
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                with self._lock:
+                    self.rejected += 1
+                break
+
+            started = False
+            try:
+                for chunk in self.provider.generate_response_stream(prompt):
+                    started = True
+                    yield chunk
+                self.breaker.record_success()
+                return
+            except Exception as e:
+                self.breaker.record_failure()
+                if started or not self._is_retryable(e) or attempt == self.max_retries:
+                    logger.error(f"Error al generar respuesta en streaming: {e}")
+                    if started:
+                        return
+                    break
+                with self._lock:
+                    self.retries += 1
+                time.sleep(self._backoff(attempt))
+
+        with self._lock:
+            self.fallbacks += 1
+        yield FALLBACK_RESPONSE
+
+    def get_stats(self):
+        """Obtener los contadores de reintentos, plazos, duplicados y cortocircuito"""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "retries": self.retries,
+                "timeouts": self.timeouts,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "fallbacks": self.fallbacks,
+                "rejected": self.rejected,
+                "breaker_state": self.breaker.state,
+                "breaker_opens": self.breaker.opens,
+            }
+
+    def close(self):
+        """Mostrar estadísticas, abandonar las llamadas colgadas y cerrar el proveedor"""
+        stats = self.get_stats()
+        logger.info(
+            f"Resiliencia del LLM: {stats['calls']} llamadas, {stats['retries']} reintentos, "
+            f"{stats['timeouts']} plazos agotados, {stats['hedges']} duplicadas, "
+            f"{stats['fallbacks']} respuestas de error"
+        )
+        self._executor.shutdown(wait=False)
+        self.provider.close()
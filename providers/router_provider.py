@@ -0,0 +1,221 @@
+import time
+import logging
+import threading
+from llm_provider import LLMProvider, FALLBACK_RESPONSE
+
+logger = logging.getLogger(__name__)
+
+
+class Backend:
+    """Proveedor de un router con sus estimaciones de latencia y tasa de error"""
+
+    def __init__(self, name, provider, max_in_flight=4):
+        self.name = name
+        self.provider = provider
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        # Medias móviles exponenciales; None hasta la primera respuesta
+        self.latency = None
+        self.error_rate = 0.0
+        self.unhealthy_until = 0.0
+        self.last_used = 0.0
+        # Hay una petición de sondeo en curso para medir el backend
+        self.probing = False
+
+        self.requests = 0
+        self.errors = 0
+
+
+class RouterProvider(LLMProvider):
+    """
+    Reparte las peticiones entre varios proveedores según su latencia.
+
+    Para cada backend se mantiene una media móvil exponencial (alpha) de la
+    latencia y de la tasa de error, y cada petición va al backend sano con
+    menor latencia esperada que tenga hueco (max_in_flight). Los backends
+    saturados no se usan: la petición va al siguiente y, si todos los que
+    quedan están saturados, espera hasta queue_timeout segundos a que alguno
+    quede libre. Un backend cuya tasa de error supera max_error_rate queda
+    excluido durante cooldown segundos. Si un backend falla, la petición se
+    reintenta en el siguiente. Los backends sin medidas o que llevan
+    probe_interval segundos sin usarse reciben una única petición de sondeo
+    a la vez para actualizar su estimación.
+    """
+
+    def __init__(
+        self,
+        backends,
+        alpha=0.2,
+        max_error_rate=0.5,
+        cooldown=30.0,
+        probe_interval=60.0,
+        queue_timeout=30.0,
+    ):
+        self.backends = backends
+        self.alpha = alpha
+        self.max_error_rate = max_error_rate
+        self.cooldown = cooldown
+        self.probe_interval = probe_interval
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        # Avisa a las peticiones en espera cuando un backend queda libre
+        self._slot_freed = threading.Condition(self._lock)
+
+    def _needs_probe(self, backend, now):
+        """Indicar si el backend no tiene medidas o no se usa desde hace tiempo"""
+        return backend.latency is None or now - backend.last_used > self.probe_interval
+
+    def _score(self, backend, now):
+        """Latencia esperada teniendo en cuenta la tasa de error"""
+        if self._needs_probe(backend, now):
+            # Primero para medirlo, pero solo con un sondeo en curso a la vez
+            if not backend.probing:
+                return 0.0
+            if backend.latency is None:
+                return float("inf")
+        return backend.latency / max(0.05, 1.0 - backend.error_rate)
+
+    def _ranked(self, now):
+        """Backends ordenados por preferencia: sanos y más rápidos primero"""
+        return sorted(
+            self.backends,
+            key=lambda backend: (
+                backend.unhealthy_until > now,
+                self._score(backend, now),
+                backend.in_flight / backend.max_in_flight,
+            ),
+        )
+
+    def _acquire(self, tried):
+        """
+        Elegir un backend no probado y con hueco y reservarle una petición.
+
+        Devuelve None si todos los que quedan están saturados. Se llama con
+        self._lock tomado.
+        """
+        now = time.monotonic()
+        for backend in self._ranked(now):
+            if backend.name in tried or backend.in_flight >= backend.max_in_flight:
+                continue
+            if self._needs_probe(backend, now):
+                backend.probing = True
+            backend.in_flight += 1
+            backend.requests += 1
+            backend.last_used = now
+            return backend
+        return None
+
+    def _next_backend(self, tried):
+        """Reservar el siguiente backend, esperando si todos están saturados"""
+        deadline = time.monotonic() + self.queue_timeout
+        with self._slot_freed:
+            while True:
+                backend = self._acquire(tried)
+                if backend is not None:
+                    return backend
+                if all(candidate.name in tried for candidate in self.backends):
+                    return None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning(
+                        f"Todos los backends del router siguen saturados tras {self.queue_timeout}s"
+                    )
+                    return None
+                self._slot_freed.wait(remaining)
+
+    def _record(self, backend, latency, failed):
+        with self._lock:
+            backend.in_flight -= 1
+            backend.probing = False
+            self._slot_freed.notify_all()
+            backend.error_rate += self.alpha * (float(failed) - backend.error_rate)
+            if failed:
+                backend.errors += 1
+                if backend.error_rate > self.max_error_rate:
+                    backend.unhealthy_until = time.monotonic() + self.cooldown
+                    logger.warning(
+                        f"Backend {backend.name} excluido {self.cooldown}s "
+                        f"(tasa de error {backend.error_rate:.0%})"
+                    )
+            elif backend.latency is None:
+                backend.latency = latency
+            else:
+                backend.latency += self.alpha * (latency - backend.latency)
+
+    def generate_response(self, prompt):
+        """Enviar la petición al backend más rápido disponible, con conmutación por error"""
+        tried = set()
+        while True:
+            backend = self._next_backend(tried)
+            if backend is None:
+                break
+            tried.add(backend.name)
+
+            started = time.monotonic()
+            try:
+                response = backend.provider.generate_response(prompt)
+                failed = not response or response == FALLBACK_RESPONSE
+            except Exception as e:
+                logger.warning(f"Error en el backend {backend.name}: {e}")
+                response, failed = None, True
+            self._record(backend, time.monotonic() - started, failed)
+
+            if not failed:
+                logger.debug(f"Respuesta servida por el backend {backend.name}")
+                return response
+
+        logger.error("Ningún backend del router pudo generar la respuesta")
+        return FALLBACK_RESPONSE
+
+    def generate_response_stream(self, prompt):
+        """Retransmitir desde el mejor backend, cambiando de backend solo antes del primer fragmento"""
+        tried = set()
+        while True:
+            backend = self._next_backend(tried)
+            if backend is None:
+                break
+            tried.add(backend.name)
+
+            started = time.monotonic()
+            chunks = []
+            failed = False
+            try:
+                for chunk in backend.provider.generate_response_stream(prompt):
+                    chunks.append(chunk)
+                    yield chunk
+                failed = "".join(chunks) == FALLBACK_RESPONSE
+            except Exception as e:
+                logger.warning(f"Error en el backend {backend.name}: {e}")
+                failed = True
+            finally:
+                self._record(backend, time.monotonic() - started, failed)
+
+            if chunks:
+                return
+
+        yield FALLBACK_RESPONSE
+
+    def get_stats(self):
+        """Obtener peticiones, errores y estimaciones de cada backend"""
+        with self._lock:
+            return {
+                backend.name: {
+                    "requests": backend.requests,
+                    "errors": backend.errors,
+                    "in_flight": backend.in_flight,
+                    "latency": backend.latency,
+                    "error_rate": backend.error_rate,
+                }
+                for backend in self.backends
+            }
+
+    def close(self):
+        """Mostrar el reparto de peticiones y cerrar los backends"""
+        for name, stats in self.get_stats().items():
+            latency = f"{stats['latency']:.2f}s" if stats["latency"] is not None else "-"
+            logger.info(
+                f"Backend {name}: {stats['requests']} peticiones, {stats['errors']} errores, "
+                f"latencia media {latency}"
+            )
+        for backend in self.backends:
+            backend.provider.close()
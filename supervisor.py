@@ -0,0 +1,314 @@
+import os
+import sys
+import time
+import signal
+import logging
+import argparse
+import threading
+import multiprocessing
+from urllib.request import urlopen
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import Config, validate_account_name
+from metrics import MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+
+def run_worker(config_path, account, metrics_port):
+    """
+    Punto de entrada de cada proceso: un bot aislado para una cuenta.
+
+    Se ejecuta en un proceso nuevo (spawn), así que importa el bot aquí para
+    que cada worker cargue sus propios módulos y su propio navegador.
+    """
+    from bot import WhatsAppBot
+
+    # Grupo de procesos propio: Ctrl+C llega solo al supervisor, que avisa a
+    # cada worker una única vez para que el cierre no se interrumpa
+    if os.name == "posix":
+        os.setpgrp()
+
+    config = Config(config_path, account=account)
+    if metrics_port:
+        metrics_config = config.config.setdefault("metrics", {})
+        metrics_config["enabled"] = True
+        metrics_config["port"] = metrics_port
+
+    WhatsAppBot(config).run()
+
+
+class Worker:
+    """Estado de un proceso de bot supervisado"""
+
+    def __init__(self, account, metrics_port=None):
+        self.account = account
+        self.metrics_port = metrics_port
+        self.process = None
+        self.started_at = 0.0
+        self.restart_times = []
+        self.restart_at = None
+        # stopped: no se volverá a arrancar; given_up: por reinicios continuos
+        self.stopped = False
+        self.given_up = False
+
+    def is_alive(self):
+        return self.process is not None and self.process.is_alive()
+
+
+class Supervisor:
+    """
+    Ejecuta un bot por cuenta, cada uno en su propio proceso.
+
+    Cada worker usa Config(account=...) y por tanto su propio perfil de
+    navegador, archivo de sesión, historiales y caché. Los workers que
+    terminan con error se reinician con espera exponencial; si una cuenta se
+    reinicia más de max_restarts veces en restart_window segundos se deja
+    detenida. Un worker que termina sin error (por ejemplo, porque no se
+    escaneó el código QR a tiempo) se deja detenido salvo que
+    restart_on_clean_exit esté activado.
+    Con las métricas activadas, cada worker expone las suyas en un puerto
+    propio y el supervisor las agrega en el puerto configurado.
+    """
+
+    def __init__(self, config, config_path="config.json", accounts=None):
+        self.config = config
+        self.config_path = config_path
+
+        supervisor_config = config.config.get("supervisor", {})
+        self.restart_delay = supervisor_config.get("restart_delay", 5)
+        self.max_restart_delay = supervisor_config.get("max_restart_delay", 300)
+        self.max_restarts = supervisor_config.get("max_restarts", 5)
+        self.restart_window = supervisor_config.get("restart_window", 600)
+        self.stop_timeout = supervisor_config.get("stop_timeout", 30)
+        self.check_interval = supervisor_config.get("check_interval", 1)
+        self.restart_on_clean_exit = supervisor_config.get("restart_on_clean_exit", False)
+
+        metrics_config = config.config.get("metrics", {})
+        self.metrics_enabled = metrics_config.get("enabled", False)
+        self.metrics_host = metrics_config.get("host", "127.0.0.1")
+        self.metrics_port = metrics_config.get("port", 9108)
+
+        accounts = accounts or list(config.config.get("accounts", {}))
+        for account in accounts:
+            validate_account_name(account)
+        self.workers = [
+            Worker(
+                account,
+                self.metrics_port + index + 1 if self.metrics_enabled else None,
+            )
+            for index, account in enumerate(accounts)
+        ]
+
+        self.metrics = MetricsRegistry(prefix="whatsapp_supervisor")
+        self.metrics.gauge("worker_up", "1 si el proceso de la cuenta está en marcha")
+        self.metrics.counter("worker_restarts_total", "Reinicios de cada worker")
+        self.metrics.counter("scrape_errors_total", "Fallos al leer las métricas de un worker")
+
+        self._context = multiprocessing.get_context("spawn")
+        self._stopping = threading.Event()
+        self._server = None
+
+    def start_worker(self, worker):
+        worker.process = self._context.Process(
+            target=run_worker,
+            args=(self.config_path, worker.account, worker.metrics_port),
+            name=f"bot-{worker.account}",
+        )
+        worker.process.start()
+        worker.started_at = time.monotonic()
+        worker.restart_at = None
+        self.metrics.set("worker_up", 1, account=worker.account)
+        logger.info(f"Worker {worker.account} iniciado (pid {worker.process.pid})")
+
+    def _handle_exit(self, worker):
+        """Programar el reinicio de un worker que ha terminado"""
+        exit_code = worker.process.exitcode
+        worker.process = None
+        self.metrics.set("worker_up", 0, account=worker.account)
+
+        if exit_code == 0 and not self.restart_on_clean_exit:
+            worker.stopped = True
+            logger.warning(
+                f"Worker {worker.account} se detuvo sin error; no se reinicia "
+                "(revisa su log, por ejemplo si el inicio de sesión falló)"
+            )
+            return
+
+        now = time.monotonic()
+        worker.restart_times = [
+            t for t in worker.restart_times if now - t < self.restart_window
+        ]
+        if len(worker.restart_times) >= self.max_restarts:
+            worker.stopped = True
+            worker.given_up = True
+            logger.error(
+                f"Worker {worker.account} terminó (código {exit_code}) y superó "
+                f"{self.max_restarts} reinicios en {self.restart_window}s; no se reinicia"
+            )
+            return
+
+        delay = min(
+            self.restart_delay * 2 ** len(worker.restart_times), self.max_restart_delay
+        )
+        worker.restart_times.append(now)
+        worker.restart_at = now + delay
+        self.metrics.inc("worker_restarts_total", account=worker.account)
+        logger.warning(
+            f"Worker {worker.account} terminó (código {exit_code}); "
+            f"reinicio en {delay:.1f}s"
+        )
+
+    def monitor(self):
+        """Vigilar los workers hasta que se detenga el supervisor"""
+        while not self._stopping.wait(self.check_interval):
+            now = time.monotonic()
+            for worker in self.workers:
+                if worker.stopped:
+                    continue
+                if worker.process is not None and not worker.process.is_alive():
+                    self._handle_exit(worker)
+                if worker.restart_at is not None and now >= worker.restart_at:
+                    self.start_worker(worker)
+
+            if self.workers and all(worker.stopped for worker in self.workers):
+                logger.error("Todos los workers se han detenido. Saliendo...")
+                return
+
+    def collect_metrics(self):
+        """Combinar las métricas de todos los workers y las del supervisor"""
+        families = {}
+        order = []
+        for worker in self.workers:
+            if not worker.metrics_port or not worker.is_alive():
+                continue
+            url = f"http://{self.metrics_host}:{worker.metrics_port}/metrics"
+            try:
+                with urlopen(url, timeout=5) as response:
+                    text = response.read().decode("utf-8")
+            except Exception as e:
+                logger.debug(f"No se pudieron leer las métricas de {worker.account}: {e}")
+                self.metrics.inc("scrape_errors_total", account=worker.account)
+                continue
+
+            # Cada worker etiqueta sus series con la cuenta; las cabeceras
+            # HELP/TYPE de cada familia se conservan una sola vez
+            family = None
+            for line in text.splitlines():
+                if line.startswith("# "):
+                    parts = line.split(" ", 3)
+                    family = parts[2]
+                    if family not in families:
+                        families[family] = {"header": [], "samples": []}
+                        order.append(family)
+                    if line not in families[family]["header"]:
+                        families[family]["header"].append(line)
+                elif line and family:
+                    families[family]["samples"].append(line)
+
+        lines = []
+        for family in order:
+            lines.extend(families[family]["header"])
+            lines.extend(families[family]["samples"])
+        return "\n".join(lines) + ("\n" if lines else "") + self.metrics.render()
+
+    def start_metrics_server(self):
+        supervisor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = supervisor.collect_metrics().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(f"Petición de métricas: {format % args}")
+
+        try:
+            self._server = ThreadingHTTPServer((self.metrics_host, self.metrics_port), Handler)
+        except OSError as e:
+            logger.error(f"No se pudo abrir el puerto de métricas {self.metrics_port}: {e}")
+            return
+
+        self._server.daemon_threads = True
+        threading.Thread(
+            target=self._server.serve_forever, name="supervisor-metrics", daemon=True
+        ).start()
+        logger.info(
+            f"Métricas agregadas en http://{self.metrics_host}:{self.metrics_port}/metrics"
+        )
+
+    def stop(self):
+        """Pedir a los workers que terminen y esperarlos"""
+        self._stopping.set()
+        running = [worker for worker in self.workers if worker.is_alive()]
+        for worker in running:
+            # SIGINT deja que el bot guarde la sesión y vuelque los historiales
+            if os.name == "posix":
+                os.kill(worker.process.pid, signal.SIGINT)
+            else:
+                worker.process.terminate()
+
+        deadline = time.monotonic() + self.stop_timeout
+        for worker in running:
+            worker.process.join(max(0.0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                logger.warning(f"Worker {worker.account} no terminó a tiempo, forzando cierre")
+                worker.process.kill()
+                worker.process.join()
+            self.metrics.set("worker_up", 0, account=worker.account)
+
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def run(self):
+        if not self.workers:
+            logger.error("No hay cuentas configuradas en 'accounts'. Saliendo...")
+            return 1
+
+        if self.metrics_enabled:
+            self.start_metrics_server()
+        for worker in self.workers:
+            self.start_worker(worker)
+
+        try:
+            self.monitor()
+        except KeyboardInterrupt:
+            logger.info("Supervisor detenido por el usuario")
+        finally:
+            self.stop()
+        return 1 if any(worker.given_up for worker in self.workers) else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Ejecutar un bot por cuenta en procesos separados"
+    )
+    parser.add_argument(
+        "--config", help="Ruta al archivo de configuración", default="config.json"
+    )
+    parser.add_argument(
+        "--accounts",
+        nargs="+",
+        help="Cuentas a ejecutar (por defecto, todas las de 'accounts')",
+    )
+    args = parser.parse_args()
+
+    config = Config(args.config)
+    try:
+        supervisor = Supervisor(config, args.config, args.accounts)
+    except ValueError as e:
+        logger.error(f"{e}. Saliendo...")
+        return 1
+    return supervisor.run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
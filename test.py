@@ -2,11 +2,13 @@ import argparse
 import logging
 import json
 import os
+import time
+import uuid
 from config import Config
 from managers.prompt_manager import PromptManager
 from llm_provider import LLMProviderFactory
 from processors.response_processor import ResponseProcessor
-from managers.chat_persistence_manager import ChatPersistenceManager
+from managers.persistence_factory import PersistenceManagerFactory
 from managers.chat_manager import ChatManager
 
 # Configurar logging
@@ -27,7 +29,9 @@ class LLMTester:
         )
 
         # Inicializar componentes necesarios
-        self.chat_persistence_manager = ChatPersistenceManager(self.config)
+        self.chat_persistence_manager = (
+            PersistenceManagerFactory.create_persistence_manager(self.config)
+        )
         self.chat_manager = ChatManager(self.config, self.chat_persistence_manager)
         self.prompt_manager = PromptManager(self.config)
         self.response_processor = ResponseProcessor()
@@ -47,6 +51,8 @@ class LLMTester:
         self,
         message,
         contact_name="Test User",
+        chat_id="Test",
+        prompt_name=None,
         show_prompt=False,
     ):
         """
@@ -55,6 +61,8 @@ class LLMTester:
         Args:
             message (str): Mensaje para procesar
             contact_name (str): Nombre del contacto simulado
+            chat_id (str): Identificador del chat de prueba
+            prompt_name (str): Nombre de la plantilla de prompt a usar
             show_prompt (bool): Si se debe mostrar el prompt completo enviado al LLM
 
         Returns:
@@ -63,9 +71,10 @@ class LLMTester:
 
         # Añadir mensaje al historial
         self.chat_manager.add_messages(
-            "Test",
+            chat_id,
             [
                 {
+                    "id": uuid.uuid4().hex,
                     "sender": contact_name,
                     "message": message,
                     "date": "2024-01-01",
@@ -75,16 +84,23 @@ class LLMTester:
         )
 
         # Obtener el historial de chat
-        chat_history = self.chat_manager.get_chat_history("Test")
+        chat_history = self.chat_manager.get_chat_history(chat_id)
         logger.info(f"History: {chat_history}")
 
         # Generar prompt completo
-        full_prompt = self.prompt_manager.format_prompt("Test", chat_history)
+        prompt_start = time.perf_counter()
+        full_prompt = self.prompt_manager.format_prompt(
+            chat_id,
+            chat_history,
+            prompt_name=prompt_name,
+            summary=self.chat_manager.get_chat_summary(chat_id),
+        )
 
         if show_prompt:
             logger.info(f"Prompt completo:\n{full_prompt}")
 
         # Obtener respuesta del LLM
+        llm_start = time.perf_counter()
         start_time = os.times()
         llm_response = self.llm_provider.generate_response(full_prompt)
         end_time = os.times()
@@ -93,13 +109,16 @@ class LLMTester:
         )
 
         # Procesar respuesta
+        parse_start = time.perf_counter()
         processed_response = self.response_processor.process_response(llm_response)
+        parse_end = time.perf_counter()
 
         # Añadir respuesta al historial
         self.chat_manager.add_messages(
-            "Test",
+            chat_id,
             [
                 {
+                    "id": uuid.uuid4().hex,
                     "sender": "Assistant",
                     "message": processed_response,
                     "date": "2024-01-01",
@@ -112,6 +131,11 @@ class LLMTester:
             "original_message": message,
             "response": processed_response,
             "processing_time_sec": processing_time,
+            "context_tokens": full_prompt.context_tokens,
+            # Tiempos reales por etapa, comparables entre grabación y reproducción
+            "prompt_time_sec": llm_start - prompt_start,
+            "llm_time_sec": parse_start - llm_start,
+            "parse_time_sec": parse_end - parse_start,
         }
 
     def run_interactive_mode(self):
@@ -133,6 +157,8 @@ class LLMTester:
             result = self.test_response(
                 user_input,
                 contact_name=contact_name,
+                chat_id=chat_id,
+                prompt_name=prompt_name,
                 show_prompt=show_prompt,
             )
 
@@ -141,7 +167,7 @@ class LLMTester:
 
         print("--- Sesión terminada ---")
 
-    def run_batch_test(self, test_file):
+    def run_batch_test(self, test_file, fresh=False):
         """
         Ejecuta pruebas en lote desde un archivo JSON
 
@@ -150,11 +176,22 @@ class LLMTester:
             {"message": "Hola", "contact_name": "Usuario 1", "chat_id": "chat1", "prompt_name": "default"},
             {"message": "¿Cómo estás?", "contact_name": "Usuario 2"}
         ]
+
+        Con fresh se borra antes el historial de los chats de prueba, para que
+        los prompts coincidan con los de una grabación previa.
         """
         try:
             with open(test_file, "r", encoding="utf-8") as f:
                 test_cases = json.load(f)
 
+            if fresh:
+                chat_ids = {
+                    test_case.get("chat_id", f"test_chat_{i}")
+                    for i, test_case in enumerate(test_cases)
+                }
+                for chat_id in chat_ids:
+                    self.chat_manager.clear_chat_history(chat_id)
+
             results = []
             for i, test_case in enumerate(test_cases):
                 logger.info(f"Ejecutando prueba {i+1}/{len(test_cases)}")
@@ -179,6 +216,11 @@ class LLMTester:
                 print(f"Respuesta: {result['response']}")
                 print(f"Tiempo: {result['processing_time_sec']:.2f}s")
 
+            if results:
+                for stage in ("prompt_time_sec", "llm_time_sec", "parse_time_sec"):
+                    total = sum(result[stage] for result in results)
+                    print(f"{stage}: total {total:.4f}s, media {total / len(results):.4f}s")
+
             # Guardar resultados
             output_file = f"test_results_{self.llm_type}.json"
             with open(output_file, "w", encoding="utf-8") as f:
@@ -199,7 +241,9 @@ def main():
     parser.add_argument(
         "--config", help="Ruta al archivo de configuración", default="config.json"
     )
-    parser.add_argument("--llm", help="Tipo de LLM a usar (gemini, openai, etc.)")
+    parser.add_argument(
+        "--llm", help="Tipo de LLM a usar (gemini, stub, router, record, replay)"
+    )
     parser.add_argument("--test-file", help="Archivo JSON con casos de prueba")
     parser.add_argument(
         "--interactive", action="store_true", help="Ejecutar en modo interactivo"
@@ -209,16 +253,22 @@ def main():
     parser.add_argument(
         "--show-prompt", action="store_true", help="Mostrar prompt completo"
     )
+    parser.add_argument(
+        "--fresh",
+        action="store_true",
+        help="Borrar el historial de los chats de prueba antes de ejecutar el lote",
+    )
 
     args = parser.parse_args()
 
+    tester = None
     try:
         tester = LLMTester(config_path=args.config, llm_type=args.llm)
 
         if args.interactive:
             tester.run_interactive_mode()
         elif args.test_file:
-            tester.run_batch_test(args.test_file)
+            tester.run_batch_test(args.test_file, fresh=args.fresh)
         elif args.message:
             result = tester.test_response(
                 args.message, prompt_name=args.prompt, show_prompt=args.show_prompt
@@ -232,6 +282,11 @@ def main():
     except Exception as e:
         logger.error(f"Error: {e}", exc_info=True)
         return 1
+    finally:
+        if tester:
+            # Guardar la caché de respuestas y confirmar los historiales escritos
+            tester.llm_provider.close()
+            tester.chat_manager.close()
 
     return 0
 
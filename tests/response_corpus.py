@@ -0,0 +1,69 @@
+# Corpus de respuestas reales y malformadas: (nombre, respuesta, mensajes esperados)
+CORPUS = [
+    (
+        "bien formada",
+        "<Response><Messages><Message>Hola</Message><Message>¿Qué tal?</Message></Messages></Response>",
+        "Hola\n¿Qué tal?",
+    ),
+    (
+        "con atributos",
+        '<Response><Messages><Message time="12:55" date="25-06-2001">Hola</Message></Messages></Response>',
+        "Hola",
+    ),
+    (
+        "bloque de código",
+        "Aquí tienes:\n```xml\n<Response><Messages><Message>Dentro</Message></Messages></Response>\n```\n<Message>Fuera</Message>",
+        "Dentro",
+    ),
+    (
+        "varias raíces",
+        "<Message>Uno</Message>\n<Message>Dos</Message>",
+        "Uno\nDos",
+    ),
+    (
+        "texto alrededor",
+        "Claro, esta es mi respuesta: <Messages><Message>Hola</Message></Messages> Espero que sirva.",
+        "Hola",
+    ),
+    (
+        "entidades",
+        "<Response><Messages><Message>Tom &amp; Jerry &lt;3</Message></Messages></Response>",
+        "Tom & Jerry <3",
+    ),
+    (
+        "ampersand sin escapar",
+        "<Response><Messages><Message>Tom & Jerry</Message></Messages></Response>",
+        "Tom & Jerry",
+    ),
+    (
+        "mensaje sin cerrar",
+        "<Response><Messages><Message>Hola<Message>Adiós</Message></Messages></Response>",
+        "Hola\nAdiós",
+    ),
+    (
+        "contenedor sin cerrar",
+        "<Response><Messages><Message>Hola</Message><Message>Corte a mitad",
+        "Hola\nCorte a mitad",
+    ),
+    (
+        "bloque sin cerrar",
+        "```xml\n<Response><Messages><Message>Hola</Message><Message>Adiós</Message>",
+        "Hola\nAdiós",
+    ),
+    (
+        "cierre por contenedor",
+        "<Response><Messages><Message>Hola</Messages></Response>",
+        "Hola",
+    ),
+    (
+        "etiquetas internas",
+        "<Response><Messages><Message>Hola <b>mundo</b></Message></Messages></Response>",
+        "Hola mundo",
+    ),
+    (
+        "con acciones",
+        '<Response><Action type="schedule" at="10:00">Llamar</Action><Messages><Message>Listo</Message></Messages></Response>',
+        "Listo",
+    ),
+    ("sin etiquetas", "Solo texto plano sin formato", ""),
+]
@@ -0,0 +1,121 @@
+import time
+
+import pytest
+
+from llm_provider import FALLBACK_RESPONSE, StubProvider
+from providers.resilient_provider import CircuitBreaker, ResilientProvider
+
+
+def resilient(provider, **options):
+    options.setdefault("backoff_base", 0.001)
+    options.setdefault("backoff_max", 0.001)
+    return ResilientProvider(provider, **options)
+
+
+@pytest.fixture
+def close_after():
+    providers = []
+    yield providers.append
+    for provider in providers:
+        provider.close()
+
+
+def test_retries_transient_errors_until_success(close_after):
+    # Con la semilla 7 los dos primeros intentos fallan y el tercero responde
+    stub = StubProvider(failure_rate=0.5, seed=7)
+    provider = resilient(stub, max_retries=3)
+    close_after(provider)
+
+    assert provider.generate_response("hola") == StubProvider.DEFAULT_RESPONSE
+    assert stub.calls == 3
+    assert provider.get_stats()["retries"] == 2
+    assert provider.get_stats()["fallbacks"] == 0
+
+
+def test_hung_call_is_cut_by_the_attempt_timeout(close_after):
+    stub = StubProvider(hang_rate=1.0, hang_time=0.5, seed=1)
+    provider = resilient(stub, timeout=0.05, deadline=5.0, max_retries=0)
+    close_after(provider)
+
+    started = time.monotonic()
+    assert provider.generate_response("hola") == FALLBACK_RESPONSE
+    assert time.monotonic() - started < 0.3
+    assert provider.get_stats()["timeouts"] == 1
+
+
+def test_deadline_bounds_the_whole_call(close_after):
+    stub = StubProvider(hang_rate=1.0, hang_time=0.5, seed=1)
+    provider = resilient(stub, timeout=0.1, deadline=0.25, max_retries=10)
+    close_after(provider)
+
+    started = time.monotonic()
+    assert provider.generate_response("hola") == FALLBACK_RESPONSE
+    elapsed = time.monotonic() - started
+
+    # Los reintentos se detienen al agotar el plazo total, no tras max_retries
+    assert 0.2 <= elapsed < 0.45
+    assert stub.calls <= 3
+
+
+def test_breaker_opens_and_half_opens(close_after):
+    stub = StubProvider(failure_rate=1.0, seed=1)
+    provider = resilient(stub, max_retries=0, failure_threshold=3, reset_timeout=0.1)
+    close_after(provider)
+
+    for _ in range(3):
+        assert provider.generate_response("hola") == FALLBACK_RESPONSE
+    assert provider.breaker.state == CircuitBreaker.OPEN
+
+    # Abierto: se rechaza sin llamar al proveedor
+    assert provider.generate_response("hola") == FALLBACK_RESPONSE
+    assert stub.calls == 3
+    assert provider.get_stats()["rejected"] == 1
+
+    # Pasado reset_timeout se deja pasar una llamada de prueba que lo cierra
+    time.sleep(0.15)
+    stub.failure_rate = 0.0
+    assert provider.generate_response("hola") == StubProvider.DEFAULT_RESPONSE
+    assert stub.calls == 4
+    assert provider.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_breaker_allows_a_single_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    time.sleep(0.08)
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+
+    # Si la prueba falla vuelve a abrirse
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_hedge_answers_when_the_primary_hangs(close_after):
+    # Con la semilla 34 las cinco primeras llamadas responden, la sexta se
+    # cuelga y la séptima (el duplicado) responde
+    stub = StubProvider(hang_rate=0.5, hang_time=1.0, seed=34)
+    provider = resilient(
+        stub,
+        timeout=2.0,
+        hedge=True,
+        hedge_min_samples=5,
+        hedge_min_delay=0.05,
+    )
+    close_after(provider)
+
+    for _ in range(5):
+        provider.generate_response("calentamiento")
+
+    started = time.monotonic()
+    assert provider.generate_response("hola") == StubProvider.DEFAULT_RESPONSE
+    assert time.monotonic() - started < 0.5
+
+    stats = provider.get_stats()
+    assert stats["hedges"] == 1
+    assert stats["hedge_wins"] == 1
+    assert stats["timeouts"] == 0
@@ -0,0 +1,50 @@
+import pytest
+
+from processors.response_processor import ResponseProcessor, StreamingMessageParser
+from tests.response_corpus import CORPUS
+
+EXTRA_CASES = [
+    "<Message>hola<Message>adios</Message>",
+    "```\n<Message>dentro</Message>\n```\n<Message>fuera</Message>",
+    "<Messages><Message>hola</Messages><Message>adios",
+    "```xml\n<Message>uno</Message>\n```\n<Message>dos</Message>\n```<Message>tres",
+    "<Message>Tom <3 y ``código``</Message>",
+]
+
+RESPONSES = [response for _, response, _ in CORPUS] + EXTRA_CASES
+
+
+def stream(response, chunk_size):
+    parser = StreamingMessageParser()
+    messages = []
+    for start in range(0, len(response), chunk_size):
+        messages.extend(parser.feed(response[start : start + chunk_size]))
+    messages.extend(parser.close())
+    return messages
+
+
+@pytest.mark.parametrize("expected_name,response,expected", CORPUS)
+def test_corpus(expected_name, response, expected):
+    assert ResponseProcessor().process_response(response) == expected
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 1000])
+@pytest.mark.parametrize("response", RESPONSES)
+def test_streaming_matches_batch(response, chunk_size):
+    expected = ResponseProcessor().parse_response(response).messages
+    assert stream(response, chunk_size) == expected
+
+
+def test_streaming_emits_before_end():
+    parser = StreamingMessageParser()
+    assert parser.feed("<Response><Messages><Message>Hola</Mes") == []
+    assert parser.feed("sage><Message>Adi") == ["Hola"]
+    assert parser.close() == ["Adi"]
+
+
+def test_streaming_cannot_retract_sent_messages():
+    # El análisis completo prefiere el mensaje del bloque de código, pero
+    # "uno" ya se había enviado cuando aparece el bloque
+    response = "<Message>uno</Message>```xml\n<Message>dos"
+    assert ResponseProcessor().parse_response(response).messages == ["dos"]
+    assert stream(response, 4) == ["uno", "dos"]
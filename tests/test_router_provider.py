@@ -0,0 +1,129 @@
+import threading
+import time
+
+from llm_provider import LLMProvider, FALLBACK_RESPONSE
+from providers.router_provider import Backend, RouterProvider
+
+
+class SlowProvider(LLMProvider):
+    """Proveedor que tarda delay segundos y cuenta las llamadas simultáneas"""
+
+    def __init__(self, delay=0.0, release=None):
+        self.delay = delay
+        self.release = release
+        self.calls = 0
+        self.concurrent = 0
+        self.max_concurrent = 0
+        self._lock = threading.Lock()
+
+    def generate_response(self, prompt):
+        with self._lock:
+            self.calls += 1
+            self.concurrent += 1
+            self.max_concurrent = max(self.max_concurrent, self.concurrent)
+        try:
+            if self.release is not None:
+                self.release.wait(5)
+            time.sleep(self.delay)
+            return f"ok {prompt}"
+        finally:
+            with self._lock:
+                self.concurrent -= 1
+
+    def close(self):
+        pass
+
+
+def run_concurrently(router, count):
+    results = []
+    threads = [
+        threading.Thread(target=lambda i=i: results.append(router.generate_response(str(i))))
+        for i in range(count)
+    ]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def test_saturated_backends_are_skipped():
+    release = threading.Event()
+    provider = SlowProvider(release=release)
+    router = RouterProvider([Backend("only", provider, max_in_flight=2)], queue_timeout=0.2)
+
+    threads, results = run_concurrently(router, 3)
+    time.sleep(0.5)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    # La tercera petición no sobrecarga el backend: espera y falla al agotar queue_timeout
+    assert provider.max_concurrent == 2
+    assert results.count(FALLBACK_RESPONSE) == 1
+
+
+def test_waiting_request_gets_freed_slot():
+    provider = SlowProvider(delay=0.05)
+    router = RouterProvider([Backend("only", provider, max_in_flight=1)], queue_timeout=5)
+
+    threads, results = run_concurrently(router, 4)
+    for thread in threads:
+        thread.join()
+
+    assert provider.max_concurrent == 1
+    assert all(result.startswith("ok") for result in results)
+
+
+def test_only_one_probe_in_flight_per_backend():
+    release = threading.Event()
+    fast = SlowProvider()
+    unmeasured = SlowProvider(release=release)
+    backends = [
+        Backend("fast", fast, max_in_flight=10),
+        Backend("unmeasured", unmeasured, max_in_flight=10),
+    ]
+    router = RouterProvider(backends)
+    backends[0].latency = 0.1
+    backends[0].last_used = time.monotonic()
+
+    threads, results = run_concurrently(router, 6)
+    time.sleep(0.2)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    # El backend sin medidas recibe un único sondeo; el resto va al medido
+    assert unmeasured.calls == 1
+    assert fast.calls == 5
+
+
+def test_freed_slot_wakes_every_waiter():
+    first = Backend("first", SlowProvider(), max_in_flight=1)
+    second = Backend("second", SlowProvider(), max_in_flight=1)
+    router = RouterProvider([first, second], queue_timeout=1.0)
+    first.in_flight = second.in_flight = 1
+
+    # Cada petición ya probó un backend distinto y solo puede usar el otro
+    acquired = {}
+
+    def wait_for(name, tried):
+        acquired[name] = router._next_backend(tried)
+
+    waiters = [
+        threading.Thread(target=wait_for, args=("needs_second", {"first"})),
+        threading.Thread(target=wait_for, args=("needs_first", {"second"})),
+    ]
+    for waiter in waiters:
+        waiter.start()
+        time.sleep(0.05)
+
+    started = time.monotonic()
+    router._record(first, 0.1, failed=False)
+    waiters[1].join()
+
+    # Liberar first debe despertar también a la petición que espera por él
+    assert acquired["needs_first"] is first
+    assert time.monotonic() - started < 0.5
+
+    router._record(second, 0.1, failed=False)
+    waiters[0].join()
+    assert acquired["needs_second"] is second
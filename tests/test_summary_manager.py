@@ -0,0 +1,135 @@
+import json
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from llm_provider import StubProvider
+from managers.chat_manager import ChatManager
+from managers.prompt_manager import PromptManager
+from managers.summary_manager import ConversationSummarizer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SUMMARY = "Ana pidió presupuesto para el lunes"
+
+
+class RecordingStub(StubProvider):
+    """StubProvider que guarda los prompts recibidos"""
+
+    def __init__(self, **options):
+        super().__init__(response=SUMMARY, **options)
+        self.prompts = []
+
+    def generate_response(self, prompt):
+        self.prompts.append(prompt)
+        return super().generate_response(prompt)
+
+
+def make_config(tmp_path, max_history=5, min_batch=3):
+    return SimpleNamespace(
+        abs_path=ROOT,
+        config={
+            "chat": {
+                "max_history": max_history,
+                "storage_path": str(tmp_path),
+                "summary": {"enabled": True, "min_batch": min_batch},
+            },
+            "llm": {},
+        },
+    )
+
+
+def make_messages(count):
+    return [
+        {
+            "sender": "Ana",
+            "date": "01/01/2024",
+            "time": f"10:{i:02d}",
+            "message": f"mensaje {i}",
+        }
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def setup(tmp_path):
+    config = make_config(tmp_path)
+    prompt_manager = PromptManager(config)
+    llm = RecordingStub()
+    summarizers = []
+
+    def build(background=False, provider=None):
+        summarizer = ConversationSummarizer(
+            config, provider or llm, prompt_manager, background=background
+        )
+        summarizers.append(summarizer)
+        return summarizer, ChatManager(config, None, summarizer)
+
+    yield SimpleNamespace(config=config, prompt_manager=prompt_manager, llm=llm, build=build)
+    for summarizer in summarizers:
+        summarizer.close()
+
+
+def test_old_messages_are_folded_into_the_summary(setup):
+    summarizer, chat_manager = setup.build()
+    chat_manager.add_messages("Ana", make_messages(7))
+
+    # Solo 2 mensajes fuera del historial: por debajo de min_batch
+    assert summarizer.process_pending() == 0
+    assert chat_manager.get_chat_summary("Ana") == ""
+
+    chat_manager.add_messages("Ana", make_messages(8))
+    assert summarizer.process_pending() == 1
+    assert chat_manager.get_chat_summary("Ana") == SUMMARY
+
+    prompt = setup.llm.prompts[0]
+    assert all(f"mensaje {i}" in prompt for i in range(3))
+    assert "mensaje 3" not in prompt
+    assert [msg["message"] for msg in chat_manager.get_chat_history("Ana")] == [
+        f"mensaje {i}" for i in range(3, 8)
+    ]
+
+
+def test_summary_reaches_the_formatted_prompt(setup):
+    summarizer, chat_manager = setup.build(background=True)
+    chat_manager.add_messages("Ana", make_messages(8))
+
+    deadline = time.monotonic() + 2
+    while not chat_manager.get_chat_summary("Ana") and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    prompt = setup.prompt_manager.format_prompt(
+        "Ana",
+        chat_manager.get_chat_history("Ana"),
+        summary=chat_manager.get_chat_summary("Ana"),
+    )
+    assert f"<ConversationSummary>{SUMMARY}</ConversationSummary>" in prompt
+
+
+def test_close_finishes_the_running_batch(setup, tmp_path):
+    slow = RecordingStub(latency=0.2)
+    summarizer, chat_manager = setup.build(background=True, provider=slow)
+    chat_manager.add_messages("Ana", make_messages(8))
+    time.sleep(0.05)
+
+    # close() espera al lote en curso y guarda su resumen
+    summarizer.close()
+    assert not summarizer._thread.is_alive()
+    with open(tmp_path / "summaries" / "Ana.json", encoding="utf-8") as f:
+        assert json.load(f)["summary"] == SUMMARY
+
+
+def test_close_keeps_batches_below_min_batch(setup):
+    summarizer, chat_manager = setup.build(background=True)
+    chat_manager.add_messages("Ana", make_messages(7))
+    summarizer.close()
+    assert setup.llm.calls == 0
+
+    # Los mensajes sin resumir se recuperan al volver a cargar el chat
+    restarted, _ = setup.build()
+    assert restarted.get_summary("Ana") == ""
+    assert restarted.process_pending(force=True) == 1
+    assert restarted.get_summary("Ana") == SUMMARY
+    assert "mensaje 0" in setup.llm.prompts[0]
+    assert "mensaje 1" in setup.llm.prompts[0]
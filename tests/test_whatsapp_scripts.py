@@ -0,0 +1,77 @@
+import os
+
+import pytest
+
+webdriver = pytest.importorskip("selenium.webdriver")
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.common.by import By
+
+from whatsapp_scripts import SCRAPE_MESSAGES_JS
+
+FIXTURE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "benchmarks",
+    "fixtures",
+    "whatsapp_web.html",
+)
+
+
+@pytest.fixture(scope="module")
+def driver():
+    """Chrome sin interfaz con la réplica de WhatsApp Web; se omite sin Chrome"""
+    options = Options()
+    options.add_argument("--headless=new")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    try:
+        chrome = webdriver.Chrome(options=options)
+    except WebDriverException as e:
+        pytest.skip(f"Chrome no disponible: {e.msg}")
+    yield chrome
+    chrome.quit()
+
+
+@pytest.fixture
+def page(driver):
+    driver.get(f"file://{FIXTURE_PATH}?chats=2&messages=5")
+    return driver
+
+
+def open_chat(driver, name):
+    driver.find_element(By.XPATH, f"//div[@role='listitem']//span[@title='{name}']").click()
+
+
+def test_no_open_chat_returns_none(page):
+    assert page.execute_script(SCRAPE_MESSAGES_JS, 0) is None
+
+
+def test_scrapes_ids_meta_and_text(page):
+    open_chat(page, "Contacto 1")
+    messages = page.execute_script(SCRAPE_MESSAGES_JS, 0)
+
+    assert [msg["id"] for msg in messages] == [f"false_1@c.us_{m}" for m in range(5)]
+    assert all(msg["pre_plain_text"] == "[12:00, 1/1/2024] Contacto 1: " for msg in messages)
+    assert [msg["text"] for msg in messages] == [
+        f"Mensaje {m} de Contacto 1" for m in range(5)
+    ]
+
+
+@pytest.mark.parametrize("limit,expected", [(2, [3, 4]), (5, list(range(5))), (50, list(range(5)))])
+def test_limit_keeps_most_recent(page, limit, expected):
+    open_chat(page, "Contacto 0")
+    messages = page.execute_script(SCRAPE_MESSAGES_JS, limit)
+    assert [msg["text"] for msg in messages] == [f"Mensaje {m} de Contacto 0" for m in expected]
+
+
+def test_new_incoming_message_is_last(page):
+    page.execute_script("window.__fixtureIncoming(arguments[0], arguments[1])", "Contacto 0", "Nuevo")
+    open_chat(page, "Contacto 0")
+    messages = page.execute_script(SCRAPE_MESSAGES_JS, 1)
+    assert messages == [
+        {
+            "id": "false_Contacto 0_5",
+            "pre_plain_text": "[12:00, 1/1/2024] Contacto 0: ",
+            "text": "Nuevo",
+        }
+    ]
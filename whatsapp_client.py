@@ -1,135 +1,308 @@
 import time
 import logging
+from selenium.common.exceptions import StaleElementReferenceException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.keys import Keys
+from whatsapp_scripts import (
+    SCRAPE_MESSAGES_JS,
+    INSTALL_UNREAD_OBSERVER_JS,
+    WAIT_UNREAD_EVENTS_JS,
+    LOGIN_STATE_JS,
+)
 
 logger = logging.getLogger(__name__)
 
+WHATSAPP_URL = "https://web.whatsapp.com/"
+
+# Selectores de WhatsApp Web
+CHAT_LIST_XPATH = "//div[@aria-label='Lista de chats']"
+UNREAD_CHATS_XPATH = "//div[@role='listitem']//span[contains(@aria-label, 'mensaje') and contains(@aria-label, 'no leído')]/../../../.."
+MAIN_PANEL_XPATH = "//div[@id='main']"
+MESSAGE_ROW_XPATH = "//div[@id='main']//div[@data-id]"
+MESSAGE_IN_XPATH = "//div[contains(@class, 'message-in')]"
+CHAT_NAME_XPATH = "//*[@id='main']/header/div[2]/div[1]/div/div/div/span[1]"
+INPUT_BOX_XPATH = "//div[@role='textbox' and @contenteditable='true' and @aria-label='Escribe un mensaje']"
+SEND_BUTTON_XPATH = "//button[@aria-label='Enviar']"
+
+# Tiempo máximo (segundos) de cada espera; se puede ajustar en whatsapp.timeouts
+DEFAULT_TIMEOUTS = {
+    "login_qr": 60,
+    "login_restore": 30,
+    "find_chat": 5,
+    "open_chat": 5,
+    "chat_loaded": 5,
+    "messages": 10,
+    "chat_name": 5,
+    "send_message": 10,
+    "message_sent": 5,
+    "close_chat": 3,
+    "refresh_page": 30,
+}
+
 
 class WhatsAppClient:
     def __init__(self, driver, config):
         self.driver = driver
         self.config = config
 
+        client_config = config.config.get("whatsapp", {})
+        self.scrape_mode = client_config.get("scrape_mode", "js")
+        self.scrape_limit = client_config.get("scrape_limit", 10)
+
+        # Tiempos máximos por paso y frecuencia de comprobación de las esperas
+        self.timeouts = {**DEFAULT_TIMEOUTS, **client_config.get("timeouts", {})}
+        self.poll_frequency = client_config.get("poll_frequency", 0.05)
+
+        # Tiempo medido en cada espera: {paso: {"last", "max", "total", "count"}}
+        self.wait_times = {}
+        # Segundos desde la navegación hasta tener la sesión iniciada
+        self.login_time = None
+
+    def _wait(self, step, condition):
+        """Esperar una condición con el tiempo máximo del paso y registrar la duración"""
+        start = time.monotonic()
+        try:
+            return WebDriverWait(
+                self.driver, self.timeouts[step], poll_frequency=self.poll_frequency
+            ).until(condition)
+        finally:
+            self._record_wait(step, time.monotonic() - start)
+
+    def _record_wait(self, step, elapsed):
+        """Registrar el tiempo de espera de un paso"""
+        stats = self.wait_times.setdefault(
+            step, {"last": 0.0, "max": 0.0, "total": 0.0, "count": 0}
+        )
+        stats["last"] = elapsed
+        stats["max"] = max(stats["max"], elapsed)
+        stats["total"] += elapsed
+        stats["count"] += 1
+        logger.debug(f"Espera '{step}': {elapsed * 1000:.0f} ms")
+
+    def get_wait_stats(self):
+        """Obtener una copia de los tiempos de espera registrados por paso"""
+        return {step: dict(stats) for step, stats in self.wait_times.items()}
+
+    def get_login_state(self):
+        """Estado de la sesión en la página: 'logged_in', 'qr' o 'loading'"""
+        try:
+            return self.driver.execute_script(LOGIN_STATE_JS) or "loading"
+        except Exception as e:
+            logger.debug(f"Error al consultar el estado de la sesión: {e}")
+            return "loading"
+
+    def _wait_login_state(self, step, states):
+        """Esperar a que el estado de la sesión sea uno de states y devolverlo"""
+
+        def condition(driver):
+            state = self.get_login_state()
+            return state if state in states else False
+
+        return self._wait(step, condition)
+
     def login(self, session_manager):
-        """Iniciar sesión en WhatsApp Web"""
-        if not session_manager.load_session():
-            self.driver.get("https://web.whatsapp.com/")
-            logger.info("Escanea el código QR para iniciar sesión")
+        """
+        Iniciar sesión en WhatsApp Web con una sola navegación.
 
-            # Esperar a que se cargue la página principal después del login
-            try:
-                WebDriverWait(self.driver, 60).until(
-                    EC.presence_of_element_located(
-                        (By.XPATH, "//div[@aria-label='Lista de chats']")
-                    )
-                )
-                session_manager.save_session()
-                logger.info("Sesión iniciada y guardada correctamente")
-                return True
-            except Exception as e:
-                logger.error(f"Error al iniciar sesión: {e}", exc_info=True)
-                return False
-        else:
-            self.driver.get("https://web.whatsapp.com/")
-            # Esperar a que se cargue la página principal
-            try:
-                WebDriverWait(self.driver, 30).until(
-                    EC.presence_of_element_located(
-                        (By.XPATH, "//div[@aria-label='Lista de chats']")
-                    )
-                )
-                logger.info("Sesión restaurada correctamente")
-                return True
-            except Exception as e:
-                logger.error(f"Error al restaurar sesión: {e}", exc_info=True)
-                return False
+        La sesión vive en el perfil persistente del navegador, así que basta
+        con cargar la página y consultar su estado: si aparece la lista de
+        chats la sesión se ha restaurado; si aparece el código QR hay que
+        escanearlo.
+        """
+        has_session = session_manager.has_session()
+        start = time.monotonic()
+        self.driver.get(WHATSAPP_URL)
+
+        try:
+            state = self._wait_login_state("login_restore", ("logged_in", "qr"))
+        except Exception as e:
+            logger.error(f"WhatsApp Web no terminó de cargar: {e}", exc_info=True)
+            return False
+
+        if state == "logged_in":
+            self.login_time = time.monotonic() - start
+            logger.info(f"Sesión restaurada correctamente en {self.login_time:.2f}s")
+            return True
+
+        if has_session:
+            logger.warning("La sesión guardada ha caducado")
+        logger.info("Escanea el código QR para iniciar sesión")
+
+        # Esperar a que se cargue la página principal después del login
+        try:
+            self._wait_login_state("login_qr", ("logged_in",))
+            self.login_time = time.monotonic() - start
+            session_manager.save_session()
+            logger.info("Sesión iniciada y guardada correctamente")
+            return True
+        except Exception as e:
+            logger.error(f"Error al iniciar sesión: {e}", exc_info=True)
+            return False
 
     def get_unread_chats(self):
         """Obtener chats con mensajes no leídos"""
         try:
-            unread_chats = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_all_elements_located(
-                    (
-                        By.XPATH,
-                        "//div[@role='listitem']//span[contains(@aria-label, 'mensaje') and contains(@aria-label, 'no leído')]/../../../..",
-                    )
-                )
-            )
-            return unread_chats
+            # La lista de chats ya está cargada tras el login: consultar sin esperar
+            return self.driver.find_elements(By.XPATH, UNREAD_CHATS_XPATH)
         except Exception as e:
             logger.debug(f"No se encontraron chats no leídos: {e}")
             return []
 
+    def install_unread_observer(self):
+        """Instalar en la página el observador de chats no leídos"""
+        try:
+            installed = bool(self.driver.execute_script(INSTALL_UNREAD_OBSERVER_JS))
+            if installed:
+                logger.debug("Observador de chats no leídos activo")
+            return installed
+        except Exception as e:
+            logger.error(f"Error al instalar observador de no leídos: {e}", exc_info=True)
+            return False
+
+    def wait_for_unread_events(self, timeout):
+        """
+        Esperar a que el observador registre chats con mensajes no leídos.
+
+        Devuelve la lista de nombres de chat (vacía si se agotó la espera) o
+        None si el observador no está instalado y hay que reinstalarlo.
+        """
+        try:
+            # El script debe poder esperar más que el tiempo solicitado
+            self.driver.set_script_timeout(timeout + 5)
+            return self.driver.execute_async_script(
+                WAIT_UNREAD_EVENTS_JS, int(timeout * 1000)
+            )
+        except Exception as e:
+            logger.debug(f"Error al esperar eventos de no leídos: {e}")
+            return None
+
     def open_chat(self, chat_element):
         """Abrir un chat específico"""
         try:
             chat_element.click()
-            time.sleep(2)
+            self._wait("open_chat", EC.presence_of_element_located((By.ID, "main")))
             return True
         except Exception as e:
             logger.error(f"Error al abrir chat: {e}", exc_info=True)
             return False
 
+    def open_chat_by_name(self, chat_name):
+        """Abrir un chat de la lista a partir de su nombre"""
+        try:
+            chat_element = self._wait(
+                "find_chat",
+                EC.element_to_be_clickable(
+                    (
+                        By.XPATH,
+                        f"//div[@role='listitem']//span[@title={self._xpath_literal(chat_name)}]",
+                    )
+                ),
+            )
+            return self.open_chat(chat_element)
+        except Exception as e:
+            logger.error(f"Error al abrir chat '{chat_name}': {e}", exc_info=True)
+            return False
+
+    @staticmethod
+    def _xpath_literal(value):
+        """Escapar un texto para usarlo como literal en una expresión XPath"""
+        if "'" not in value:
+            return f"'{value}'"
+        if '"' not in value:
+            return f'"{value}"'
+        parts = value.split("'")
+        return "concat(" + ", \"'\", ".join(f"'{part}'" for part in parts) + ")"
+
     def get_messages(self):
         """Obtener mensajes del chat actual con información del remitente"""
         try:
             # Esperar a que carguen los mensajes
-            WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.XPATH, "//div[@id='main']"))
+            self._wait(
+                "messages", EC.presence_of_element_located((By.XPATH, MAIN_PANEL_XPATH))
             )
 
-            # Obtener mensajes recibidos (message-in)
-            message_elements = self.driver.find_elements(
-                By.XPATH, "//div[contains(@class, 'message-in')]"
-            )
-            messages = []
+            if self.scrape_mode == "js":
+                messages = self._get_messages_js()
+                if messages is not None:
+                    return messages
+                logger.debug("Extracción por JavaScript fallida, usando XPath")
 
-            for element in message_elements[-10:]:
-                try:
-                    # Obtener el texto del mensaje
-                    message_text = element.find_element(
-                        By.XPATH, ".//span[contains(@class, 'selectable-text')]"
-                    ).text
-
-                    # Obtener el pre-plain-text que contiene la información del remitente
-                    pre_plain_text = element.find_element(
-                        By.XPATH, ".//div[contains(@class, 'copyable-text')]"
-                    ).get_attribute("data-pre-plain-text")
-
-                    # Extraer la hora, fecha y nombre del remitente del pre-plain-text
-                    # El formato es "[hora, fecha] Nombre: "
-                    time_date = pre_plain_text[1:].split("]")[0].strip()  # Remove first '[' and split by ']'
-                    time, date = time_date.split(", ")
-                    sender = pre_plain_text.split("]")[-1].split(":")[0].strip()
-                    
-                    messages.append({
-                        "sender": sender,
-                        "time": time,
-                        "date": date,
-                        "message": message_text
-                    })
-                except Exception as e:
-                    logger.debug(f"Error al procesar mensaje individual: {e}")
-                    continue
-
-            return messages
+            return self._get_messages_xpath()
         except Exception as e:
             logger.error(f"Error al obtener mensajes: {e}", exc_info=True)
             return []
 
+    def _get_messages_js(self):
+        """Obtener los mensajes con una única llamada a execute_script"""
+        try:
+            raw_messages = self.driver.execute_script(
+                SCRAPE_MESSAGES_JS, self.scrape_limit
+            )
+        except Exception as e:
+            logger.debug(f"Error al ejecutar script de extracción: {e}")
+            return None
+
+        if raw_messages is None:
+            return None
+
+        messages = []
+        for raw in raw_messages:
+            try:
+                message = self._parse_pre_plain_text(raw["pre_plain_text"])
+                message["message"] = raw["text"]
+                message["id"] = raw.get("id")
+                messages.append(message)
+            except Exception as e:
+                logger.debug(f"Error al procesar mensaje individual: {e}")
+                continue
+
+        return messages
+
+    def _get_messages_xpath(self):
+        """Obtener los mensajes elemento a elemento mediante XPath"""
+        # Obtener mensajes recibidos (message-in)
+        message_elements = self.driver.find_elements(By.XPATH, MESSAGE_IN_XPATH)
+        messages = []
+
+        for element in message_elements[-self.scrape_limit :]:
+            try:
+                # Obtener el texto del mensaje
+                message_text = element.find_element(
+                    By.XPATH, ".//span[contains(@class, 'selectable-text')]"
+                ).text
+
+                # Obtener el pre-plain-text que contiene la información del remitente
+                pre_plain_text = element.find_element(
+                    By.XPATH, ".//div[contains(@class, 'copyable-text')]"
+                ).get_attribute("data-pre-plain-text")
+
+                message = self._parse_pre_plain_text(pre_plain_text)
+                message["message"] = message_text
+                messages.append(message)
+            except Exception as e:
+                logger.debug(f"Error al procesar mensaje individual: {e}")
+                continue
+
+        return messages
+
+    @staticmethod
+    def _parse_pre_plain_text(pre_plain_text):
+        """Extraer hora, fecha y remitente del atributo data-pre-plain-text"""
+        # El formato es "[hora, fecha] Nombre: "
+        time_date = pre_plain_text[1:].split("]")[0].strip()  # Remove first '[' and split by ']'
+        time, date = time_date.split(", ")
+        sender = pre_plain_text.split("]")[-1].split(":")[0].strip()
+
+        return {"sender": sender, "time": time, "date": date}
+
     def get_chat_name(self):
         """Obtener el nombre del chat actual"""
         try:
-            name_element = WebDriverWait(self.driver, 5).until(
-                EC.presence_of_element_located(
-                    (
-                        By.XPATH,
-                        "//*[@id='main']/header/div[2]/div[1]/div/div/div/span[1]",
-                    )
-                )
+            name_element = self._wait(
+                "chat_name",
+                EC.presence_of_element_located((By.XPATH, CHAT_NAME_XPATH)),
             )
             return name_element.get_attribute("title")
         except Exception as e:
@@ -139,13 +312,9 @@ class WhatsAppClient:
     def send_message(self, message):
         """Enviar un mensaje al chat actual"""
         try:
-            input_box = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located(
-                    (
-                        By.XPATH,
-                        "//div[@role='textbox' and @contenteditable='true' and @aria-label='Escribe un mensaje']",
-                    )
-                )
+            input_box = self._wait(
+                "send_message",
+                EC.presence_of_element_located((By.XPATH, INPUT_BOX_XPATH)),
             )
 
             input_box.clear()
@@ -154,13 +323,24 @@ class WhatsAppClient:
                 char if ord(char) < 0x10000 else "" for char in message
             )
             input_box.send_keys(encoded_message)
-            time.sleep(1)
 
-            send_button = WebDriverWait(self.driver, 10).until(
-                EC.element_to_be_clickable((By.XPATH, "//button[@aria-label='Enviar']"))
+            # El botón de enviar aparece en cuanto el cuadro tiene texto
+            send_button = self._wait(
+                "send_message",
+                EC.element_to_be_clickable((By.XPATH, SEND_BUTTON_XPATH)),
             )
             send_button.click()
 
+            # El mensaje se ha enviado cuando el cuadro de texto queda vacío
+            def message_sent(driver):
+                try:
+                    return not input_box.text.strip()
+                except StaleElementReferenceException:
+                    # WhatsApp vuelve a crear el cuadro de texto al enviar
+                    return True
+
+            self._wait("message_sent", message_sent)
+
             return True
         except Exception as e:
             logger.error(f"Error al enviar mensaje: {e}", exc_info=True)
@@ -169,11 +349,13 @@ class WhatsAppClient:
     def is_chat_loaded(self):
         """Verificar si la interfaz de chat está cargada correctamente"""
         try:
-            # Verificar si el panel de conversación está presente
-            WebDriverWait(self.driver, 5).until(
-                EC.presence_of_element_located((By.ID, "main"))
+            # Verificar que el panel de conversación muestre mensajes o el cuadro de texto
+            self._wait(
+                "chat_loaded",
+                lambda driver: driver.find_elements(
+                    By.XPATH, f"{MESSAGE_ROW_XPATH} | {INPUT_BOX_XPATH}"
+                ),
             )
-            time.sleep(1)
             return True
         except:
             return False
@@ -182,12 +364,7 @@ class WhatsAppClient:
         """Refrescar la página cuando hay problemas de carga"""
         try:
             self.driver.refresh()
-            WebDriverWait(self.driver, 30).until(
-                EC.presence_of_element_located(
-                    (By.XPATH, "//div[@aria-label='Lista de chats']")
-                )
-            )
-            time.sleep(2)
+            self._wait_login_state("refresh_page", ("logged_in",))
             return True
         except Exception as e:
             logger.error(f"Error al refrescar página: {e}", exc_info=True)
@@ -197,7 +374,7 @@ class WhatsAppClient:
         """Cerrar el chat actual"""
         try:
             self.driver.find_element(By.TAG_NAME, "body").send_keys(Keys.ESCAPE)
-            time.sleep(1)
+            self._wait("close_chat", EC.invisibility_of_element_located((By.ID, "main")))
             return True
         except Exception as e:
             logger.error(f"Error al cerrar chat: {e}", exc_info=True)
@@ -0,0 +1,149 @@
+"""Scripts JavaScript que se inyectan en WhatsApp Web mediante Selenium"""
+
+# Recoge en una sola llamada los mensajes recibidos visibles del chat abierto.
+# arguments[0]: número máximo de mensajes (los más recientes); 0 = todos.
+# Devuelve null si el panel de conversación no está presente.
+SCRAPE_MESSAGES_JS = """
+const limit = arguments[0] || 0;
+if (!document.getElementById('main')) {
+    return null;
+}
+const rows = document.querySelectorAll('div[class*="message-in"]');
+const start = limit > 0 ? Math.max(0, rows.length - limit) : 0;
+const messages = [];
+for (let i = start; i < rows.length; i++) {
+    const row = rows[i];
+    const textElement = row.querySelector('span[class*="selectable-text"]');
+    const metaElement = row.querySelector('div[class*="copyable-text"]');
+    if (!textElement || !metaElement) {
+        continue;
+    }
+    const idElement = row.closest('[data-id]') || row.querySelector('[data-id]');
+    messages.push({
+        id: idElement ? idElement.getAttribute('data-id') : null,
+        pre_plain_text: metaElement.getAttribute('data-pre-plain-text') || '',
+        text: textElement.innerText,
+    });
+}
+return messages;
+"""
+
+# Instala un MutationObserver sobre la lista de chats que registra en una cola
+# de la página los chats cuyo indicador de no leídos aparece o cambia.
+# Es idempotente: devuelve true si el observador ya está activo o se instaló,
+# false si la lista de chats todavía no existe.
+INSTALL_UNREAD_OBSERVER_JS = """
+const current = window.__botUnread;
+if (current && document.contains(current.list)) {
+    return true;
+}
+const list = document.querySelector('div[aria-label="Lista de chats"]');
+if (!list) {
+    return false;
+}
+if (current) {
+    current.observer.disconnect();
+}
+const state = {list: list, queue: [], pending: new Set(), labels: new Map(), waiters: []};
+const collect = () => {
+    const seen = new Map();
+    list.querySelectorAll('div[role="listitem"]').forEach((item) => {
+        const badge = item.querySelector(
+            'span[aria-label*="mensaje"][aria-label*="no leído"]'
+        );
+        const titleElement = item.querySelector('span[title]');
+        if (!badge || !titleElement) {
+            return;
+        }
+        const title = titleElement.getAttribute('title');
+        const label = badge.getAttribute('aria-label');
+        seen.set(title, label);
+        if (state.labels.get(title) !== label && !state.pending.has(title)) {
+            state.pending.add(title);
+            state.queue.push(title);
+        }
+    });
+    state.labels = seen;
+    if (state.queue.length) {
+        state.waiters.splice(0).forEach((waiter) => waiter());
+    }
+};
+let scheduled = false;
+state.observer = new MutationObserver(() => {
+    if (scheduled) {
+        return;
+    }
+    scheduled = true;
+    setTimeout(() => {
+        scheduled = false;
+        collect();
+    }, 50);
+});
+state.observer.observe(list, {
+    childList: true,
+    subtree: true,
+    characterData: true,
+    attributes: true,
+    attributeFilter: ['aria-label'],
+});
+window.__botUnread = state;
+collect();
+return true;
+"""
+
+# Espera (execute_async_script) a que el observador registre chats no leídos.
+# arguments[0]: tiempo máximo de espera en milisegundos.
+# Devuelve la lista de nombres de chat pendientes (vacía si se agotó la espera)
+# o null si el observador no está instalado o la lista de chats fue reemplazada.
+WAIT_UNREAD_EVENTS_JS = """
+const timeoutMs = arguments[0];
+const done = arguments[arguments.length - 1];
+const state = window.__botUnread;
+if (!state || !document.contains(state.list)) {
+    done(null);
+    return;
+}
+const drain = () => {
+    const titles = state.queue.splice(0);
+    titles.forEach((title) => state.pending.delete(title));
+    return titles;
+};
+if (state.queue.length) {
+    done(drain());
+    return;
+}
+let finished = false;
+const waiter = () => {
+    if (finished) {
+        return;
+    }
+    finished = true;
+    clearTimeout(timer);
+    done(drain());
+};
+const timer = setTimeout(() => {
+    if (finished) {
+        return;
+    }
+    finished = true;
+    const index = state.waiters.indexOf(waiter);
+    if (index >= 0) {
+        state.waiters.splice(index, 1);
+    }
+    done([]);
+}, timeoutMs);
+state.waiters.push(waiter);
+"""
+
+# Comprueba el estado de la sesión sin esperar a ningún elemento: devuelve
+# 'logged_in' si ya está la lista de chats, 'qr' si se pide escanear el código
+# y 'loading' mientras la aplicación sigue cargando.
+LOGIN_STATE_JS = """
+if (document.querySelector('div[aria-label="Lista de chats"], #pane-side')) {
+    return 'logged_in';
+}
+if (document.querySelector('canvas[aria-label*="QR"], div[data-ref] canvas')) {
+    return 'qr';
+}
+return 'loading';
+"""